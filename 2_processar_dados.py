@@ -3,13 +3,26 @@ ARQUIVO 2: Processa dados dos relatórios e gera planilha consolidada
 Executa: python 2_processar_dados.py
 """
 
+import numpy as np
+import openpyxl
 import pandas as pd
+from pandas.api.types import union_categoricals
+from pandas.io.parsers import TextParser
+import argparse
+import hashlib
+import json
 import os
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from pathlib import Path
 import re
 
+from config_sistema import MOTIVOS_CANCELAMENTO, STATUS_ALUNOS
+from cache_processados import CACHE_PROCESSADOS_PASTA, CacheProcessados
+from normalizacao import NormalizadorTextos
+
 # Configuração de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -24,32 +37,72 @@ MAPEAMENTO_CURSOS = {
     'LICENCIADO': 'Licenciatura'
 }
 
-# Status dos alunos
-STATUS_VALIDOS = {
-    'ATIVO': 'Ativo',
-    'CANCELADO': 'Cancelado',
-    'TRANCADO': 'Trancado',
-    'FORMADO': 'Formado',
-    'JUBILADO': 'Jubilado',
+# Modalidade de ingresso pelo primeiro caractere da matrícula
+MODALIDADES_INGRESSO = {
+    'A': 'AC',  # Ampla Concorrência
+    'L': 'AA',  # Ações Afirmativas
 }
 
-# Motivos de cancelamento
-MOTIVOS_CANCELAMENTO = {
-    'DESISTÊNCIA': 'Desistência',
-    'ABANDONO': 'Abandono',
-    'CANCELAMENTO': 'Cancelamento Administrativo',
-    'REPROVAÇÃO': 'Reprovação em Disciplinas',
-    'INATIVIDADE': 'Inatividade Acadêmica',
-    'OUTROS': 'Outros Motivos'
+# Normalizadores compilados a partir dos mapas (config_sistema.py); células
+# vazias saem como 'Desconhecido' (status) e 'Não Informado' (motivo), não
+# como o texto 'NAN'/'nan' do str() da célula
+NORMALIZADOR_STATUS = NormalizadorTextos(STATUS_ALUNOS, vazio='Desconhecido')
+NORMALIZADOR_MOTIVOS = NormalizadorTextos(MOTIVOS_CANCELAMENTO, vazio='Não Informado')
+
+# Texto de nome e matrícula: Arrow quando disponível
+try:
+    import pyarrow  # noqa: F401
+    TIPO_TEXTO = pd.StringDtype('pyarrow')
+except ImportError:
+    TIPO_TEXTO = pd.StringDtype('python')
+    logger.warning("pyarrow não instalado, nome e matrícula ficam como texto Python")
+
+# Leitura das planilhas: só as colunas usadas (matrícula, nome, status e motivo)
+COLUNAS_RELATORIO = 4
+MOTORES_EXCEL = ('openpyxl', 'calamine')
+
+# calamine (python-calamine) lê xlsx bem mais rápido que o openpyxl, se instalado;
+# o engine='calamine' do pandas só existe a partir do pandas 2.2
+PANDAS_COM_CALAMINE = tuple(int(parte) for parte in re.findall(r'\d+', pd.__version__)[:2]) >= (2, 2)
+try:
+    import python_calamine  # noqa: F401
+    MOTOR_EXCEL = 'calamine' if PANDAS_COM_CALAMINE else 'openpyxl'
+except ImportError:
+    MOTOR_EXCEL = 'openpyxl'
+
+# Tipos das colunas dos alunos processados: categorias para os textos que se
+# repetem e inteiros pequenos que aceitam vazio para ano e semestre
+ESQUEMA_ALUNOS = {
+    'matricula': TIPO_TEXTO,
+    'nome': TIPO_TEXTO,
+    'curso': 'category',
+    'status': 'category',
+    'modalidade': 'category',
+    'periodo_ingresso': 'category',
+    'ano_ingresso': 'Int16',
+    'semestre_ingresso': 'Int8',
+    'motivo_cancelamento': 'category',
+    'status_original': 'category',
 }
 
+# Versão das regras de normalização, parte da chave do cache de processados:
+# muda sozinha quando os mapas, a leitura ou o esquema mudam; incremente
+# VERSAO_PROCESSAMENTO ao alterar a lógica do processar_relatorio
+VERSAO_PROCESSAMENTO = 2
+VERSAO_REGRAS = hashlib.sha256(json.dumps([
+    VERSAO_PROCESSAMENTO, MAPEAMENTO_CURSOS, STATUS_ALUNOS, MODALIDADES_INGRESSO,
+    MOTIVOS_CANCELAMENTO, COLUNAS_RELATORIO, {coluna: str(tipo) for coluna, tipo in ESQUEMA_ALUNOS.items()},
+], ensure_ascii=False).encode('utf-8')).hexdigest()[:12]
+
 
 class ProcessadorDados:
     """Processa dados dos relatórios Excel e gera análise consolidada"""
     
-    def __init__(self):
+    def __init__(self, motor_excel=MOTOR_EXCEL, cache=None):
         self.dados_completos = []
         self.resumo_geral = {}
+        self.motor_excel = motor_excel
+        self.cache = cache    # CacheProcessados, ou None para sempre ler as planilhas
         
     def carregar_relatorio(self, caminho_arquivo):
         """
@@ -64,12 +117,14 @@ class ProcessadorDados:
         logger.info(f"Carregando: {caminho_arquivo}")
         
         try:
-            # Ler todas as abas para encontrar os dados
-            xls = pd.ExcelFile(caminho_arquivo)
-            logger.info(f"  Abas encontradas: {xls.sheet_names}")
-            
-            # Geralmente os dados estão na primeira aba
-            df = pd.read_excel(caminho_arquivo, sheet_name=0)
+            if self.motor_excel == 'calamine':
+                try:
+                    df = self._ler_calamine(caminho_arquivo)
+                except Exception as e:
+                    logger.warning(f"  Leitura com calamine falhou ({str(e)}), usando openpyxl")
+                    df = self._ler_openpyxl(caminho_arquivo)
+            else:
+                df = self._ler_openpyxl(caminho_arquivo)
             
             logger.info(f"  Registros carregados: {len(df)}")
             logger.info(f"  Colunas: {list(df.columns)}")
@@ -80,6 +135,51 @@ class ProcessadorDados:
             logger.error(f"Erro ao carregar {caminho_arquivo}: {str(e)}")
             return None
     
+    def _ler_openpyxl(self, caminho_arquivo):
+        """
+        Lê a primeira aba abrindo o arquivo uma única vez e só as primeiras
+        COLUNAS_RELATORIO colunas, com os mesmos tipos do pd.read_excel
+        """
+        
+        livro = openpyxl.load_workbook(caminho_arquivo, read_only=True, data_only=True)
+        try:
+            logger.info(f"  Abas encontradas: {livro.sheetnames}")
+            
+            # Geralmente os dados estão na primeira aba
+            aba = livro.worksheets[0]
+            aba.reset_dimensions()
+            
+            linhas = []
+            ultima_com_dados = -1
+            for numero, celulas in enumerate(aba.iter_rows(max_col=COLUNAS_RELATORIO)):
+                valores = [_valor_celula(celula) for celula in celulas]
+                while valores and valores[-1] == '':
+                    valores.pop()
+                if valores:
+                    ultima_com_dados = numero
+                linhas.append(valores)
+        finally:
+            livro.close()
+        
+        # Descartar linhas vazias do fim e completar as linhas curtas
+        linhas = linhas[:ultima_com_dados + 1]
+        if not linhas:
+            return pd.DataFrame()
+        largura = max(len(valores) for valores in linhas)
+        linhas = [valores + [''] * (largura - len(valores)) for valores in linhas]
+        
+        # Mesmo parser de texto do pd.read_excel (cabeçalho, vazios e tipos)
+        return TextParser(linhas, header=0).read()
+    
+    def _ler_calamine(self, caminho_arquivo):
+        """Lê a primeira aba com o motor calamine, abrindo o arquivo uma única vez"""
+        
+        with pd.ExcelFile(caminho_arquivo, engine='calamine') as xls:
+            logger.info(f"  Abas encontradas: {xls.sheet_names}")
+            df = xls.parse(0)
+        
+        return df.iloc[:, :COLUNAS_RELATORIO]
+    
     def identificar_curso(self, df):
         """
         Identifica o curso pela última linha do relatório
@@ -149,6 +249,40 @@ class ProcessadorDados:
         except (ValueError, IndexError):
             return None
     
+    def extrair_periodos_ingresso(self, matriculas):
+        """
+        Versão por coluna do extrair_periodo_ingresso
+        
+        Args:
+            matriculas: Series com as matrículas
+            
+        Returns:
+            DataFrame com 'ano', 'semestre' (NaN se não reconhecidos) e
+            'periodo' ('Desconhecido' se não reconhecido), no índice das matrículas
+        """
+        
+        texto = matriculas.map(str)
+        limpo = texto.str.strip()
+        digito_semestre = limpo.str[0]
+        digitos_ano = limpo.str[1:3]
+        
+        reconhecida = (
+            (texto.str.len() >= 3)
+            & digito_semestre.str.isdecimal().fillna(False).astype(bool)
+            & digitos_ano.str.isdecimal().fillna(False).astype(bool)
+        )
+        semestre = pd.to_numeric(digito_semestre.where(reconhecida), errors='coerce')
+        ano = 2000 + pd.to_numeric(digitos_ano.where(reconhecida), errors='coerce')
+        reconhecida &= semestre.isin([1, 2]) & ano.notna()
+        
+        semestre = semestre.where(reconhecida)
+        ano = ano.where(reconhecida)
+        periodo = (ano.astype('Int64').astype(str) + '.' + semestre.astype('Int64').astype(str)).where(
+            reconhecida, 'Desconhecido'
+        )
+        
+        return pd.DataFrame({'ano': ano, 'semestre': semestre, 'periodo': periodo}, index=matriculas.index)
+    
     def identificar_modalidade_ingresso(self, matricula):
         """
         Identifica a modalidade de ingresso pelo primeiro caractere
@@ -168,12 +302,13 @@ class ProcessadorDados:
         
         primeiro_char = str(matricula)[0].upper()
         
-        if primeiro_char == 'A':
-            return 'AC'
-        elif primeiro_char == 'L':
-            return 'AA'
-        else:
-            return 'Desconhecido'
+        return MODALIDADES_INGRESSO.get(primeiro_char, 'Desconhecido')
+    
+    def identificar_modalidades_ingresso(self, matriculas):
+        """Versão por coluna do identificar_modalidade_ingresso"""
+        
+        primeiros = matriculas.map(str).str[0].str.upper()
+        return primeiros.map(MODALIDADES_INGRESSO).fillna('Desconhecido')
     
     def extrair_status_aluno(self, texto_status):
         """
@@ -183,19 +318,33 @@ class ProcessadorDados:
             texto_status: Texto do status no relatório
             
         Returns:
-            Status normalizado
+            Status normalizado (texto em maiúsculas se não corresponder a STATUS_ALUNOS)
         """
         
-        if not texto_status:
-            return 'Desconhecido'
+        return NORMALIZADOR_STATUS.normalizar(texto_status)
+    
+    def extrair_status_alunos(self, textos_status):
+        """Versão por coluna do extrair_status_aluno (Series categórica)"""
         
-        texto = str(texto_status).upper().strip()
+        return NORMALIZADOR_STATUS.aplicar(textos_status)
+    
+    def normalizar_motivo_cancelamento(self, texto_motivo):
+        """
+        Normaliza o motivo de cancelamento pelos MOTIVOS_CANCELAMENTO
         
-        for chave, valor in STATUS_VALIDOS.items():
-            if chave in texto:
-                return valor
+        Args:
+            texto_motivo: Texto do motivo no relatório
+            
+        Returns:
+            Motivo normalizado ('Não Informado' se vazio)
+        """
         
-        return texto
+        return NORMALIZADOR_MOTIVOS.normalizar(texto_motivo)
+    
+    def normalizar_motivos_cancelamento(self, textos_motivo):
+        """Versão por coluna do normalizar_motivo_cancelamento (Series categórica)"""
+        
+        return NORMALIZADOR_MOTIVOS.aplicar(textos_motivo)
     
     def processar_relatorio(self, caminho_arquivo):
         """
@@ -205,13 +354,26 @@ class ProcessadorDados:
             caminho_arquivo: Caminho do arquivo .xlsx
             
         Returns:
-            Dict com dados processados ou None
+            Dict com curso, arquivo e alunos (DataFrame, uma linha por aluno) ou None
         """
         
         logger.info(f"\n{'='*60}")
         logger.info(f"Processando relatório: {os.path.basename(caminho_arquivo)}")
         logger.info(f"{'='*60}")
         
+        # Planilha já processada com as mesmas regras: carregar do cache
+        chave_cache = self.cache.chave(caminho_arquivo) if self.cache and self.cache.ativo else None
+        if chave_cache:
+            alunos_cache = self.cache.obter(chave_cache)
+            if alunos_cache is not None:
+                alunos_processados = self.aplicar_esquema(alunos_cache)
+                logger.info(f"  ✓ {len(alunos_processados)} alunos carregados do cache")
+                return {
+                    'curso': str(alunos_processados['curso'].iloc[0]),
+                    'arquivo': caminho_arquivo,
+                    'alunos': alunos_processados
+                }
+        
         # Carregar dados
         df = self.carregar_relatorio(caminho_arquivo)
         if df is None or len(df) == 0:
@@ -227,55 +389,84 @@ class ProcessadorDados:
         # Identificar curso
         curso = self.identificar_curso(df)
         
-        # Processar cada aluno
-        alunos_processados = []
+        # Processar todos os alunos por coluna
+        def coluna(posicao, padrao):
+            if df_dados.shape[1] > posicao:
+                # str() por valor, como nas demais leituras (vazios viram 'nan')
+                return df_dados.iloc[:, posicao].map(str)
+            return pd.Series(padrao, index=df_dados.index, dtype=object)
         
-        for idx, row in df_dados.iterrows():
-            try:
-                # Extrair informações
-                matricula = str(row.iloc[0]) if len(row) > 0 else None
-                nome = str(row.iloc[1]) if len(row) > 1 else 'Desconhecido'
-                status_original = str(row.iloc[2]) if len(row) > 2 else 'Desconhecido'
-                motivo = str(row.iloc[3]) if len(row) > 3 else None
-                
-                # Normalizar dados
-                periodo_ingresso = self.extrair_periodo_ingresso(matricula)
-                modalidade = self.identificar_modalidade_ingresso(matricula)
-                status = self.extrair_status_aluno(status_original)
-                
-                aluno = {
-                    'matricula': matricula,
-                    'nome': nome,
-                    'curso': curso,
-                    'status': status,
-                    'modalidade': modalidade,
-                    'periodo_ingresso': periodo_ingresso.get('periodo') if periodo_ingresso else 'Desconhecido',
-                    'ano_ingresso': periodo_ingresso.get('ano') if periodo_ingresso else None,
-                    'semestre_ingresso': periodo_ingresso.get('semestre') if periodo_ingresso else None,
-                    'motivo_cancelamento': motivo if status == 'Cancelado' else None,
-                    'status_original': status_original
-                }
-                
-                alunos_processados.append(aluno)
-                
-            except Exception as e:
-                logger.warning(f"Erro ao processar linha {idx}: {str(e)}")
-                continue
+        matriculas = coluna(0, None)
+        status_original = coluna(2, 'Desconhecido')
+        motivos = self.normalizar_motivos_cancelamento(coluna(3, None))
+        
+        # Normalizar dados
+        periodos = self.extrair_periodos_ingresso(matriculas)
+        status = self.extrair_status_alunos(status_original)
+        
+        alunos_processados = pd.DataFrame({
+            'matricula': matriculas,
+            'nome': coluna(1, 'Desconhecido'),
+            'curso': curso,
+            'status': status,
+            'modalidade': self.identificar_modalidades_ingresso(matriculas),
+            'periodo_ingresso': periodos['periodo'],
+            'ano_ingresso': periodos['ano'],
+            'semestre_ingresso': periodos['semestre'],
+            'motivo_cancelamento': motivos.where(status == 'Cancelado'),
+            'status_original': status_original
+        }).reset_index(drop=True)
+        alunos_processados = self.aplicar_esquema(alunos_processados)
+        
+        # Matrículas fora do formato são sinalizadas de uma vez, sem interromper o relatório
+        nao_reconhecidas = periodos['periodo'] == 'Desconhecido'
+        if nao_reconhecidas.any():
+            logger.warning(f"  ⚠ {int(nao_reconhecidas.sum())} matrícula(s) sem período de ingresso reconhecido "
+                           f"(ex.: {matriculas[nao_reconhecidas].head(3).tolist()})")
         
         logger.info(f"  ✓ {len(alunos_processados)} alunos processados")
         
+        if chave_cache:
+            self.cache.guardar(chave_cache, alunos_processados)
+        
         return {
             'curso': curso,
             'arquivo': caminho_arquivo,
             'alunos': alunos_processados
         }
     
-    def consolidar_dados(self, lista_arquivos):
+    def aplicar_esquema(self, df):
+        """Converte as colunas de alunos para os tipos compactos de ESQUEMA_ALUNOS"""
+        
+        return df.astype({coluna: tipo for coluna, tipo in ESQUEMA_ALUNOS.items() if coluna in df.columns})
+    
+    def concatenar_alunos(self, lista_alunos):
+        """
+        Concatena os alunos de vários relatórios
+        
+        As categorias de cada coluna são unidas antes, para que o resultado
+        continue categórico (o pd.concat de categorias diferentes vira object).
+        """
+        
+        categoricas = [coluna for coluna, tipo in ESQUEMA_ALUNOS.items()
+                       if tipo == 'category' and all(coluna in df.columns for df in lista_alunos)]
+        tipos = {
+            coluna: pd.CategoricalDtype(union_categoricals([df[coluna] for df in lista_alunos]).categories)
+            for coluna in categoricas
+        }
+        
+        return pd.concat([df.astype(tipos) for df in lista_alunos], ignore_index=True)
+    
+    def consolidar_dados(self, lista_arquivos, processos=1):
         """
         Consolida dados de múltiplos relatórios
         
         Args:
             lista_arquivos: Lista com caminhos dos arquivos
+            processos: Quantos arquivos processar em paralelo (processos
+                       separados); 1 processa um por vez neste processo.
+                       Nos dois modos, um arquivo com erro é registrado no
+                       log e ignorado
             
         Returns:
             DataFrame consolidado
@@ -285,23 +476,34 @@ class ProcessadorDados:
         logger.info(f"Consolidando {len(lista_arquivos)} relatórios")
         logger.info(f"{'='*60}")
         
-        todos_alunos = []
+        todos_alunos = []    # DataFrames dos relatórios
+        encontrados = [os.path.exists(arquivo) for arquivo in lista_arquivos]
+        existentes = [arquivo for arquivo, existe in zip(lista_arquivos, encontrados) if existe]
+        processos = min(processos or 1, len(existentes))
+        
+        if processos > 1:
+            logger.info(f"Processando {len(existentes)} arquivo(s) em {processos} processo(s)")
+            resultados = self._processar_em_paralelo(existentes, processos)
+        else:
+            resultados = ((_processar_arquivo(self, arquivo), []) for arquivo in existentes)
         
-        for arquivo in lista_arquivos:
-            if not os.path.exists(arquivo):
+        for arquivo, existe in zip(lista_arquivos, encontrados):
+            if not existe:
                 logger.warning(f"Arquivo não encontrado: {arquivo}")
                 continue
             
-            resultado = self.processar_relatorio(arquivo)
+            resultado, registros_log = next(resultados)
+            for registro in registros_log:
+                logger.handle(registro)
             
-            if resultado and resultado['alunos']:
-                todos_alunos.extend(resultado['alunos'])
+            if resultado and len(resultado['alunos']):
+                todos_alunos.append(resultado['alunos'])
         
         if not todos_alunos:
             logger.error("Nenhum dado foi processado!")
             return None
         
-        df_consolidado = pd.DataFrame(todos_alunos)
+        df_consolidado = self.concatenar_alunos(todos_alunos)
         
         logger.info(f"\n✓ Total de alunos consolidados: {len(df_consolidado)}")
         logger.info(f"  Cursos: {df_consolidado['curso'].unique().tolist()}")
@@ -309,6 +511,46 @@ class ProcessadorDados:
         
         return df_consolidado
     
+    def _processar_em_paralelo(self, arquivos, processos):
+        """
+        Processa os arquivos num pool de processos
+        
+        Se um processo do pool morrer (falta de memória, falha no lxml ou no
+        openpyxl), os arquivos a partir do primeiro sem resultado são
+        processados de novo um por vez, e o arquivo que derrubar o processo
+        é registrado no log e ignorado.
+        
+        Yields:
+            Tupla (resultado do processar_relatorio, registros de log) de cada
+            arquivo, na ordem da lista
+        """
+        restantes = list(arquivos)
+        while restantes:
+            executor = ProcessPoolExecutor(max_workers=processos)
+            try:
+                futuros = [executor.submit(_processar_em_processo, self, arquivo) for arquivo in restantes]
+                for posicao, futuro in enumerate(futuros):
+                    try:
+                        resultado = futuro.result()
+                    except BrokenProcessPool:
+                        break
+                    yield resultado
+                else:
+                    return
+            finally:
+                executor.shutdown(cancel_futures=True)
+            
+            if processos == 1:
+                # Um arquivo por vez: o que estava sendo processado derrubou o processo
+                logger.error(f"Processo encerrado abruptamente ao processar {restantes[posicao]}; arquivo ignorado")
+                yield None, []
+                posicao += 1
+            else:
+                logger.warning(f"Um processo do pool foi encerrado abruptamente; "
+                               f"{len(restantes) - posicao} arquivo(s) serão processados um por vez")
+                processos = 1
+            restantes = restantes[posicao:]
+    
     def gerar_planilha_evasao(self, df_consolidado, caminho_saida):
         """
         Gera a planilha consolidada de análise de evasão
@@ -431,7 +673,8 @@ class ProcessadorDados:
         for curso in df_cancelados['curso'].unique():
             df_curso = df_cancelados[df_cancelados['curso'] == curso]
             
-            motivos_contagem = df_curso['motivo_cancelamento'].fillna('Não Informado').value_counts()
+            # Sem as categorias: só os motivos presentes no curso entram na contagem
+            motivos_contagem = df_curso['motivo_cancelamento'].astype(object).fillna('Não Informado').value_counts()
             
             total_curso = len(df_curso)
             
@@ -449,9 +692,75 @@ class ProcessadorDados:
         df_cancelamentos.to_excel(writer, sheet_name='Cancelamentos', index=False)
 
 
+def _valor_celula(celula):
+    """Valor de uma célula do openpyxl convertido como no leitor openpyxl do pandas"""
+    
+    if celula.value is None:
+        return ''
+    if celula.data_type == 'e':
+        return np.nan
+    if celula.data_type == 'n':
+        inteiro = int(celula.value)
+        return inteiro if inteiro == celula.value else float(celula.value)
+    return celula.value
+
+
+class _ColetorLogs(logging.Handler):
+    """Guarda os registros de log de um processo do pool para o processo principal emitir em ordem"""
+    
+    def __init__(self):
+        super().__init__()
+        self.registros = []
+    
+    def emit(self, record):
+        # Mensagem já formatada: os args podem não ser serializáveis
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        self.registros.append(record)
+
+
+def _processar_arquivo(processador, caminho_arquivo):
+    """processar_relatorio com o erro registrado no log (resultado None), igual nos dois modos"""
+    try:
+        return processador.processar_relatorio(caminho_arquivo)
+    except Exception as e:
+        logger.error(f"Erro ao processar {caminho_arquivo}: {str(e)}")
+        return None
+
+
+def _processar_em_processo(processador, caminho_arquivo):
+    """
+    Processa um relatório num processo do pool
+    
+    Returns:
+        Tupla (resultado do processar_relatorio, registros de log do arquivo)
+    """
+    coletor = _ColetorLogs()
+    propagar = logger.propagate
+    logger.addHandler(coletor)
+    logger.propagate = False
+    try:
+        resultado = _processar_arquivo(processador, caminho_arquivo)
+    finally:
+        logger.removeHandler(coletor)
+        logger.propagate = propagar
+    return resultado, coletor.registros
+
+
 def main():
     """Função principal - processa dados e gera planilha"""
     
+    parser = argparse.ArgumentParser(description="Processa os relatórios e gera a planilha de evasão")
+    parser.add_argument('--processos', type=int, default=1,
+                        help=f"Arquivos processados em paralelo (padrão: 1, um por vez; "
+                             f"ex.: {os.cpu_count()} para usar todas as CPUs)")
+    parser.add_argument('--motor-excel', choices=MOTORES_EXCEL, default=MOTOR_EXCEL,
+                        help=f"Leitor das planilhas (padrão: {MOTOR_EXCEL}; calamine requer python-calamine)")
+    parser.add_argument('--sem-cache', action='store_true',
+                        help=f"Ler todas as planilhas, sem usar o cache de processados ({CACHE_PROCESSADOS_PASTA}/)")
+    args = parser.parse_args()
+    
     print("\n" + "="*60)
     print("PROCESSADOR DE DADOS - UFF QUÍMICA")
     print("="*60)
@@ -474,8 +783,12 @@ def main():
         print(f"  - {arquivo}")
     
     # Processar dados
-    processador = ProcessadorDados()
-    df_consolidado = processador.consolidar_dados(lista_arquivos)
+    cache = None
+    if not args.sem_cache:
+        cache = CacheProcessados(VERSAO_REGRAS)
+        cache.limpar_obsoletos()
+    processador = ProcessadorDados(motor_excel=args.motor_excel, cache=cache)
+    df_consolidado = processador.consolidar_dados(lista_arquivos, processos=args.processos)
     
     if df_consolidado is None:
         print("\n❌ Erro ao processar dados")
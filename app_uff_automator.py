@@ -6,14 +6,20 @@ Versão: Abordagem direta com simulação de navegador
 import streamlit as st
 import requests
 import time
+import os
 import re
-from bs4 import BeautifulSoup
 import pandas as pd
 import logging
 from datetime import datetime
 from urllib.parse import urljoin, urlparse
 import io
 
+from cache_formulario import CacheFormulario
+from download import baixar_para_arquivo
+from parser_html import analisar_formularios, analisar_pagina_relatorio, criar_soup, extrair_links
+from polling import PoliticaPolling
+from sessao_http import criar_sessao
+
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -21,9 +27,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Configurações
-BASE_URL = "https://app.uff.br"
-APLICACAO_URL = "https://app.uff.br/graduacao/administracaoacademica"
+# Configurações (UFF_BASE_URL permite apontar para o servidor_mock_uff.py)
+BASE_URL = os.environ.get("UFF_BASE_URL", "https://app.uff.br")
+APLICACAO_URL = f"{BASE_URL}/graduacao/administracaoacademica"
 TIMEOUT_REQUESTS = 30
 
 # Headers completos para simular navegador
@@ -45,8 +51,7 @@ class LoginUFF:
     """Classe de login simplificada"""
     
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update(HEADERS)
+        self.session = criar_sessao(HEADERS)
         self.is_authenticated = False
     
     def fazer_login(self, cpf: str, senha: str) -> bool:
@@ -62,7 +67,7 @@ class LoginUFF:
                 return False
             
             # Encontrar formulário de login
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = analisar_formularios(response.text)
             
             # Procurar formulário de várias formas
             login_form = None
@@ -141,9 +146,11 @@ class LoginUFF:
 class GeradorRelatoriosManual:
     """Gera relatórios usando valores manuais"""
     
-    def __init__(self, session):
+    def __init__(self, session, politica_polling=None, cache_formulario=None):
         self.session = session
         self.url_relatorios = f"{APLICACAO_URL}/relatorios/listagens_alunos"
+        self.politica_polling = politica_polling or PoliticaPolling()
+        self.cache_formulario = cache_formulario or CacheFormulario()
     
     def testar_conexao(self):
         """Testa se consegue acessar a página de relatórios"""
@@ -155,12 +162,16 @@ class GeradorRelatoriosManual:
             return False
     
     def extrair_campos_formulario(self):
-        """Extrai todos os campos do formulário manualmente"""
+        """Extrai todos os campos do formulário (usando o cache da sessão, se válido)"""
+        return self.cache_formulario.obter(self._carregar_campos_formulario)
+    
+    def _carregar_campos_formulario(self):
+        """Busca a página e extrai todos os campos do formulário manualmente"""
         try:
             response = self.session.get(self.url_relatorios, timeout=15)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = analisar_formularios(response.text)
             
             # Encontrar formulário principal
             form = soup.find('form')
@@ -222,8 +233,13 @@ class GeradorRelatoriosManual:
             return None
     
     def gerar_relatorio_simples(self, id_localidade='1', id_curso='', id_desdobramento='', 
-                                id_forma_ingresso='1', ano_semestre='20251'):
-        """Gera um relatório simples com valores mínimos"""
+                                id_forma_ingresso='1', ano_semestre='20251', destino=None):
+        """
+        Gera um relatório simples com valores mínimos
+        
+        Retorna o conteúdo do arquivo ou, se destino for informado, o caminho
+        do arquivo gravado em disco.
+        """
         try:
             # Primeiro, obter token e dados do formulário
             dados_form = self.extrair_campos_formulario()
@@ -263,16 +279,17 @@ class GeradorRelatoriosManual:
                 action_url = urljoin(APLICACAO_URL, action_url)
             
             # Enviar requisição
-            response = self.session.post(
-                action_url,
-                data=dados_envio,
-                timeout=30,
-                allow_redirects=True,
-                headers={
-                    'Referer': self.url_relatorios,
-                    'Content-Type': 'application/x-www-form-urlencoded',
-                }
-            )
+            response = self._postar_formulario(action_url, dados_envio)
+            
+            # 422 = authenticity_token rejeitado: recarregar formulário e reenviar
+            if response.status_code == 422:
+                logger.warning("Token do formulário rejeitado, recarregando formulário")
+                self.cache_formulario.invalidar()
+                dados_form = self.extrair_campos_formulario()
+                if not dados_form or not dados_form['token']:
+                    raise Exception("Não foi possível obter token do formulário")
+                dados_envio['authenticity_token'] = dados_form['token']
+                response = self._postar_formulario(action_url, dados_envio)
             
             logger.info(f"Status: {response.status_code}")
             logger.info(f"URL após envio: {response.url}")
@@ -286,7 +303,7 @@ class GeradorRelatoriosManual:
                     f.write(response.text)
                 
                 # Tentar extrair mensagem de erro
-                soup_erro = BeautifulSoup(response.text, 'html.parser')
+                soup_erro = criar_soup(response.text, ['div', 'p'])
                 erros = soup_erro.find_all(['div', 'p'], class_=lambda x: x and 'error' in str(x).lower())
                 for erro in erros:
                     logger.error(f"Erro: {erro.get_text(strip=True)}")
@@ -300,25 +317,30 @@ class GeradorRelatoriosManual:
                 if match:
                     relatorio_id = match.group(1)
                     logger.info(f"Relatório criado com ID: {relatorio_id}")
-                    return self.baixar_relatorio(relatorio_id)
+                    filtros = {k: v for k, v in dados_envio.items() if k != 'authenticity_token'}
+                    return self.baixar_relatorio(relatorio_id, filtros, destino=destino)
             
             # Opção 2: O arquivo foi retornado diretamente
             content_type = response.headers.get('content-type', '').lower()
             if any(x in content_type for x in ['excel', 'xlsx', 'spreadsheet', 'octet-stream']):
                 logger.info("Arquivo Excel retornado diretamente")
+                if destino:
+                    with open(destino, 'wb') as f:
+                        f.write(response.content)
+                    return destino
                 return response.content
             
             # Opção 3: Verificar se há link para download na página
-            soup = BeautifulSoup(response.text, 'html.parser')
-            for link in soup.find_all('a', href=True):
-                href = link.get('href', '')
-                if '.xlsx' in href.lower():
-                    download_url = urljoin(BASE_URL, href)
-                    logger.info(f"Encontrado link Excel: {download_url}")
-                    
-                    file_response = self.session.get(download_url, timeout=30)
-                    file_response.raise_for_status()
-                    return file_response.content
+            for href in extrair_links(response.text, r'\.xlsx'):
+                download_url = urljoin(BASE_URL, href)
+                logger.info(f"Encontrado link Excel: {download_url}")
+                
+                if destino:
+                    return baixar_para_arquivo(self.session, download_url, destino)
+                
+                file_response = self.session.get(download_url, timeout=30)
+                file_response.raise_for_status()
+                return file_response.content
             
             # Se chegou aqui, não encontrou o relatório
             raise Exception("Não foi possível encontrar o relatório gerado")
@@ -327,37 +349,52 @@ class GeradorRelatoriosManual:
             logger.error(f"Erro ao gerar relatório: {e}")
             raise
     
-    def baixar_relatorio(self, relatorio_id):
-        """Baixa um relatório pelo ID"""
+    def _postar_formulario(self, action_url, dados_envio):
+        """Envia o formulário de relatório"""
+        return self.session.post(
+            action_url,
+            data=dados_envio,
+            timeout=30,
+            allow_redirects=True,
+            headers={
+                'Referer': self.url_relatorios,
+                'Content-Type': 'application/x-www-form-urlencoded',
+            }
+        )
+    
+    def baixar_relatorio(self, relatorio_id, filtros=None, timeout=120, destino=None):
+        """Baixa um relatório pelo ID (em memória ou, com destino, direto para o disco)"""
         try:
             logger.info(f"Aguardando relatório {relatorio_id}...")
             
             url_relatorio = f"{BASE_URL}/relatorios/{relatorio_id}"
+            chave = PoliticaPolling.chave_filtros(filtros)
+            inicio = time.monotonic()
+            etapas = None
+            ultimo_pendente = 0
             
-            # Tentar por 2 minutos
-            for tentativa in range(40):
+            # Tentar até o timeout (padrão: 2 minutos)
+            while True:
                 response = self.session.get(url_relatorio, timeout=10)
-                soup = BeautifulSoup(response.text, 'html.parser')
                 
-                # Procurar links de download
-                download_links = []
-                for link in soup.find_all('a', href=True):
-                    href = link.get('href', '')
-                    if any(ext in href.lower() for ext in ['.xlsx', '.xls', '.csv']):
-                        download_links.append(href)
+                # Procurar links de download (usar primeiro link Excel encontrado)
+                download_links, etapas_pagina = analisar_pagina_relatorio(response.text, r'\.xlsx')
                 
                 if download_links:
-                    # Usar primeiro link Excel encontrado
-                    for href in download_links:
-                        if '.xlsx' in href.lower():
-                            download_url = urljoin(BASE_URL, href)
-                            logger.info(f"Baixando de: {download_url}")
-                            
-                            file_response = self.session.get(download_url, timeout=30)
-                            file_response.raise_for_status()
-                            
-                            logger.info(f"Download completo: {len(file_response.content)} bytes")
-                            return file_response.content
+                    download_url = urljoin(BASE_URL, download_links[0])
+                    logger.info(f"Baixando de: {download_url}")
+                    
+                    if destino:
+                        baixar_para_arquivo(self.session, download_url, destino)
+                        self.politica_polling.registrar_conclusao(chave, time.monotonic() - inicio, etapas, ultimo_pendente)
+                        return destino
+                    
+                    file_response = self.session.get(download_url, timeout=30)
+                    file_response.raise_for_status()
+                    
+                    self.politica_polling.registrar_conclusao(chave, time.monotonic() - inicio, etapas, ultimo_pendente)
+                    logger.info(f"Download completo: {len(file_response.content)} bytes")
+                    return file_response.content
                 
                 # Verificar se há mensagem de "pronto" ou "disponível"
                 texto = response.text.lower()
@@ -369,13 +406,27 @@ class GeradorRelatoriosManual:
                                    f'/relatorios/{relatorio_id}/export']:
                         download_url = urljoin(BASE_URL, pattern)
                         try:
+                            if destino:
+                                baixar_para_arquivo(self.session, download_url, destino, timeout=10)
+                                self.politica_polling.registrar_conclusao(chave, time.monotonic() - inicio, etapas, ultimo_pendente)
+                                return destino
+                            
                             file_response = self.session.get(download_url, timeout=10)
                             if file_response.status_code == 200:
+                                self.politica_polling.registrar_conclusao(chave, time.monotonic() - inicio, etapas, ultimo_pendente)
                                 return file_response.content
                         except:
                             pass
                 
-                time.sleep(3)
+                decorrido = time.monotonic() - inicio
+                if decorrido >= timeout:
+                    break
+                
+                ultimo_pendente = decorrido
+                etapas = etapas_pagina or etapas
+                # Sem passar do prazo: a última verificação acontece no próprio timeout
+                espera = min(self.politica_polling.proximo_intervalo(chave, decorrido, etapas), timeout - decorrido)
+                time.sleep(espera)
             
             raise Exception(f"Timeout aguardando relatório {relatorio_id}")
             
@@ -398,6 +449,7 @@ def main():
     if 'session' not in st.session_state:
         st.session_state.session = None
         st.session_state.auth = None
+        st.session_state.cache_formulario = CacheFormulario()
     
     # Sidebar de login
     with st.sidebar:
@@ -414,6 +466,7 @@ def main():
                         if auth.fazer_login(cpf, senha):
                             st.session_state.auth = auth
                             st.session_state.session = auth.get_session()
+                            st.session_state.cache_formulario = CacheFormulario()
                             st.rerun()
                         else:
                             st.error("Falha na autenticação")
@@ -431,7 +484,10 @@ def main():
         st.info("👈 Faça login para começar")
     else:
         # Testar conexão
-        gerador = GeradorRelatoriosManual(st.session_state.session)
+        gerador = GeradorRelatoriosManual(
+            st.session_state.session,
+            cache_formulario=st.session_state.cache_formulario
+        )
         
         if st.button("🔍 Testar Conexão com Sistema de Relatórios"):
             with st.spinner("Testando conexão..."):
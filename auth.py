@@ -2,11 +2,12 @@
 auth.py - Módulo de autenticação no sistema UFF (versão funcional)
 """
 import requests
-from bs4 import BeautifulSoup
 import re
 import logging
 from urllib.parse import urlparse, urljoin
 from config import *
+from parser_html import analisar_formularios, analisar_tokens, criar_soup
+from sessao_http import criar_sessao
 
 logger = logging.getLogger(__name__)
 
@@ -16,14 +17,13 @@ class UFFAuthenticator:
     def __init__(self, username=None, password=None):
         self.username = username
         self.password = password
-        self.session = requests.Session()
-        self.session.headers.update(HEADERS)
+        self.session = criar_sessao(HEADERS)
         self.is_authenticated = False
         self.auth_data = {}
     
     def extract_login_parameters(self, html_content):
         """Extrai parâmetros do formulário de login (função que estava funcionando)"""
-        soup = BeautifulSoup(html_content, 'html.parser')
+        soup = analisar_formularios(html_content)
         
         # Primeiro, tentar encontrar o formulário pelo ID
         login_form = soup.find('form', {'id': 'kc-form-login'})
@@ -135,7 +135,7 @@ class UFFAuthenticator:
                     return True
                 else:
                     # Verificar se há mensagem de erro
-                    soup = BeautifulSoup(login_response.text, 'html.parser')
+                    soup = criar_soup(login_response.text)
                     error_div = soup.find('div', {'id': 'kc-error-message'}) or \
                                soup.find('span', class_='kc-feedback-text') or \
                                soup.find('div', class_='alert-error')
@@ -157,7 +157,7 @@ class UFFAuthenticator:
     
     def _extract_csrf_token(self, html_content):
         """Extrai token CSRF do HTML"""
-        soup = BeautifulSoup(html_content, 'html.parser')
+        soup = analisar_tokens(html_content)
         
         # Procurar meta tag CSRF
         meta_token = soup.find('meta', {'name': 'csrf-token'})
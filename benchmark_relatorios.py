@@ -0,0 +1,193 @@
+"""
+benchmark_relatorios.py - Mede a vazão do fluxo de relatórios do main.py
+
+Sobe o servidor_mock_uff.py localmente e executa o fluxo completo (login,
+formulário, submissão, polling, download e leitura das planilhas), medindo
+relatórios por minuto, requisições por categoria, latência e o tempo de
+cada etapa (metricas.py).
+
+Executa: python benchmark_relatorios.py --modo ambos --atraso-min 2 --atraso-max 8
+"""
+import argparse
+import importlib
+import io
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+
+import servidor_mock_uff
+from metricas import MetricasRelatorios
+
+logger = logging.getLogger(__name__)
+
+PERIODOS_PADRAO = ['2025/1°', '2025/2°']
+MODOS = ('agendador', 'agregado', 'sequencial')
+
+
+def _percentil(valores, percentil):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(percentil / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def executar_fluxo(app, estado, modo, periodos, cursos):
+    """
+    Executa o fluxo do main.py num dos modos e coleta as métricas
+
+    Args:
+        app: Módulo main já importado apontando para o servidor simulado
+        estado: EstadoMock do servidor (para contar requisições do lado do servidor)
+        modo: 'agendador' (submete tudo e coleta junto), 'agregado' (agendador com
+              relatórios agregados divididos localmente) ou 'sequencial' (um por vez)
+        periodos: Lista de períodos no formato '2025/1°'
+        cursos: Chaves de DESDOBRAMENTOS_CURSOS
+
+    Returns:
+        Dict com as métricas da execução
+    """
+    antes = estado.estatisticas()['requisicoes']
+    latencias = []
+
+    inicio = time.monotonic()
+
+    login = app.LoginUFF()
+    login.session.hooks['response'].append(
+        lambda response, *args, **kwargs: latencias.append(response.elapsed.total_seconds())
+    )
+    if not login.fazer_login('00000000000', 'senha-benchmark'):
+        raise RuntimeError("Login no servidor simulado falhou")
+
+    metricas = MetricasRelatorios()
+    gerador = app.GeradorRelatorios(
+        login.get_session(),
+        politica_polling=app.PoliticaPolling(arquivo_historico=None),
+        cache_formulario=app.CacheFormulario(),
+        metricas=metricas
+    )
+    jobs = [(curso, periodo) for periodo in periodos for curso in cursos]
+    dataframes = []
+    erros = 0
+
+    with tempfile.TemporaryDirectory() as pasta:
+        if modo in ('agendador', 'agregado'):
+            agendador = app.AgendadorRelatorios(gerador, pasta_downloads=pasta,
+                                                 governador=app.GOVERNADOR_PADRAO,
+                                                 agregado=modo == 'agregado')
+            for curso, periodo in jobs:
+                agendador.adicionar_job(curso, periodo, app.montar_filtros(curso, periodo))
+            agendador.executar()
+
+            for job in agendador.jobs:
+                if job['status'] == 'CONCLUIDO':
+                    dataframes.append(pd.read_excel(job['arquivo']))
+                else:
+                    erros += 1
+        else:
+            for curso, periodo in jobs:
+                try:
+                    conteudo = gerador.gerar_relatorio_completo(app.montar_filtros(curso, periodo))
+                    dataframes.append(pd.read_excel(io.BytesIO(conteudo)))
+                except Exception as e:
+                    logger.error(f"Erro em {curso} - {periodo}: {str(e)}")
+                    erros += 1
+
+    duracao = time.monotonic() - inicio
+    depois = estado.estatisticas()['requisicoes']
+    requisicoes = {categoria: depois.get(categoria, 0) - antes.get(categoria, 0) for categoria in depois}
+
+    return {
+        'modo': modo,
+        'relatorios': len(dataframes),
+        'erros': erros,
+        'linhas': sum(len(df) for df in dataframes),
+        'duracao_s': round(duracao, 2),
+        'relatorios_por_minuto': round(len(dataframes) / duracao * 60, 2) if duracao else 0.0,
+        'requisicoes': requisicoes,
+        'total_requisicoes': sum(requisicoes.values()),
+        'latencia_media_ms': round(statistics.mean(latencias) * 1000, 2) if latencias else 0.0,
+        'latencia_p95_ms': round(_percentil(latencias, 95) * 1000, 2),
+        'etapas': metricas.resumo(),
+    }
+
+
+def imprimir_resultado(resultado):
+    """Mostra as métricas de uma execução"""
+    print(f"\n{'='*60}")
+    print(f"Modo: {resultado['modo']}")
+    print(f"{'='*60}")
+    print(f"  Relatórios:            {resultado['relatorios']} ({resultado['erros']} erro(s))")
+    print(f"  Linhas lidas:          {resultado['linhas']}")
+    print(f"  Duração:               {resultado['duracao_s']}s")
+    print(f"  Relatórios por minuto: {resultado['relatorios_por_minuto']}")
+    print(f"  Requisições:           {resultado['total_requisicoes']}")
+    for categoria, quantidade in sorted(resultado['requisicoes'].items()):
+        print(f"    - {categoria}: {quantidade}")
+    print(f"  Latência média:        {resultado['latencia_media_ms']} ms")
+    print(f"  Latência p95:          {resultado['latencia_p95_ms']} ms")
+    print(f"  Etapas (execuções, tempo somado, requisições, KB):")
+    for etapa, totais in resultado['etapas'].items():
+        print(f"    - {etapa}: {totais['execucoes']}x, {totais['segundos']:.2f}s, "
+              f"{totais['requisicoes']} req, {totais['bytes'] / 1024:.1f} KB")
+
+
+def main():
+    """Sobe o servidor simulado e executa o benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark do fluxo de relatórios UFF")
+    parser.add_argument('--modo', choices=MODOS + ('ambos',), default='ambos')
+    parser.add_argument('--periodos', nargs='+', default=PERIODOS_PADRAO)
+    parser.add_argument('--cursos', nargs='+', default=None,
+                        help="Chaves de DESDOBRAMENTOS_CURSOS (padrão: todos)")
+    parser.add_argument('--atraso-min', type=float, default=2.0)
+    parser.add_argument('--atraso-max', type=float, default=6.0)
+    parser.add_argument('--alunos', type=int, default=200)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--json', help="Salvar resultados neste arquivo JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    servidor, estado, url_base = servidor_mock_uff.iniciar_em_segundo_plano(
+        atraso_min=args.atraso_min, atraso_max=args.atraso_max,
+        alunos_por_relatorio=args.alunos, semente=args.semente
+    )
+
+    # O main.py lê UFF_BASE_URL ao ser importado
+    os.environ['UFF_BASE_URL'] = url_base
+    app = importlib.import_module('main')
+    logging.getLogger().setLevel(logging.WARNING)
+
+    # Fora do "streamlit run" as chamadas st.* só geram avisos de contexto
+    for nome in list(logging.root.manager.loggerDict):
+        if nome.startswith('streamlit'):
+            logging.getLogger(nome).setLevel(logging.ERROR)
+
+    cursos = args.cursos or list(app.DESDOBRAMENTOS_CURSOS)
+    modos = MODOS if args.modo == 'ambos' else (args.modo,)
+
+    print(f"Servidor simulado: {url_base}")
+    print(f"Jobs: {len(cursos)} curso(s) × {len(args.periodos)} período(s)")
+
+    resultados = []
+    try:
+        for modo in modos:
+            resultado = executar_fluxo(app, estado, modo, args.periodos, cursos)
+            imprimir_resultado(resultado)
+            resultados.append(resultado)
+    finally:
+        servidor.shutdown()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados salvos em {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+cache_formulario.py - Cache do formulário de listagem de alunos
+
+Guarda o formulário já analisado (token, inputs e selects) durante a sessão,
+evitando buscar e analisar a página de listagem a cada relatório. Cada
+select ganha um índice de opções para resolver os filtros sem varreduras.
+"""
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# Configurações
+CACHE_FORMULARIO_TTL = 1800                        # 30 minutos
+TAMANHO_NGRAMA = 3                                 # n-gramas do índice de substrings
+
+
+def normalizar_texto(texto):
+    """Normaliza texto de opção para comparação (unicode, caixa e espaços)"""
+    texto = unicodedata.normalize('NFC', str(texto))
+    return re.sub(r'\s+', ' ', texto).strip().casefold()
+
+
+class IndiceOpcoes:
+    """
+    Índice das opções de um select: busca por valor e por texto normalizado
+    em dicionários, e busca parcial por um índice de n-gramas do texto.
+    """
+
+    def __init__(self, opcoes):
+        self.opcoes = opcoes
+        self.textos = [normalizar_texto(opcao['text']) for opcao in opcoes]
+        self.por_valor = {}
+        self.por_texto = {}
+        self.ngramas = {}
+
+        for posicao, opcao in enumerate(opcoes):
+            self.por_valor.setdefault(str(opcao['value']).strip(), opcao)
+            self.por_texto.setdefault(self.textos[posicao], opcao)
+
+            for ngrama in self._ngramas(self.textos[posicao]):
+                self.ngramas.setdefault(ngrama, set()).add(posicao)
+
+    @staticmethod
+    def _ngramas(texto):
+        return {texto[i:i + TAMANHO_NGRAMA] for i in range(len(texto) - TAMANHO_NGRAMA + 1)}
+
+    def buscar_parcial(self, valor_buscado):
+        """Retorna, na ordem do select, as opções cujo texto contém o valor buscado"""
+        busca = normalizar_texto(valor_buscado)
+        if not busca:
+            return []
+
+        if len(busca) < TAMANHO_NGRAMA:
+            candidatas = range(len(self.opcoes))
+        else:
+            conjuntos = [self.ngramas.get(ngrama, set()) for ngrama in self._ngramas(busca)]
+            candidatas = sorted(set.intersection(*conjuntos))
+
+        return [self.opcoes[posicao] for posicao in candidatas if busca in self.textos[posicao]]
+
+    def resolver(self, valor_buscado):
+        """
+        Resolve um filtro para uma opção do select
+
+        Args:
+            valor_buscado: Valor ou texto (completo ou parcial) da opção
+
+        Returns:
+            Tupla (opcao, tipo, candidatas): tipo é 'valor', 'texto', 'parcial'
+            ou None; candidatas lista todas as opções da busca parcial
+        """
+        chave = str(valor_buscado).strip()
+
+        if chave in self.por_valor:
+            return self.por_valor[chave], 'valor', []
+
+        texto = normalizar_texto(chave)
+        if texto in self.por_texto:
+            return self.por_texto[texto], 'texto', []
+
+        candidatas = self.buscar_parcial(chave)
+        if candidatas:
+            return candidatas[0], 'parcial', candidatas
+
+        return None, None, []
+
+
+def construir_indices(selects):
+    """Constrói um IndiceOpcoes para cada select do formulário"""
+    return {nome: IndiceOpcoes(opcoes) for nome, opcoes in selects.items()}
+
+
+class CacheFormulario:
+    """Mantém o formulário analisado em memória até expirar ou o token ser rejeitado"""
+
+    def __init__(self, ttl=CACHE_FORMULARIO_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._parametros = None
+        self._carregado_em = None
+
+    def valido(self):
+        """Indica se há um formulário em cache dentro do prazo de validade"""
+        return (
+            self._parametros is not None
+            and time.monotonic() - self._carregado_em < self.ttl
+        )
+
+    def obter(self, carregar):
+        """
+        Retorna o formulário em cache ou carrega um novo
+
+        Args:
+            carregar: Função sem argumentos que busca e analisa o formulário
+
+        Returns:
+            Dict com os parâmetros do formulário (ou o retorno de carregar, se vazio)
+        """
+        with self._lock:
+            if self.valido():
+                logger.info("Usando formulário em cache")
+                return self._parametros
+
+            parametros = carregar()
+            if parametros:
+                self._parametros = parametros
+                self._carregado_em = time.monotonic()
+
+            return parametros
+
+    def invalidar(self):
+        """Descarta o formulário em cache (ex.: authenticity_token rejeitado)"""
+        with self._lock:
+            self._parametros = None
+            self._carregado_em = None
+        logger.info("Cache do formulário invalidado")
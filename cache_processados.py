@@ -0,0 +1,100 @@
+"""
+cache_processados.py - Cache dos relatórios já processados pelo 2_processar_dados.py
+
+Guarda os alunos normalizados de cada planilha (resultado do
+processar_relatorio) em Parquet, identificados pelo hash do conteúdo do
+.xlsx e pela versão das regras de normalização. Planilhas que não mudaram
+carregam do Parquet em milissegundos; só os downloads novos (ou uma mudança
+nas regras) passam de novo pela leitura do Excel.
+"""
+import hashlib
+import logging
+import os
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Configurações
+CACHE_PROCESSADOS_PASTA = "cache_processados"
+TAMANHO_BLOCO_HASH = 1024 * 1024
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
+
+def hash_arquivo(caminho_arquivo):
+    """SHA-256 do conteúdo de um arquivo"""
+    sha = hashlib.sha256()
+    with open(caminho_arquivo, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO_HASH), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+class CacheProcessados:
+    """Alunos processados por conteúdo de planilha e versão das regras, em Parquet"""
+
+    def __init__(self, versao_regras, pasta=CACHE_PROCESSADOS_PASTA):
+        self.versao_regras = versao_regras
+        self.pasta = pasta
+        self.ativo = PARQUET_DISPONIVEL
+        if not self.ativo:
+            logger.warning("pyarrow não instalado, cache de relatórios processados desativado")
+
+    def chave(self, caminho_arquivo):
+        """Chave do cache de uma planilha (hash do conteúdo + versão das regras)"""
+        return f"{hash_arquivo(caminho_arquivo)}_{self.versao_regras}"
+
+    def _arquivo(self, chave):
+        return os.path.join(self.pasta, f"{chave}.parquet")
+
+    def obter(self, chave):
+        """Alunos em cache para a chave (DataFrame), ou None"""
+        if not self.ativo:
+            return None
+
+        arquivo = self._arquivo(chave)
+        if not os.path.exists(arquivo):
+            return None
+
+        try:
+            return pd.read_parquet(arquivo)
+        except Exception as e:
+            logger.warning(f"Cache de processados ilegível ({arquivo}), reprocessando: {str(e)}")
+            return None
+
+    def guardar(self, chave, alunos):
+        """Grava os alunos processados de uma planilha"""
+        if not self.ativo:
+            return
+
+        arquivo = self._arquivo(chave)
+        # Gravar num temporário e renomear: outro processo nunca lê um Parquet pela metade
+        temporario = f"{arquivo}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.pasta, exist_ok=True)
+            alunos.to_parquet(temporario, index=False)
+            os.replace(temporario, arquivo)
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar o cache de processados: {str(e)}")
+            if os.path.exists(temporario):
+                os.remove(temporario)
+
+    def limpar_obsoletos(self):
+        """Remove as entradas de outras versões das regras; retorna quantas foram removidas"""
+        if not os.path.isdir(self.pasta):
+            return 0
+
+        removidas = 0
+        for nome in os.listdir(self.pasta):
+            if nome.endswith('.parquet') and not nome.endswith(f"_{self.versao_regras}.parquet"):
+                os.remove(os.path.join(self.pasta, nome))
+                removidas += 1
+
+        if removidas:
+            logger.info(f"{removidas} entrada(s) de regras antigas removida(s) do cache de processados")
+        return removidas
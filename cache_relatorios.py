@@ -0,0 +1,139 @@
+"""
+cache_relatorios.py - Cache local de relatórios já baixados
+
+Os relatórios são identificados pelos campos do formulário já resolvidos
+(sem o authenticity_token). Relatórios baixados depois que o semestre de
+ingresso se encerrou ficam no cache indefinidamente; os baixados com o
+semestre ainda aberto expiram em pouco tempo, pois ainda mudavam com
+matrículas e cancelamentos (mesmo que o semestre já tenha se encerrado).
+
+Cada relatório em cache tem dois arquivos com o nome da chave: a planilha
+(.xlsx) e seus dados (.json, período e data). Sem índice compartilhado, a
+página e os workers podem guardar relatórios ao mesmo tempo sem perder as
+entradas uns dos outros.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Configurações
+CACHE_RELATORIOS_PASTA = "cache_relatorios"
+VALIDADE_PERIODO_ABERTO = 6 * 3600    # 6 horas para semestres ainda abertos
+SEMESTRES_ABERTOS = 1                 # Quantos semestres (a partir do atual) contam como abertos
+CAMPOS_IGNORADOS = ('authenticity_token', 'utf8')
+
+
+def semestre_atual(hoje=None):
+    """Retorna (ano, semestre) da data informada (padrão: hoje)"""
+    hoje = hoje or datetime.now()
+    return hoje.year, 1 if hoje.month <= 6 else 2
+
+
+def extrair_ano_semestre(periodo):
+    """Converte '2021/1°' ou '2021.1' em (2021, 1); None se não reconhecer"""
+    match = re.search(r'(\d{4})\D+([12])', str(periodo))
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+class CacheRelatorios:
+    """Guarda relatórios baixados por conjunto de campos do formulário"""
+
+    def __init__(self, pasta=CACHE_RELATORIOS_PASTA, validade_periodo_aberto=VALIDADE_PERIODO_ABERTO,
+                 semestres_abertos=SEMESTRES_ABERTOS):
+        self.pasta = pasta
+        self.validade_periodo_aberto = validade_periodo_aberto
+        self.semestres_abertos = semestres_abertos
+
+    def _entrada(self, chave):
+        """Dados do relatório em cache para a chave, ou None"""
+        arquivo_entrada = os.path.join(self.pasta, f"{chave}.json")
+        if not os.path.exists(arquivo_entrada):
+            return None
+
+        try:
+            with open(arquivo_entrada, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Não foi possível ler a entrada {arquivo_entrada} do cache de relatórios: {str(e)}")
+            return None
+
+    @staticmethod
+    def chave(dados_formulario):
+        """Gera a chave do cache a partir dos campos resolvidos do formulário"""
+        campos = {k: v for k, v in dados_formulario.items() if k not in CAMPOS_IGNORADOS}
+        conteudo = json.dumps(campos, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+    def validade(self, periodo, criado_em=None):
+        """
+        Define por quanto tempo um relatório do período fica válido
+
+        Args:
+            periodo: Semestre de ingresso do relatório (None: sem período definido)
+            criado_em: Quando o relatório foi guardado (padrão: agora); o semestre
+                é considerado encerrado ou aberto nessa data
+
+        Returns:
+            None para semestres já encerrados ao guardar (sem expiração) ou segundos de validade
+        """
+        ano_semestre = extrair_ano_semestre(periodo) if periodo is not None else None
+        if ano_semestre is None:
+            return self.validade_periodo_aberto
+
+        ano, semestre = semestre_atual(datetime.fromtimestamp(criado_em) if criado_em else None)
+        # Índice linear de semestres para comparar períodos
+        atual = ano * 2 + semestre - 1
+        periodo_idx = ano_semestre[0] * 2 + ano_semestre[1] - 1
+
+        if atual - periodo_idx >= self.semestres_abertos:
+            return None
+        return self.validade_periodo_aberto
+
+    def obter(self, dados_formulario, periodo):
+        """Retorna o caminho do relatório em cache, ou None se ausente/expirado"""
+        entrada = self._entrada(self.chave(dados_formulario))
+        if not entrada or not os.path.exists(entrada['arquivo']):
+            return None
+
+        validade = self.validade(periodo, entrada['criado_em'])
+        if validade is not None and time.time() - entrada['criado_em'] > validade:
+            logger.info(f"Cache expirado para {periodo}")
+            return None
+
+        logger.info(f"Relatório de {periodo} obtido do cache: {entrada['arquivo']}")
+        return entrada['arquivo']
+
+    def guardar(self, dados_formulario, periodo, arquivo):
+        """Copia um relatório baixado para o cache e retorna o caminho em cache"""
+        chave = self.chave(dados_formulario)
+        destino = os.path.join(self.pasta, f"{chave}.xlsx")
+
+        entrada = {
+            'arquivo': destino,
+            'periodo': periodo,
+            'criado_em': time.time()
+        }
+
+        # Gravar em temporários e renomear: outro processo nunca lê uma entrada
+        # pela metade, e a planilha já está completa quando a entrada aparece
+        os.makedirs(self.pasta, exist_ok=True)
+        sufixo = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(arquivo, destino + sufixo)
+        os.replace(destino + sufixo, destino)
+
+        arquivo_entrada = os.path.join(self.pasta, f"{chave}.json")
+        with open(arquivo_entrada + sufixo, 'w', encoding='utf-8') as f:
+            json.dump(entrada, f, ensure_ascii=False, indent=2)
+        os.replace(arquivo_entrada + sufixo, arquivo_entrada)
+
+        return destino
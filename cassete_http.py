@@ -0,0 +1,338 @@
+"""
+cassete_http.py - Gravação e reprodução das requisições ao sistema UFF
+
+No modo "gravar", todas as sessões criadas por sessao_http.criar_sessao
+gravam cada requisição e resposta (login, formulário, polling, downloads)
+num cassete em JSON lines, um arquivo por processo (a página e o worker
+não sobrescrevem a gravação um do outro). O corpo é copiado à medida que o
+programa o lê, então downloads com stream=True continuam em blocos. No
+modo "reproduzir", as sessões não acessam a rede: cada requisição recebe a
+resposta gravada para o mesmo método e URL, na ordem em que foram
+gravadas, o que permite repetir uma execução real e medir o custo de
+análise e processamento sem credenciais e sem variação do servidor.
+
+Ativação pelo ambiente (vale para a página, o worker e o benchmark):
+
+    UFF_CASSETE=execucao.cassete.jsonl UFF_CASSETE_MODO=gravar streamlit run main.py
+    # grava execucao.cassete.<pid>.jsonl
+    UFF_CASSETE=execucao.cassete.12345.jsonl UFF_CASSETE_MODO=reproduzir UFF_CASSETE_TEMPO=0 \\
+        python -m cProfile -o perfil.out worker_relatorios.py --uma-vez
+
+Na reprodução o tempo é comprimido por UFF_CASSETE_TEMPO (1 mantém o tempo
+original, 0 responde na hora): cada resposta sai no instante gravado
+(instante_s + latencia_s, contados do início) multiplicado pelo fator, e
+as esperas do próprio programa entre verificações passam pelo Relogio do
+cassete, que dorme só a fração do fator e adianta o restante. O programa
+vê os mesmos intervalos e prazos da gravação.
+
+O cassete contém cookies de sessão e tokens das respostas: trate-o como o
+arquivo da sessão salva (não versionar nem compartilhar).
+"""
+import base64
+import gzip
+import http.client
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import extract_cookies_to_jar
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+logger = logging.getLogger(__name__)
+
+MODOS_CASSETE = ('gravar', 'reproduzir')
+VERSAO_CASSETE = 1
+
+# Headers que não valem para o corpo gravado (já descomprimido e completo)
+HEADERS_DESCARTADOS = ('content-encoding', 'transfer-encoding', 'content-length')
+
+# Corpo copiado em memória até esse tamanho; acima disso, em arquivo temporário
+LIMITE_CORPO_MEMORIA = 1024 * 1024
+BLOCO_BASE64 = 3 * 256 * 1024    # múltiplo de 3: os blocos em base64 se concatenam sem padding
+
+_cassete_ambiente = None
+_arquivo_ambiente = None
+_lock_ambiente = threading.Lock()
+
+
+def _abrir(arquivo, modo):
+    if arquivo.endswith('.gz'):
+        return gzip.open(arquivo, modo + 't', encoding='utf-8')
+    return open(arquivo, modo, encoding='utf-8')
+
+
+def _sem_query(url):
+    partes = urlparse(url)
+    return f"{partes.scheme}://{partes.netloc}{partes.path}"
+
+
+def arquivo_do_processo(arquivo):
+    """Cassete de gravação deste processo: execucao.cassete.jsonl -> execucao.cassete.<pid>.jsonl"""
+    compactado = '.gz' if arquivo.endswith('.gz') else ''
+    raiz, extensao = os.path.splitext(arquivo[:len(arquivo) - len(compactado)])
+    return f"{raiz}.{os.getpid()}{extensao}{compactado}"
+
+
+class Relogio:
+    """
+    Relógio das esperas do programa (intervalos de polling, prazos)
+
+    Com fator_tempo 1 é o time.monotonic/time.sleep. Com um fator menor, cada
+    espera dorme só essa fração e o restante é somado a um deslocamento: o
+    programa vê o tempo passar como se tivesse esperado tudo.
+    """
+
+    def __init__(self, fator_tempo=1.0):
+        self.fator_tempo = fator_tempo
+        self._deslocamento = 0.0
+        self._lock = threading.Lock()
+
+    def monotonic(self):
+        return time.monotonic() + self._deslocamento
+
+    def sleep(self, segundos):
+        if segundos <= 0:
+            return
+        alvo = self.monotonic() + segundos
+        time.sleep(segundos * self.fator_tempo)
+        # Pelo alvo, e não somando a espera: threads esperando juntas não adiantam o relógio em dobro
+        with self._lock:
+            self._deslocamento += max(0.0, alvo - self.monotonic())
+
+    def esperar_ate(self, instante):
+        self.sleep(instante - self.monotonic())
+
+
+RELOGIO_REAL = Relogio()
+
+
+def relogio():
+    """Relógio do cassete em reprodução (tempo comprimido) ou o relógio real"""
+    cassete = cassete_do_ambiente()
+    return cassete.relogio if cassete and cassete.modo == 'reproduzir' else RELOGIO_REAL
+
+
+class _CorpoCopiado:
+    """
+    Envolve a resposta do urllib3 copiando o corpo à medida que é lido
+
+    Quando a leitura termina (ou a resposta é fechada), entrega a cópia a
+    ao_terminar. Sem leitura antecipada: stream=True continua em blocos.
+    """
+
+    def __init__(self, raw, ao_terminar):
+        self._raw = raw
+        self._copia = tempfile.SpooledTemporaryFile(max_size=LIMITE_CORPO_MEMORIA)
+        self._ao_terminar = ao_terminar
+
+    def __getattr__(self, nome):
+        return getattr(self._raw, nome)
+
+    def _terminar(self):
+        ao_terminar, self._ao_terminar = self._ao_terminar, None
+        if ao_terminar:
+            with self._copia:
+                ao_terminar(self._copia)
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        for bloco in self._raw.stream(amt, decode_content=decode_content):
+            if self._ao_terminar:
+                self._copia.write(bloco)
+            yield bloco
+        self._terminar()
+
+    def read(self, amt=None, *args, **kwargs):
+        bloco = self._raw.read(amt, *args, **kwargs)
+        if self._ao_terminar:
+            self._copia.write(bloco)
+            if amt is None or not bloco:
+                self._terminar()
+        return bloco
+
+    def close(self):
+        self._terminar()
+        self._raw.close()
+
+
+class _CorpoGravado(io.BytesIO):
+    """Substitui a resposta do urllib3: corpo em memória e headers para o cookie jar"""
+
+    def __init__(self, corpo, headers):
+        super().__init__(corpo)
+        mensagem = http.client.HTTPMessage()
+        for nome, valor in headers:
+            mensagem[nome] = valor
+        self._original_response = SimpleNamespace(msg=mensagem)
+
+
+class CasseteHTTP:
+    """Cassete de requisições e respostas HTTP, em JSON lines"""
+
+    def __init__(self, arquivo, modo='gravar', fator_tempo=1.0):
+        if modo not in MODOS_CASSETE:
+            raise ValueError(f"Modo de cassete inválido: {modo} (use {' ou '.join(MODOS_CASSETE)})")
+
+        self.arquivo = arquivo
+        self.modo = modo
+        self.fator_tempo = fator_tempo
+        self.relogio = Relogio(fator_tempo)
+        self.interacoes = []
+        self._lock = threading.Lock()
+        self.inicio = time.monotonic()
+
+        if modo == 'gravar':
+            with _abrir(arquivo, 'w') as f:
+                f.write(json.dumps({'versao': VERSAO_CASSETE,
+                                    'gravado_em': datetime.now().isoformat(timespec='seconds')}) + '\n')
+            os.chmod(arquivo, 0o600)
+            logger.info(f"Gravando requisições HTTP em {arquivo}")
+        else:
+            self._carregar()
+
+    def _carregar(self):
+        with _abrir(self.arquivo, 'r') as f:
+            cabecalho = json.loads(f.readline())
+            if cabecalho.get('versao') != VERSAO_CASSETE:
+                raise ValueError(f"Versão de cassete não suportada: {cabecalho.get('versao')}")
+            self.interacoes = [json.loads(linha) for linha in f if linha.strip()]
+
+        # Filas por método + URL e, para URLs com parâmetros variáveis, por método + caminho
+        self._por_url = {}
+        self._por_caminho = {}
+        for indice, interacao in enumerate(self.interacoes):
+            self._por_url.setdefault((interacao['metodo'], interacao['url']), deque()).append(indice)
+            self._por_caminho.setdefault((interacao['metodo'], _sem_query(interacao['url'])), deque()).append(indice)
+        self._usadas = set()
+        self._ultima = {}
+
+        logger.info(f"Reproduzindo {len(self.interacoes)} requisição(ões) de {self.arquivo}")
+
+    def gravar(self, request, response, inicio):
+        """
+        Grava uma requisição e a resposta recebida (inicio é o time.monotonic do envio)
+
+        A interação vai para o cassete quando o programa terminar de ler o
+        corpo ou fechar a resposta.
+        """
+        headers = getattr(response.raw.headers, 'iteritems', response.raw.headers.items)() \
+            if response.raw is not None and hasattr(response.raw, 'headers') else response.headers.items()
+        interacao = {
+            'metodo': request.method,
+            'url': request.url,
+            'status': response.status_code,
+            'motivo': response.reason,
+            'headers': [[nome, valor] for nome, valor in headers if nome.lower() not in HEADERS_DESCARTADOS],
+            'latencia_s': round(time.monotonic() - inicio, 4),
+            'instante_s': round(inicio - self.inicio, 4),
+        }
+        response.raw = _CorpoCopiado(response.raw, lambda corpo: self._escrever(interacao, corpo))
+
+    def _escrever(self, interacao, corpo):
+        # O corpo em base64 é escrito em blocos, sem montar a linha inteira na memória
+        linha = json.dumps(interacao, ensure_ascii=False)
+        corpo.seek(0)
+        with self._lock, _abrir(self.arquivo, 'a') as f:
+            f.write(linha[:-1] + ', "corpo": "')
+            for bloco in iter(lambda: corpo.read(BLOCO_BASE64), b''):
+                f.write(base64.b64encode(bloco).decode('ascii'))
+            f.write('"}\n')
+
+    def _proxima(self, chave, filas):
+        fila = filas.get(chave)
+        while fila:
+            indice = fila.popleft()
+            if indice not in self._usadas:
+                return indice
+        return None
+
+    def reproduzir(self, metodo, url):
+        """
+        Interação gravada para a requisição
+
+        Usa a próxima gravada com o mesmo método e URL (ou o mesmo caminho, se
+        só os parâmetros mudaram). Esgotadas, repete a última servida para a
+        URL, o que cobre verificações de status a mais que na gravação.
+        """
+        with self._lock:
+            indice = self._proxima((metodo, url), self._por_url)
+            if indice is None:
+                indice = self._proxima((metodo, _sem_query(url)), self._por_caminho)
+            if indice is None:
+                indice = self._ultima.get((metodo, url), self._ultima.get((metodo, _sem_query(url))))
+            if indice is None:
+                raise requests.exceptions.ConnectionError(f"Requisição não gravada no cassete: {metodo} {url}")
+
+            self._usadas.add(indice)
+            self._ultima[(metodo, url)] = indice
+            self._ultima[(metodo, _sem_query(url))] = indice
+            return self.interacoes[indice]
+
+
+class AdaptadorReproducao(HTTPAdapter):
+    """HTTPAdapter que responde com as interações do cassete, sem acessar a rede"""
+
+    def __init__(self, cassete, **kwargs):
+        self.cassete = cassete
+        super().__init__(**kwargs)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        interacao = self.cassete.reproduzir(request.method, request.url)
+        # A resposta sai no instante em que chegou na gravação, no tempo comprimido do relógio
+        self.cassete.relogio.esperar_ate(
+            self.cassete.inicio + interacao['instante_s'] + interacao['latencia_s']
+        )
+
+        corpo = base64.b64decode(interacao['corpo'])
+        headers = interacao['headers'] + [['Content-Length', str(len(corpo))]]
+
+        response = requests.Response()
+        response.status_code = interacao['status']
+        response.reason = interacao['motivo']
+        response.headers = CaseInsensitiveDict()
+        for nome, valor in headers:
+            anterior = response.headers.get(nome)
+            response.headers[nome] = f"{anterior}, {valor}" if anterior else valor
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = _CorpoGravado(corpo, headers)
+        response._content = corpo
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        extract_cookies_to_jar(response.cookies, request, response.raw)
+        return response
+
+
+def cassete_do_ambiente():
+    """
+    Cassete configurado por UFF_CASSETE / UFF_CASSETE_MODO / UFF_CASSETE_TEMPO (um por processo), ou None
+
+    Na gravação, o arquivo de cada processo leva o pid (ver arquivo_do_processo).
+    """
+    global _cassete_ambiente, _arquivo_ambiente
+
+    arquivo = os.environ.get('UFF_CASSETE')
+    if not arquivo:
+        return None
+
+    with _lock_ambiente:
+        if _cassete_ambiente is None or _arquivo_ambiente != arquivo:
+            modo = os.environ.get('UFF_CASSETE_MODO', 'reproduzir')
+            _cassete_ambiente = CasseteHTTP(
+                arquivo_do_processo(arquivo) if modo == 'gravar' else arquivo,
+                modo=modo,
+                fator_tempo=float(os.environ.get('UFF_CASSETE_TEMPO', '1'))
+            )
+            _arquivo_ambiente = arquivo
+        return _cassete_ambiente
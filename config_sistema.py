@@ -11,6 +11,10 @@ LOGOUT_URL = "https://app.uff.br/auth/realms/master/protocol/openid-connect/logo
 # DIRETÓRIOS
 RELATORIOS_FOLDER = "relatorios_baixados"
 ARQUIVO_LISTA = "arquivos_relatorios.txt"
+ARQUIVO_DIARIO_JOBS = "diario_jobs.db"   # Diário SQLite dos jobs, ao lado de RELATORIOS_FOLDER
+ARQUIVO_FILA_RELATORIOS = "fila_relatorios.db"   # Fila SQLite entre a página e o worker
+ARQUIVO_METRICAS_JSONL = "metricas_relatorios.jsonl"   # Etapas de cada job (JSON lines)
+ARQUIVO_METRICAS_PROMETHEUS = "metricas_relatorios.prom"   # Totais por etapa (textfile do Prometheus)
 
 # TIMEOUTS E INTERVALOS
 TIMEOUT_PROCESSAMENTO = 600  # 10 minutos para processar um relatório
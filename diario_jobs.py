@@ -0,0 +1,157 @@
+"""
+diario_jobs.py - Diário persistente (SQLite) dos jobs de relatório
+
+Registra, para cada job, os filtros, o relatorio_id devolvido na submissão,
+a conta do pool que o submeteu, o status e o arquivo baixado. Uma execução
+interrompida (rerun do Streamlit, processo encerrado) retoma de onde parou:
+jobs concluídos não são refeitos e relatórios já submetidos voltam a ser
+acompanhados em vez de submetidos de novo.
+
+O diário é compartilhado, mas cada registro pertence à conta de quem pediu
+o job (solicitante): uma execução só retoma e só limpa os registros da
+própria conta.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from cassete_http import relogio
+from config_sistema import ARQUIVO_DIARIO_JOBS
+
+logger = logging.getLogger(__name__)
+
+# Registros mais antigos são ignorados na retomada (o relatório pode ter mudado)
+VALIDADE_DIARIO = 24 * 3600
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    chave TEXT PRIMARY KEY,
+    curso TEXT,
+    periodo TEXT,
+    filtros TEXT NOT NULL,
+    relatorio_id TEXT,
+    status TEXT NOT NULL,
+    submetido_em REAL,
+    arquivo TEXT,
+    erro TEXT,
+    atualizado_em REAL NOT NULL,
+    conta TEXT,
+    solicitante TEXT
+)
+"""
+
+# Colunas acrescentadas depois da primeira versão do diário
+MIGRACOES = (
+    "ALTER TABLE jobs ADD COLUMN conta TEXT",
+    "ALTER TABLE jobs ADD COLUMN solicitante TEXT",
+)
+
+
+def chave_job(filtros, solicitante=None):
+    """Identifica o job pela conta do solicitante e pelos filtros (JSON com chaves ordenadas)"""
+    return json.dumps({'solicitante': solicitante, 'filtros': filtros}, sort_keys=True, ensure_ascii=False)
+
+
+class DiarioJobs:
+    """Diário SQLite dos jobs do AgendadorRelatorios, restrito à conta do solicitante"""
+
+    def __init__(self, arquivo=ARQUIVO_DIARIO_JOBS, validade=VALIDADE_DIARIO, solicitante=None):
+        self.arquivo = arquivo
+        self.validade = validade
+        self.solicitante = solicitante      # conta de quem pede os jobs (ver fila_relatorios.py)
+        self._lock = threading.Lock()
+
+        with closing(self._conectar()) as conexao, conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute(ESQUEMA)
+            for migracao in MIGRACOES:
+                try:
+                    conexao.execute(migracao)
+                except sqlite3.OperationalError:
+                    pass    # coluna já existe
+
+    def _conectar(self):
+        conexao = sqlite3.connect(self.arquivo, timeout=30)
+        conexao.row_factory = sqlite3.Row
+        return conexao
+
+    def registrar(self, job):
+        """Grava o estado atual de um job"""
+        submetido_em = None
+        if job.get('submetido_em') is not None:
+            # submetido_em do job é do relógio do agendador; no diário fica o horário de parede
+            submetido_em = time.time() - (relogio().monotonic() - job['submetido_em'])
+
+        with self._lock, closing(self._conectar()) as conexao, conexao:
+            conexao.execute(
+                """
+                INSERT INTO jobs (chave, curso, periodo, filtros, relatorio_id, status,
+                                  submetido_em, arquivo, erro, atualizado_em, conta, solicitante)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(chave) DO UPDATE SET
+                    curso = excluded.curso, periodo = excluded.periodo,
+                    relatorio_id = excluded.relatorio_id, status = excluded.status,
+                    submetido_em = excluded.submetido_em, arquivo = excluded.arquivo,
+                    erro = excluded.erro, atualizado_em = excluded.atualizado_em,
+                    conta = excluded.conta
+                """,
+                (
+                    chave_job(job['filtros'], self.solicitante), job.get('curso'), job.get('periodo'),
+                    json.dumps(job['filtros'], ensure_ascii=False),
+                    str(job['relatorio_id']) if job.get('relatorio_id') is not None else None,
+                    job['status'], submetido_em, job.get('arquivo'), job.get('error'), time.time(),
+                    job.get('conta'), self.solicitante
+                )
+            )
+
+    def obter(self, filtros):
+        """Registro de um job do solicitante pelos filtros, ou None"""
+        with closing(self._conectar()) as conexao:
+            linha = conexao.execute("SELECT * FROM jobs WHERE chave = ?",
+                                    (chave_job(filtros, self.solicitante),)).fetchone()
+        return dict(linha) if linha else None
+
+    def retomar(self, job):
+        """
+        Aplica ao job o estado registrado numa execução anterior
+
+        - CONCLUIDO com arquivo ainda em disco: o job já sai concluído
+        - SUBMETIDO: o job volta a acompanhar o mesmo relatorio_id
+        - ERRO, registro vencido ou arquivo ausente: o job é refeito
+
+        Returns:
+            True se o job foi retomado
+        """
+        registro = self.obter(job['filtros'])
+        if not registro or time.time() - registro['atualizado_em'] > self.validade:
+            return False
+
+        if registro['status'] == 'CONCLUIDO' and registro['arquivo'] and os.path.exists(registro['arquivo']):
+            job['status'] = 'CONCLUIDO'
+            job['arquivo'] = registro['arquivo']
+            job['relatorio_id'] = registro['relatorio_id']
+            logger.info(f"Job retomado do diário (concluído): {job['curso']} - {job['periodo']}")
+            return True
+
+        if registro['status'] == 'SUBMETIDO' and registro['relatorio_id']:
+            agora = relogio().monotonic()
+            job['status'] = 'SUBMETIDO'
+            job['relatorio_id'] = registro['relatorio_id']
+            job['conta'] = registro['conta']
+            job['submetido_em'] = agora - (time.time() - (registro['submetido_em'] or time.time()))
+            job['proxima_verificacao'] = agora
+            logger.info(f"Job retomado do diário (relatório {registro['relatorio_id']} já submetido): "
+                        f"{job['curso']} - {job['periodo']}")
+            return True
+
+        return False
+
+    def limpar(self):
+        """Descarta os registros do solicitante (os de outras contas ficam)"""
+        with self._lock, closing(self._conectar()) as conexao, conexao:
+            removidos = conexao.execute("DELETE FROM jobs WHERE solicitante IS ?", (self.solicitante,)).rowcount
+        logger.info(f"Diário de jobs limpo ({removidos} registro(s) da conta)")
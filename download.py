@@ -0,0 +1,89 @@
+"""
+download.py - Download de relatórios direto para o disco
+
+Grava o arquivo em blocos (sem manter o conteúdo inteiro em memória) e
+retoma downloads interrompidos com requisições HTTP Range quando o
+servidor permite.
+"""
+import logging
+import os
+import re
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Configurações
+TAMANHO_BLOCO = 64 * 1024    # 64 KB por escrita
+TENTATIVAS_DOWNLOAD = 3
+SUFIXO_PARCIAL = '.part'
+
+
+def nome_arquivo_seguro(*partes):
+    """Monta um nome de arquivo a partir de partes livres (curso, período, ID...)"""
+    nome = '_'.join(str(parte) for parte in partes if parte)
+    return re.sub(r'[^\w.-]+', '_', nome).strip('_')
+
+
+def baixar_para_arquivo(session, url, destino, timeout=30, tentativas=TENTATIVAS_DOWNLOAD):
+    """
+    Baixa uma URL para um arquivo, em blocos, retomando se interrompido
+
+    O conteúdo é gravado em destino + '.part' e renomeado ao final, para que
+    um arquivo com o nome final esteja sempre completo.
+
+    Args:
+        session: requests.Session autenticada
+        url: URL do arquivo
+        destino: Caminho final do arquivo
+        timeout: Timeout de cada requisição
+        tentativas: Quantas vezes retomar após falhas de conexão
+
+    Returns:
+        Caminho do arquivo baixado
+    """
+    pasta = os.path.dirname(destino)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+
+    parcial = destino + SUFIXO_PARCIAL
+
+    for tentativa in range(1, tentativas + 1):
+        inicio = os.path.getsize(parcial) if os.path.exists(parcial) else 0
+        # Sem compressão: os offsets do Range precisam bater com os bytes gravados
+        headers = {'Accept-Encoding': 'identity'}
+        if inicio:
+            headers['Range'] = f'bytes={inicio}-'
+
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if inicio and response.status_code == 416:
+                    # Nada a buscar além do que já temos: o parcial está completo
+                    logger.info(f"Download já completo em {parcial}")
+                    break
+
+                response.raise_for_status()
+
+                if inicio and response.status_code == 206:
+                    logger.info(f"Retomando download a partir de {inicio} bytes")
+                    modo = 'ab'
+                else:
+                    # Servidor ignorou o Range: recomeçar do zero
+                    modo = 'wb'
+
+                with open(parcial, modo) as f:
+                    for bloco in response.iter_content(chunk_size=TAMANHO_BLOCO):
+                        if bloco:
+                            f.write(bloco)
+            break
+
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout) as e:
+            logger.warning(f"Download interrompido (tentativa {tentativa}/{tentativas}): {str(e)}")
+            if tentativa == tentativas:
+                raise
+
+    os.replace(parcial, destino)
+    logger.info(f"Download completo: {destino} ({os.path.getsize(destino)} bytes)")
+    return destino
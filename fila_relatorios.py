@@ -0,0 +1,301 @@
+"""
+fila_relatorios.py - Fila local (SQLite) de pedidos de relatório
+
+A página do Streamlit só enfileira lotes de pedidos (curso × período) e
+acompanha o progresso; os processos do worker_relatorios.py reservam os
+lotes e executam a geração. Vários usuários e vários workers podem usar a
+mesma fila: a reserva é atômica e pedidos de um worker que parou de dar
+sinal de vida voltam para a fila.
+
+Cada lote guarda a conta de quem o pediu (solicitante): o worker só
+reserva lotes cujo solicitante tem sessão válida no pool e gera o lote com
+essa conta (e com as contas compartilhadas), nunca com a de outro usuário.
+
+Status dos pedidos: NA_FILA → EM_EXECUCAO → CONCLUIDO ou ERRO
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing, contextmanager
+
+from config_sistema import ARQUIVO_FILA_RELATORIOS
+
+logger = logging.getLogger(__name__)
+
+# Pedidos em execução sem sinal de vida há mais tempo voltam para a fila
+TEMPO_ORFAO = 10 * 60
+# Workers sem sinal de vida há mais tempo não contam como ativos
+TEMPO_TRABALHADOR_ATIVO = 60
+# Segundos entre sinais de vida durante a execução de um lote
+INTERVALO_SINAL_VIDA = 30
+# Prefixo dos executores que são a própria página (não contam como workers)
+PREFIXO_PAGINA = "pagina:"
+
+STATUS_FINAIS = ('CONCLUIDO', 'ERRO')
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS lotes (
+    id TEXT PRIMARY KEY,
+    criado_em REAL NOT NULL,
+    solicitante TEXT,
+    opcoes TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pedidos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lote TEXT NOT NULL REFERENCES lotes(id),
+    ordem INTEGER NOT NULL,
+    curso TEXT,
+    periodo TEXT,
+    filtros TEXT NOT NULL,
+    status TEXT NOT NULL,
+    mensagem TEXT,
+    arquivo TEXT,
+    erro TEXT,
+    trabalhador TEXT,
+    atualizado_em REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pedidos_status ON pedidos (status, lote);
+CREATE TABLE IF NOT EXISTS trabalhadores (
+    id TEXT PRIMARY KEY,
+    visto_em REAL NOT NULL
+);
+"""
+
+
+class FilaRelatorios:
+    """Fila SQLite compartilhada entre a página e os workers"""
+
+    def __init__(self, arquivo=ARQUIVO_FILA_RELATORIOS):
+        self.arquivo = arquivo
+        self._lock = threading.Lock()
+
+        with closing(self._conectar()) as conexao, conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.executescript(ESQUEMA)
+
+    def _conectar(self):
+        conexao = sqlite3.connect(self.arquivo, timeout=30, isolation_level=None)
+        conexao.row_factory = sqlite3.Row
+        return conexao
+
+    def _executar(self, sql, parametros=()):
+        with self._lock, closing(self._conectar()) as conexao:
+            return conexao.execute(sql, parametros).rowcount
+
+    def enfileirar(self, pedidos, opcoes=None, solicitante=None):
+        """
+        Enfileira um lote de pedidos
+
+        Args:
+            pedidos: Lista de tuplas (curso, periodo, filtros)
+            opcoes: Dict com as opções do lote (ex.: usar_cache, agregado)
+            solicitante: Conta de quem pediu (identificador da conta, ver
+                         pool_sessoes.py); o lote é gerado com a sessão dela
+
+        Returns:
+            ID do lote
+        """
+        lote = uuid.uuid4().hex[:12]
+        agora = time.time()
+
+        with self._lock, closing(self._conectar()) as conexao:
+            conexao.execute("BEGIN IMMEDIATE")
+            conexao.execute("INSERT INTO lotes (id, criado_em, solicitante, opcoes) VALUES (?, ?, ?, ?)",
+                            (lote, agora, solicitante, json.dumps(opcoes or {})))
+            conexao.executemany(
+                """
+                INSERT INTO pedidos (lote, ordem, curso, periodo, filtros, status, atualizado_em)
+                VALUES (?, ?, ?, ?, ?, 'NA_FILA', ?)
+                """,
+                [(lote, ordem, curso, periodo, json.dumps(filtros, ensure_ascii=False), agora)
+                 for ordem, (curso, periodo, filtros) in enumerate(pedidos)]
+            )
+            conexao.execute("COMMIT")
+
+        logger.info(f"Lote {lote} enfileirado com {len(pedidos)} pedido(s)")
+        return lote
+
+    def ha_pendentes(self):
+        """Indica se há pedidos esperando na fila"""
+        with closing(self._conectar()) as conexao:
+            return conexao.execute("SELECT 1 FROM pedidos WHERE status = 'NA_FILA' LIMIT 1").fetchone() is not None
+
+    def reservar_lote(self, trabalhador, lote=None, solicitantes=None, sem_solicitante=True):
+        """
+        Reserva os pedidos na fila do lote mais antigo (ou do lote indicado)
+
+        Args:
+            trabalhador: Identificação de quem vai executar o lote
+            lote: Lote a reservar; None escolhe o mais antigo
+            solicitantes: Na escolha, só lotes destas contas (None: qualquer uma)
+            sem_solicitante: Na escolha com solicitantes, aceitar também lotes sem conta
+
+        Returns:
+            Dict com 'id', 'solicitante', 'trabalhador', 'opcoes' e 'pedidos'
+            (lista de dicts), ou None se não houver lote a reservar
+        """
+        with self._lock, closing(self._conectar()) as conexao:
+            conexao.execute("BEGIN IMMEDIATE")
+            try:
+                if lote is None:
+                    filtro, parametros = '', []
+                    if solicitantes is not None:
+                        filtro = (f"AND (lotes.solicitante IN ({','.join('?' * len(solicitantes))})"
+                                  f"{' OR lotes.solicitante IS NULL' if sem_solicitante else ''})")
+                        parametros = list(solicitantes)
+                    linha = conexao.execute(
+                        f"""
+                        SELECT pedidos.lote FROM pedidos JOIN lotes ON lotes.id = pedidos.lote
+                        WHERE pedidos.status = 'NA_FILA' {filtro}
+                        ORDER BY pedidos.id LIMIT 1
+                        """,
+                        parametros
+                    ).fetchone()
+                    if linha is None:
+                        conexao.execute("COMMIT")
+                        return None
+                    lote = linha['lote']
+
+                ids = [linha['id'] for linha in conexao.execute(
+                    "SELECT id FROM pedidos WHERE lote = ? AND status = 'NA_FILA' ORDER BY ordem", (lote,)
+                )]
+                if not ids:
+                    conexao.execute("COMMIT")
+                    return None
+
+                conexao.executemany(
+                    """
+                    UPDATE pedidos SET status = 'EM_EXECUCAO', trabalhador = ?, mensagem = 'Reservado',
+                                       atualizado_em = ?
+                    WHERE id = ?
+                    """,
+                    [(trabalhador, time.time(), pedido_id) for pedido_id in ids]
+                )
+                dados_lote = conexao.execute("SELECT solicitante, opcoes FROM lotes WHERE id = ?", (lote,)).fetchone()
+                pedidos = conexao.execute(
+                    f"SELECT * FROM pedidos WHERE id IN ({','.join('?' * len(ids))}) ORDER BY ordem", ids
+                ).fetchall()
+                conexao.execute("COMMIT")
+            except Exception:
+                conexao.execute("ROLLBACK")
+                raise
+
+        logger.info(f"Lote {lote} reservado por {trabalhador} ({len(pedidos)} pedido(s))")
+        return {
+            'id': lote,
+            'solicitante': dados_lote['solicitante'] if dados_lote else None,
+            'trabalhador': trabalhador,
+            'opcoes': json.loads(dados_lote['opcoes']) if dados_lote else {},
+            'pedidos': [dict(pedido, filtros=json.loads(pedido['filtros'])) for pedido in pedidos],
+        }
+
+    def atualizar(self, pedido_id, status=None, mensagem=None, arquivo=None, erro=None, trabalhador=None):
+        """
+        Atualiza um pedido (campos None ficam como estão)
+
+        Args:
+            trabalhador: Só atualiza se o pedido ainda estiver com esse
+                         trabalhador (não sobrescreve um pedido devolvido à
+                         fila pelo liberar_orfaos e reservado por outro)
+
+        Returns:
+            True se o pedido foi atualizado
+        """
+        condicao, parametros = "id = ?", [pedido_id]
+        if trabalhador is not None:
+            condicao += " AND trabalhador = ?"
+            parametros.append(trabalhador)
+        return self._executar(
+            f"""
+            UPDATE pedidos SET status = COALESCE(?, status), mensagem = COALESCE(?, mensagem),
+                               arquivo = COALESCE(?, arquivo), erro = COALESCE(?, erro),
+                               atualizado_em = ?
+            WHERE {condicao}
+            """,
+            (status, mensagem, arquivo, erro, time.time(), *parametros)
+        ) > 0
+
+    def sinal_vida(self, trabalhador):
+        """Registra que o worker está ativo e renova os pedidos que ele executa"""
+        agora = time.time()
+        with self._lock, closing(self._conectar()) as conexao:
+            conexao.execute("BEGIN IMMEDIATE")
+            conexao.execute(
+                "INSERT INTO trabalhadores (id, visto_em) VALUES (?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET visto_em = excluded.visto_em",
+                (trabalhador, agora)
+            )
+            conexao.execute(
+                "UPDATE pedidos SET atualizado_em = ? WHERE trabalhador = ? AND status = 'EM_EXECUCAO'",
+                (agora, trabalhador)
+            )
+            conexao.execute("COMMIT")
+
+    def devolver_lote(self, lote, trabalhador, motivo):
+        """Devolve à fila os pedidos de um lote reservados pelo trabalhador e ainda não iniciados"""
+        return self._executar(
+            """
+            UPDATE pedidos SET status = 'NA_FILA', trabalhador = NULL, mensagem = ?, atualizado_em = ?
+            WHERE lote = ? AND trabalhador = ? AND status = 'EM_EXECUCAO'
+            """,
+            (motivo, time.time(), lote, trabalhador)
+        )
+
+    @contextmanager
+    def manter_sinal_vida(self, trabalhador, intervalo=INTERVALO_SINAL_VIDA):
+        """
+        Dá sinal de vida pelo trabalhador, numa thread, enquanto o bloco executa
+
+        Sem isso, os pedidos de um lote demorado passam de TEMPO_ORFAO e
+        liberar_orfaos os devolve à fila enquanto ainda estão sendo gerados.
+        """
+        terminou = threading.Event()
+
+        def manter():
+            while not terminou.wait(intervalo):
+                try:
+                    self.sinal_vida(trabalhador)
+                except Exception as e:
+                    logger.warning(f"Falha ao registrar sinal de vida: {str(e)}")
+
+        thread = threading.Thread(target=manter, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            terminou.set()
+            thread.join()
+
+    def liberar_orfaos(self, tempo=TEMPO_ORFAO):
+        """Devolve à fila os pedidos de workers que pararam de dar sinal de vida"""
+        liberados = self._executar(
+            """
+            UPDATE pedidos SET status = 'NA_FILA', trabalhador = NULL,
+                               mensagem = 'Devolvido à fila (worker sem sinal de vida)'
+            WHERE status = 'EM_EXECUCAO' AND atualizado_em < ?
+            """,
+            (time.time() - tempo,)
+        )
+        if liberados:
+            logger.warning(f"{liberados} pedido(s) devolvido(s) à fila")
+        return liberados
+
+    def pedidos(self, lote):
+        """Pedidos de um lote, na ordem em que foram enfileirados"""
+        with closing(self._conectar()) as conexao:
+            linhas = conexao.execute("SELECT * FROM pedidos WHERE lote = ? ORDER BY ordem", (lote,)).fetchall()
+        return [dict(linha, filtros=json.loads(linha['filtros'])) for linha in linhas]
+
+    def lote_finalizado(self, lote):
+        """Indica se todos os pedidos do lote terminaram"""
+        pedidos = self.pedidos(lote)
+        return bool(pedidos) and all(pedido['status'] in STATUS_FINAIS for pedido in pedidos)
+
+    def trabalhadores_ativos(self, tempo=TEMPO_TRABALHADOR_ATIVO):
+        """Quantos workers deram sinal de vida recentemente"""
+        with closing(self._conectar()) as conexao:
+            return conexao.execute("SELECT COUNT(*) FROM trabalhadores WHERE visto_em >= ? AND id NOT LIKE ?",
+                                   (time.time() - tempo, PREFIXO_PAGINA + '%')).fetchone()[0]
@@ -0,0 +1,151 @@
+"""
+limitador.py - Limite de taxa e de concorrência das requisições ao sistema UFF
+
+- LimitadorRequisicoes: um balde de tokens por tipo de endpoint (login,
+  formulário, submissão, polling, download), compartilhado pelo processo
+- GovernadorConcorrencia: limita quantos relatórios ficam em processamento
+  ao mesmo tempo, reduzindo o limite quando a latência ou a taxa de erros
+  sobem e aumentando aos poucos enquanto o servidor responde bem
+"""
+import logging
+import re
+import statistics
+import threading
+import time
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Limites por endpoint: (requisições por segundo, rajada máxima)
+LIMITES_PADRAO = {
+    'login': (0.5, 8),        # o login passa por vários redirects
+    'formulario': (1.0, 2),
+    'submissao': (0.5, 3),
+    'polling': (2.0, 5),
+    'download': (2.0, 4),
+    'outros': (5.0, 10),
+}
+
+# Governador de concorrência
+CONCORRENCIA_INICIAL = 4
+CONCORRENCIA_MINIMA = 1
+CONCORRENCIA_MAXIMA = 12
+LATENCIA_ALVO = 2.0          # segundos até os headers da resposta
+TAXA_ERRO_MAXIMA = 0.2
+JANELA_AMOSTRAS = 20
+
+
+def classificar_endpoint(metodo, url):
+    """Classifica uma requisição no tipo de endpoint usado pelos limites"""
+    caminho = urlparse(url).path
+
+    if '/auth/' in caminho or caminho.rstrip('/').endswith('/administracaoacademica'):
+        return 'login'
+    if caminho.endswith('/listagens_alunos'):
+        return 'submissao' if metodo.upper() == 'POST' else 'formulario'
+    if re.search(r'\.(xlsx|xls|csv)$', caminho, re.I) or re.search(r'/relatorios/\d+/(download|file|export)', caminho):
+        return 'download'
+    if re.search(r'/relatorios(/\d+)?/?$', caminho):
+        return 'polling'
+    return 'outros'
+
+
+class BaldeTokens:
+    """Balde de tokens: permite rajadas até a capacidade e repõe tokens a uma taxa fixa"""
+
+    def __init__(self, taxa, capacidade):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.tokens = capacidade
+        self.atualizado_em = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        """Bloqueia até haver um token disponível e o consome; retorna o tempo esperado"""
+        esperado = 0.0
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado_em) * self.taxa)
+                self.atualizado_em = agora
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return esperado
+
+                espera = (1 - self.tokens) / self.taxa
+
+            time.sleep(espera)
+            esperado += espera
+
+
+class LimitadorRequisicoes:
+    """Aplica o balde de tokens do tipo de endpoint antes de cada requisição"""
+
+    def __init__(self, limites=None):
+        limites = limites or LIMITES_PADRAO
+        self.baldes = {tipo: BaldeTokens(taxa, capacidade) for tipo, (taxa, capacidade) in limites.items()}
+
+    def aguardar(self, metodo, url):
+        """Espera a vez da requisição; retorna o tipo de endpoint"""
+        tipo = classificar_endpoint(metodo, url)
+        balde = self.baldes.get(tipo) or self.baldes.get('outros')
+
+        if balde:
+            esperado = balde.adquirir()
+            if esperado > 0.5:
+                logger.debug(f"Requisição de {tipo} aguardou {esperado:.1f}s pelo limite de taxa")
+
+        return tipo
+
+
+class GovernadorConcorrencia:
+    """
+    Controla o número de relatórios em processamento simultâneo (AIMD)
+
+    A cada janela de amostras: se a taxa de erros ou a latência mediana
+    passarem do alvo, o limite cai pela metade; se estiverem saudáveis,
+    o limite sobe em um.
+    """
+
+    def __init__(self, inicial=CONCORRENCIA_INICIAL, minimo=CONCORRENCIA_MINIMA,
+                 maximo=CONCORRENCIA_MAXIMA, latencia_alvo=LATENCIA_ALVO,
+                 taxa_erro_maxima=TAXA_ERRO_MAXIMA, janela=JANELA_AMOSTRAS):
+        self.limite = inicial
+        self.minimo = minimo
+        self.maximo = maximo
+        self.latencia_alvo = latencia_alvo
+        self.taxa_erro_maxima = taxa_erro_maxima
+        self.janela = janela
+        self._amostras = []
+        self._lock = threading.Lock()
+
+    def vagas(self, em_andamento):
+        """Quantos jobs novos podem ser iniciados agora"""
+        return max(0, self.limite - em_andamento)
+
+    def registrar(self, latencia, erro=False):
+        """Registra o resultado de uma requisição e ajusta o limite ao fechar a janela"""
+        with self._lock:
+            self._amostras.append((latencia, erro))
+            if len(self._amostras) < self.janela:
+                return
+
+            taxa_erro = sum(1 for _, e in self._amostras if e) / len(self._amostras)
+            latencia_mediana = statistics.median(l for l, _ in self._amostras)
+            self._amostras = []
+
+            anterior = self.limite
+            if taxa_erro > self.taxa_erro_maxima or latencia_mediana > self.latencia_alvo:
+                self.limite = max(self.minimo, self.limite // 2)
+            else:
+                self.limite = min(self.maximo, self.limite + 1)
+
+            if self.limite != anterior:
+                logger.info(f"Concorrência ajustada: {anterior} → {self.limite} "
+                            f"(erros: {taxa_erro:.0%}, latência mediana: {latencia_mediana:.2f}s)")
+
+
+# Instâncias compartilhadas pelo processo (todas as sessões falam com o mesmo servidor)
+LIMITADOR_PADRAO = LimitadorRequisicoes()
+GOVERNADOR_PADRAO = GovernadorConcorrencia()
@@ -0,0 +1,170 @@
+"""
+login_oidc.py - Login pelo endpoint de token OpenID Connect do Keycloak
+
+Alternativa ao preenchimento do formulário HTML de login: obtém os tokens
+direto do endpoint de token (grant "password") e os renova com o refresh
+token, que é uma única requisição JSON pequena em vez de um novo login.
+
+Só funciona se o realm permitir "direct access grants" para o cliente
+configurado (UFF_OIDC_CLIENT_ID); caso contrário o LoginUFF volta ao login
+pelo formulário.
+"""
+import logging
+import threading
+import time
+
+import requests
+from requests.auth import AuthBase
+
+logger = logging.getLogger(__name__)
+
+# Renovar o access token quando faltar menos que isso para expirar
+MARGEM_RENOVACAO = 30
+TIMEOUT_TOKEN = 15
+
+
+def _sem_autenticacao(request):
+    # As chamadas ao endpoint de token não levam o Bearer da sessão
+    return request
+
+
+class ClienteTokenOIDC:
+    """Obtém e renova tokens no endpoint de token do Keycloak"""
+
+    def __init__(self, session, token_url, client_id, client_secret=None, tokens=None):
+        self.session = session
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.tokens = tokens or {}
+        self.ultimo_erro = None
+        self._lock = threading.RLock()
+
+    def _solicitar(self, dados):
+        dados = dict(dados, client_id=self.client_id)
+        if self.client_secret:
+            dados['client_secret'] = self.client_secret
+
+        try:
+            response = self.session.post(
+                self.token_url, data=dados, timeout=TIMEOUT_TOKEN,
+                headers={'Accept': 'application/json'}, auth=_sem_autenticacao
+            )
+        except requests.exceptions.RequestException as e:
+            self.ultimo_erro = {'error': 'conexao', 'error_description': str(e)}
+            logger.warning(f"Endpoint de token indisponível: {str(e)}")
+            return None
+
+        try:
+            resposta = response.json()
+        except ValueError:
+            resposta = {}
+
+        if response.status_code != 200 or 'access_token' not in resposta:
+            self.ultimo_erro = {
+                'error': resposta.get('error', f"http_{response.status_code}"),
+                'error_description': resposta.get('error_description', ''),
+            }
+            logger.warning(f"Endpoint de token recusou a solicitação: {self.ultimo_erro['error']} "
+                           f"{self.ultimo_erro['error_description']}")
+            return None
+
+        agora = time.time()
+        self.tokens = {
+            'access_token': resposta['access_token'],
+            'refresh_token': resposta.get('refresh_token', self.tokens.get('refresh_token')),
+            'expira_em': agora + resposta.get('expires_in', 300),
+            'refresh_expira_em': agora + resposta['refresh_expires_in'] if resposta.get('refresh_expires_in')
+            else self.tokens.get('refresh_expira_em'),
+        }
+        self.ultimo_erro = None
+        return self.tokens
+
+    def credenciais_recusadas(self):
+        """Indica se a última falha foi CPF ou senha inválidos (não adianta tentar o formulário)"""
+        return bool(self.ultimo_erro) and self.ultimo_erro['error'] == 'invalid_grant' \
+            and 'credentials' in self.ultimo_erro['error_description'].lower()
+
+    def obter_token(self, usuario, senha):
+        """Login com usuário e senha (grant password); retorna os tokens ou None"""
+        logger.info("Solicitando tokens ao endpoint OIDC")
+        return self._solicitar({'grant_type': 'password', 'username': usuario,
+                                'password': senha, 'scope': 'openid'})
+
+    def renovar(self):
+        """Renova o access token com o refresh token; retorna os tokens ou None"""
+        refresh_token = self.tokens.get('refresh_token')
+        if not refresh_token:
+            return None
+        if self.tokens.get('refresh_expira_em') and self.tokens['refresh_expira_em'] <= time.time():
+            logger.info("Refresh token expirado")
+            return None
+
+        logger.info("Renovando access token")
+        return self._solicitar({'grant_type': 'refresh_token', 'refresh_token': refresh_token})
+
+    def token_atual(self):
+        """Access token válido, renovando se estiver para expirar; None se não houver como renovar"""
+        with self._lock:
+            if self.tokens.get('access_token') and self.tokens.get('expira_em', 0) - MARGEM_RENOVACAO > time.time():
+                return self.tokens['access_token']
+            if self.renovar():
+                return self.tokens['access_token']
+            return None
+
+    def renovar_recusado(self, token_recusado):
+        """
+        Renova depois que o servidor recusou token_recusado; retorna os tokens ou None
+
+        Se outra thread já trocou o access token enquanto esta esperava o lock,
+        usa o token novo em vez de renovar de novo (o refresh token pode ter
+        sido rotacionado).
+        """
+        with self._lock:
+            if self.tokens.get('access_token') and self.tokens['access_token'] != token_recusado:
+                return self.tokens
+            return self.renovar()
+
+
+class AutenticacaoBearer(AuthBase):
+    """
+    Autenticação da requests.Session com o access token do ClienteTokenOIDC
+
+    Renova o token antes de expirar e, se o servidor responder 401, renova
+    e repete a requisição uma vez pela mesma requests.Session (a repetição
+    passa pelo adaptador e pelos hooks da sessão como qualquer requisição).
+    """
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+
+    def __call__(self, request):
+        token = self.cliente.token_atual()
+        if token:
+            request.headers['Authorization'] = f"Bearer {token}"
+            request.register_hook('response', self._repetir_em_401)
+        return request
+
+    def _repetir_em_401(self, response, **kwargs):
+        if response.status_code != 401 or getattr(response.request, '_repetida_oidc', False):
+            return response
+
+        token_recusado = response.request.headers.get('Authorization', '').removeprefix('Bearer ')
+        tokens = self.cliente.renovar_recusado(token_recusado)
+        if not tokens:
+            return response
+
+        response.content  # liberar a conexão
+        response.close()
+        nova = response.request.copy()
+        nova.headers['Authorization'] = f"Bearer {tokens['access_token']}"
+        nova._repetida_oidc = True
+        # Pela sessão (adaptador, cookies e hooks): os hooks depois deste já recebem
+        # a resposta repetida no despacho em andamento, então só os anteriores vão junto
+        hooks = nova.hooks['response']
+        nova.hooks = dict(nova.hooks, response=hooks[:hooks.index(self._repetir_em_401)])
+        repetida = self.cliente.session.send(nova, allow_redirects=False, **kwargs)
+        nova.hooks['response'] = hooks
+        repetida.history.append(response)
+        repetida.request = nova
+        return repetida
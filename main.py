@@ -8,25 +8,49 @@ import requests
 import time
 import os
 import re
-from bs4 import BeautifulSoup
+import openpyxl
 import pandas as pd
 import logging
 from datetime import datetime
 import json
 from urllib.parse import urljoin, urlparse
 import io
+import uuid
+
+from cache_formulario import CacheFormulario, construir_indices
+from cache_relatorios import CacheRelatorios, extrair_ano_semestre
+from cassete_http import relogio
+from config_sistema import ARQUIVO_LISTA, RELATORIOS_FOLDER
+from diario_jobs import DiarioJobs
+from download import baixar_para_arquivo, nome_arquivo_seguro
+from fila_relatorios import PREFIXO_PAGINA, STATUS_FINAIS, FilaRelatorios
+from limitador import GOVERNADOR_PADRAO
+from metricas import METRICAS_PADRAO
+from login_oidc import AutenticacaoBearer, ClienteTokenOIDC
+from parser_html import (
+    analisar_formularios, analisar_pagina_relatorio, analisar_tokens, criar_soup
+)
+from polling import PoliticaPolling
+from pool_sessoes import registrar_conta, remover_conta
+from relatorio_agregado import agrupar_jobs, dividir_relatorio
+from sessao_http import criar_sessao
+from sessao_persistente import ArmazemSessao, arquivo_navegador, identificador_protegido, novo_token_navegador
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configurações
-BASE_URL = "https://app.uff.br"
-APLICACAO_URL = "https://app.uff.br/graduacao/administracaoacademica"
-LOGIN_URL = "https://app.uff.br/auth/realms/master/protocol/openid-connect/auth"
-TOKEN_URL = "https://app.uff.br/auth/realms/master/protocol/openid-connect/token"
+# Configurações (UFF_BASE_URL permite apontar para o servidor_mock_uff.py)
+BASE_URL = os.environ.get("UFF_BASE_URL", "https://app.uff.br")
+APLICACAO_URL = f"{BASE_URL}/graduacao/administracaoacademica"
+LOGIN_URL = f"{BASE_URL}/auth/realms/master/protocol/openid-connect/auth"
+TOKEN_URL = f"{BASE_URL}/auth/realms/master/protocol/openid-connect/token"
 LISTAGEM_ALUNOS_URL = f"{APLICACAO_URL}/relatorios/listagens_alunos"
 
+# Login pelo endpoint de token OIDC (opcional; sem client id, só o formulário)
+OIDC_CLIENT_ID = os.environ.get("UFF_OIDC_CLIENT_ID")
+OIDC_CLIENT_SECRET = os.environ.get("UFF_OIDC_CLIENT_SECRET")
+
 # Headers para simular navegador
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -38,6 +62,8 @@ HEADERS = {
 }
 
 TIMEOUT_REQUESTS = 30
+INTERVALO_ATUALIZACAO_PAGINA = 3     # segundos entre atualizações do progresso do lote
+PARAMETRO_SESSAO = "sessao"          # parâmetro do endereço com o token do navegador (lembrar sessão)
 
 # Mapeamento de Desdobramentos (Ajuste para filtros corretos)
 DESDOBRAMENTOS_CURSOS = {
@@ -64,18 +90,107 @@ FORMAS_INGRESSO = {
     '2': 'SISU 2ª Edição'
 }
 
+def montar_filtros(curso_key, periodo):
+    """Monta os filtros do formulário de listagem para um curso e período ('2025/1°')"""
+    curso_info = DESDOBRAMENTOS_CURSOS[curso_key]
+    semestre = '1' if '1°' in periodo else '2'
+    
+    return {
+        'report_filter_localidade': 'Niterói',
+        'report_filter_curso': curso_info['buscar_por'],
+        'report_filter_desdobramento': curso_info['valor'],
+        'report_filter_forma_ingresso': FORMAS_INGRESSO[semestre],
+        'report_filter_ano_semestre_ingresso': periodo
+    }
+
+
 class LoginUFF:
-    """Classe para fazer login via CPF e Senha usando método testado"""
+    """
+    Classe para fazer login via CPF e Senha usando método testado
+    
+    Com um client id OIDC configurado, tenta antes o endpoint de token
+    (tokens renovados automaticamente) e volta ao formulário se o realm ou
+    a aplicação não aceitarem.
+    """
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update(HEADERS)
+    def __init__(self, armazem_sessao=None, client_id=OIDC_CLIENT_ID, client_secret=OIDC_CLIENT_SECRET):
+        self.session = criar_sessao(HEADERS)
         self.is_authenticated = False
         self.auth_data = {}
+        self.armazem_sessao = armazem_sessao
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.cliente_oidc = None
+        self.conta = None       # identificador_protegido do CPF
+    
+    def restaurar_sessao(self):
+        """Reaproveita a sessão salva em disco, se ainda for válida"""
+        if not self.armazem_sessao or not self.armazem_sessao.carregar(self.session):
+            return False
+        
+        self.conta = self.armazem_sessao.conta
+        # Tokens salvos: o access token é renovado pelo refresh token se tiver expirado
+        if self.armazem_sessao.tokens and self.client_id:
+            self._ativar_oidc(ClienteTokenOIDC(self.session, TOKEN_URL, self.client_id,
+                                               self.client_secret, self.armazem_sessao.tokens))
+        
+        self.is_authenticated = True
+        if self.check_session():
+            logger.info("✅ Sessão salva reaproveitada, login não necessário")
+            return True
+        
+        logger.info("Sessão salva não é mais aceita pelo servidor")
+        self.is_authenticated = False
+        self._desativar_oidc()
+        self.session.cookies.clear()
+        self.armazem_sessao.apagar()
+        return False
+    
+    def salvar_sessao(self, armazem=None):
+        """Grava cookies, tokens OIDC e conta no armazém informado ou no da sessão, se houver"""
+        armazem = armazem or self.armazem_sessao
+        if armazem:
+            armazem.salvar(self.session, self.cliente_oidc.tokens if self.cliente_oidc else None, self.conta)
+    
+    def _ativar_oidc(self, cliente):
+        self.cliente_oidc = cliente
+        self.session.auth = AutenticacaoBearer(cliente)
+    
+    def _desativar_oidc(self):
+        self.cliente_oidc = None
+        self.session.auth = None
+    
+    def login_por_token(self, cpf, senha):
+        """
+        Login pelo endpoint de token OIDC
+        
+        Returns:
+            'ok' se a aplicação aceitou o token, 'recusado' se o Keycloak
+            recusou CPF/senha, 'indisponivel' se for preciso usar o formulário
+        """
+        if not self.client_id:
+            return 'indisponivel'
+        
+        cliente = ClienteTokenOIDC(self.session, TOKEN_URL, self.client_id, self.client_secret)
+        if not cliente.obter_token(cpf, senha):
+            return 'recusado' if cliente.credenciais_recusadas() else 'indisponivel'
+        
+        self._ativar_oidc(cliente)
+        self.is_authenticated = True
+        if self.check_session():
+            self.auth_data['metodo'] = 'oidc'
+            self.salvar_sessao()
+            logger.info("✅ Login realizado pelo endpoint de token OIDC")
+            return 'ok'
+        
+        logger.info("A aplicação não aceitou o token OIDC; usando o login pelo formulário")
+        self.is_authenticated = False
+        self._desativar_oidc()
+        return 'indisponivel'
     
     def extract_login_parameters(self, html_content):
         """Extrai parâmetros do formulário de login (função que estava funcionando)"""
-        soup = BeautifulSoup(html_content, 'html.parser')
+        soup = analisar_formularios(html_content)
         
         # Primeiro, tentar encontrar o formulário pelo ID
         login_form = soup.find('form', {'id': 'kc-form-login'})
@@ -110,7 +225,7 @@ class LoginUFF:
     
     def _extract_csrf_token(self, html_content):
         """Extrai token CSRF do HTML"""
-        soup = BeautifulSoup(html_content, 'html.parser')
+        soup = analisar_tokens(html_content)
         
         # Procurar meta tag CSRF
         meta_token = soup.find('meta', {'name': 'csrf-token'})
@@ -129,7 +244,17 @@ class LoginUFF:
         """Realiza login no sistema UFF usando a lógica que estava funcionando"""
         try:
             st.info("Conectando ao portal UFF...")
-            logger.info(f"Tentando login para CPF: {cpf}")
+            self.conta = identificador_protegido(cpf)
+            logger.info(f"Tentando login da conta {self.conta[:8]}")
+            
+            # 0. Endpoint de token OIDC, quando configurado
+            resultado_token = self.login_por_token(cpf, senha)
+            if resultado_token == 'ok':
+                st.success("✅ Login realizado com sucesso!")
+                return True
+            if resultado_token == 'recusado':
+                st.error("Erro de autenticação: CPF ou senha inválidos")
+                return False
             
             # 1. Acessar a página inicial da aplicação
             login_page_url = APLICACAO_URL
@@ -201,6 +326,8 @@ class LoginUFF:
                     # Salvar informações da sessão
                     self.auth_data['cookies'] = dict(self.session.cookies)
                     self.auth_data['headers'] = dict(self.session.headers)
+                    self.auth_data['metodo'] = 'formulario'
+                    self.salvar_sessao()
                     
                     # Verificar acesso à página de relatórios
                     test_url = f"{APLICACAO_URL}/relatorios"
@@ -216,7 +343,7 @@ class LoginUFF:
                         return True
                 else:
                     # Verificar se há mensagem de erro
-                    soup = BeautifulSoup(login_response.text, 'html.parser')
+                    soup = criar_soup(login_response.text)
                     
                     # Procurar mensagens de erro do Keycloak
                     error_div = soup.find('div', {'id': 'kc-error-message'}) or \
@@ -266,15 +393,15 @@ class LoginUFF:
         """Retorna a sessão autenticada"""
         return self.session if self.is_authenticated else None
     
-    def check_session(self):
-        """Verifica se a sessão ainda é válida"""
+    def check_session(self, session=None):
+        """Verifica se a sessão ainda é válida (session: cópia a usar no lugar da sessão do login)"""
         if not self.is_authenticated:
             return False
         
         try:
             # Tentar acessar uma página que requer autenticação
             test_url = f"{APLICACAO_URL}/relatorios"
-            response = self.session.get(test_url, timeout=10, allow_redirects=False)
+            response = (session or self.session).get(test_url, timeout=10, allow_redirects=False)
             
             # Se for redirecionado para login, sessão expirou
             if response.status_code == 302:
@@ -291,16 +418,22 @@ class LoginUFF:
 class GeradorRelatorios:
     """Classe para gerar relatórios com filtros corretos"""
     
-    def __init__(self, session):
+    def __init__(self, session, politica_polling=None, cache_formulario=None, metricas=None):
         self.session = session
         self.base_url = APLICACAO_URL
+        self.politica_polling = politica_polling or PoliticaPolling()
+        self.cache_formulario = cache_formulario or CacheFormulario()
+        self.metricas = metricas or METRICAS_PADRAO
+        self.metricas.observar_sessao(session)
+        self.relogio = relogio()    # esperas do polling (comprimidas ao reproduzir um cassete)
     
     def acessar_pagina_listagem(self):
-        """Acessa a página de listagem de alunos"""
+        """Acessa a página de listagem de alunos e retorna o HTML"""
         try:
-            response = self.session.get(LISTAGEM_ALUNOS_URL, timeout=10)
-            response.raise_for_status()
-            return BeautifulSoup(response.text, 'html.parser')
+            with self.metricas.etapa('acesso'):
+                response = self.session.get(LISTAGEM_ALUNOS_URL, timeout=10)
+                response.raise_for_status()
+            return response.text
         except Exception as e:
             logger.error(f"Erro ao acessar página de listagem: {str(e)}")
             raise
@@ -348,9 +481,17 @@ class GeradorRelatorios:
         
         return parametros
     
-    def preencher_formulario_com_filtros(self, parametros, filtros):
-        """Preenche o formulário com filtros específicos"""
+    def resolver_formulario(self, parametros, filtros):
+        """
+        Preenche o formulário com os filtros usando o índice de opções dos selects
+        
+        Returns:
+            Tupla (dados_formulario, ambiguidades), onde ambiguidades mapeia cada
+            campo resolvido por busca parcial com mais de uma opção possível
+            para os textos dessas opções
+        """
         dados_formulario = {}
+        ambiguidades = {}
         
         # Adicionar token CSRF
         if parametros.get('authenticity_token'):
@@ -361,38 +502,34 @@ class GeradorRelatorios:
             if input_info['value']:
                 dados_formulario[name] = input_info['value']
         
-        # Aplicar filtros com busca específica
+        if 'indices' not in parametros:
+            parametros['indices'] = construir_indices(parametros['selects'])
+        indices = parametros['indices']
+        
+        # Aplicar filtros: valor exato, texto exato e, por fim, busca parcial
         for campo, valor_buscado in filtros.items():
-            if campo in parametros['selects']:
-                opcoes = parametros['selects'][campo]
-                valor_encontrado = False
-                
-                for opcao in opcoes:
-                    # Busca exata ou parcial
-                    if str(opcao['value']).strip() == str(valor_buscado).strip():
-                        dados_formulario[campo] = opcao['value']
-                        logger.info(f"Filtro exato: {campo} = {valor_buscado} (valor: {opcao['value']})")
-                        valor_encontrado = True
-                        break
-                    elif opcao['text'].strip() == str(valor_buscado).strip():
-                        dados_formulario[campo] = opcao['value']
-                        logger.info(f"Filtro por texto: {campo} = {valor_buscado} (valor: {opcao['value']})")
-                        valor_encontrado = True
-                        break
-                
-                if not valor_encontrado:
-                    # Busca parcial para desdobramentos
-                    for opcao in opcoes:
-                        if valor_buscado in opcao['text']:
-                            dados_formulario[campo] = opcao['value']
-                            logger.info(f"Filtro parcial: {campo} = {valor_buscado} encontrado em {opcao['text']} (valor: {opcao['value']})")
-                            valor_encontrado = True
-                            break
-                
-                if not valor_encontrado:
-                    logger.warning(f"Filtro não encontrado: {campo} = {valor_buscado}")
-                    logger.warning(f"Opções disponíveis: {[o['text'] for o in opcoes]}")
+            if campo not in indices:
+                continue
+            
+            opcao, tipo, candidatas = indices[campo].resolver(valor_buscado)
+            
+            if opcao is None:
+                logger.warning(f"Filtro não encontrado: {campo} = {valor_buscado} "
+                               f"({len(indices[campo].opcoes)} opções disponíveis)")
+                continue
+            
+            dados_formulario[campo] = opcao['value']
+            logger.info(f"Filtro {tipo}: {campo} = {valor_buscado} encontrado em {opcao['text']} (valor: {opcao['value']})")
+            
+            if len(candidatas) > 1:
+                ambiguidades[campo] = [candidata['text'] for candidata in candidatas]
+                logger.warning(f"Filtro ambíguo: {campo} = {valor_buscado} corresponde a {len(candidatas)} opções")
         
+        return dados_formulario, ambiguidades
+    
+    def preencher_formulario_com_filtros(self, parametros, filtros):
+        """Preenche o formulário com filtros específicos"""
+        dados_formulario, _ = self.resolver_formulario(parametros, filtros)
         return dados_formulario
     
     def submeter_formulario(self, dados_formulario):
@@ -424,6 +561,9 @@ class GeradorRelatorios:
                 logger.error("Não foi possível extrair o ID do relatório")
                 return {'success': False, 'error': 'ID do relatório não encontrado'}
             
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"Erro ao submeter formulário: {str(e)}")
+            return {'success': False, 'error': str(e), 'status_code': e.response.status_code}
         except Exception as e:
             logger.error(f"Erro ao submeter formulário: {str(e)}")
             return {'success': False, 'error': str(e)}
@@ -435,23 +575,20 @@ class GeradorRelatorios:
             response = self.session.get(url, timeout=10)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Procurar link de download
-            download_links = soup.find_all('a', {'href': re.compile(r'\.xlsx')})
+            # Links de download e etapas de processamento, numa única análise
+            download_links, etapas = analisar_pagina_relatorio(response.text, r'\.xlsx')
             
             if download_links:
                 return {
                     'status': 'PRONTO',
-                    'download_url': urljoin(self.base_url, download_links[0].get('href', ''))
+                    'download_url': urljoin(self.base_url, download_links[0])
                 }
             else:
                 # Verificar etapas de processamento
-                steps = soup.find_all('div', {'class': 'step'})
-                if steps:
+                if etapas:
                     return {
                         'status': 'EM_PROCESSAMENTO',
-                        'etapas': len(steps)
+                        'etapas': etapas
                     }
                 else:
                     return {'status': 'DESCONHECIDO'}
@@ -460,64 +597,170 @@ class GeradorRelatorios:
             logger.error(f"Erro ao verificar status: {str(e)}")
             return {'status': 'ERRO', 'error': str(e)}
     
-    def aguardar_relatorio(self, relatorio_id, max_tentativas=60):
-        """Aguarda o relatório ficar pronto"""
-        tentativa = 0
-        while tentativa < max_tentativas:
+    def verificar_status_relatorios(self, relatorio_ids):
+        """
+        Verifica vários relatórios com uma única requisição à página /relatorios
+        
+        Retorna um dict {relatorio_id: status_info}. IDs que não aparecem no
+        índice ficam como DESCONHECIDO, para verificação individual.
+        """
+        pendentes = {str(relatorio_id) for relatorio_id in relatorio_ids}
+        
+        try:
+            url = f"{self.base_url}/relatorios"
+            response = self.session.get(url, timeout=10)
+            response.raise_for_status()
+            
+            # Apenas as linhas da tabela e os links interessam
+            soup = criar_soup(response.text, ['tr', 'a'])
+        except Exception as e:
+            logger.error(f"Erro ao verificar índice de relatórios: {str(e)}")
+            return {relatorio_id: {'status': 'ERRO', 'error': str(e)} for relatorio_id in pendentes}
+        
+        resultado = {relatorio_id: {'status': 'DESCONHECIDO'} for relatorio_id in pendentes}
+        
+        # IDs listados no índice (ainda sem arquivo)
+        for link in soup.find_all('a', href=re.compile(r'/relatorios/\d+')):
+            relatorio_id = re.search(r'/relatorios/(\d+)', link['href']).group(1)
+            if relatorio_id in pendentes and resultado[relatorio_id]['status'] == 'DESCONHECIDO':
+                resultado[relatorio_id] = {'status': 'EM_PROCESSAMENTO'}
+        
+        # Links de download: o ID vem do próprio href ou da linha da tabela
+        for link in soup.find_all('a', {'href': re.compile(r'\.xlsx')}):
+            href = link.get('href', '')
+            match = re.search(r'/relatorios/(\d+)', href)
+            if not match:
+                linha = link.find_parent('tr')
+                if linha is None:
+                    continue
+                link_relatorio = linha.find('a', href=re.compile(r'/relatorios/\d+'))
+                if link_relatorio is None:
+                    continue
+                match = re.search(r'/relatorios/(\d+)', link_relatorio['href'])
+            
+            relatorio_id = match.group(1)
+            if relatorio_id in pendentes:
+                resultado[relatorio_id] = {
+                    'status': 'PRONTO',
+                    'download_url': urljoin(self.base_url, href)
+                }
+        
+        return resultado
+    
+    def aguardar_relatorio(self, relatorio_id, filtros=None, timeout=300):
+        """Aguarda o relatório ficar pronto, com intervalos definidos pela política de polling"""
+        chave = PoliticaPolling.chave_filtros(filtros)
+        inicio = self.relogio.monotonic()
+        etapas = None
+        ultimo_pendente = 0
+        
+        while True:
             status_info = self.verificar_status_relatorio(relatorio_id)
+            decorrido = self.relogio.monotonic() - inicio
             
             if status_info['status'] == 'PRONTO':
+                self.politica_polling.registrar_conclusao(chave, decorrido, etapas, ultimo_pendente)
                 return status_info
             elif status_info['status'] == 'ERRO':
                 raise Exception(f"Erro ao verificar status: {status_info.get('error')}")
             
-            tentativa += 1
-            time.sleep(5)  # Aguardar 5 segundos
+            if decorrido >= timeout:
+                break
+            
+            ultimo_pendente = decorrido
+            etapas = status_info.get('etapas', etapas)
+            # Sem passar do prazo: a última verificação acontece no próprio timeout
+            espera = min(self.politica_polling.proximo_intervalo(chave, decorrido, etapas), timeout - decorrido)
+            self.relogio.sleep(espera)
         
         raise Exception(f"Timeout aguardando relatório {relatorio_id}")
     
-    def baixar_relatorio(self, download_url):
-        """Baixa o arquivo Excel do relatório"""
+    def baixar_relatorio(self, download_url, destino=None):
+        """
+        Baixa o arquivo Excel do relatório
+        
+        Sem destino, retorna o conteúdo em memória; com destino, grava o
+        arquivo em disco em blocos (retomando downloads interrompidos) e
+        retorna o caminho.
+        """
         try:
-            response = self.session.get(download_url, timeout=30)
-            response.raise_for_status()
-            return response.content
+            with self.metricas.etapa('download'):
+                if destino:
+                    return baixar_para_arquivo(self.session, download_url, destino)
+                
+                response = self.session.get(download_url, timeout=30)
+                response.raise_for_status()
+                return response.content
         except Exception as e:
             logger.error(f"Erro ao baixar relatório: {str(e)}")
             raise
     
-    def gerar_relatorio_completo(self, filtros, progress_callback=None):
-        """Fluxo completo para gerar um relatório"""
-        try:
+    def obter_parametros_formulario(self, progress_callback=None):
+        """Retorna os parâmetros do formulário, buscando a página apenas se o cache não for válido"""
+        def carregar():
             # 1. Acessar página
             if progress_callback:
                 progress_callback("Acessando página de listagem...", 10)
-            soup = self.acessar_pagina_listagem()
+            html = self.acessar_pagina_listagem()
             
-            # 2. Extrair parâmetros
+            # 2. Extrair parâmetros e indexar as opções dos selects
             if progress_callback:
                 progress_callback("Extraindo parâmetros do formulário...", 20)
-            parametros = self.extrair_parametros_formulario(soup)
-            
-            # 3. Preencher com filtros corretos
-            if progress_callback:
-                progress_callback("Preenchendo formulário com filtros...", 30)
-            dados_form = self.preencher_formulario_com_filtros(parametros, filtros)
+            with self.metricas.etapa('analise'):
+                soup = analisar_formularios(html)
+                parametros = self.extrair_parametros_formulario(soup)
+                parametros['indices'] = construir_indices(parametros['selects'])
+            return parametros
+        
+        return self.cache_formulario.obter(carregar)
+    
+    def montar_formulario(self, filtros, progress_callback=None):
+        """Obtém o formulário e o preenche com os filtros, sem submeter"""
+        # 1-2. Acessar página e extrair parâmetros (ou usar cache)
+        parametros = self.obter_parametros_formulario(progress_callback)
+        
+        # 3. Preencher com filtros corretos
+        if progress_callback:
+            progress_callback("Preenchendo formulário com filtros...", 30)
+        with self.metricas.etapa('preenchimento'):
+            return self.preencher_formulario_com_filtros(parametros, filtros)
+    
+    def submeter_relatorio(self, filtros, progress_callback=None):
+        """Acessa o formulário, aplica os filtros e submete, retornando o ID do relatório"""
+        for tentativa in range(2):
+            # 1-3. Obter e preencher o formulário
+            dados_form = self.montar_formulario(filtros, progress_callback)
             
             # 4. Submeter formulário
             if progress_callback:
                 progress_callback("Submetendo formulário...", 40)
-            resultado = self.submeter_formulario(dados_form)
+            with self.metricas.etapa('submissao') as etapa:
+                resultado = self.submeter_formulario(dados_form)
+                etapa['erro'] = not resultado['success']
             
-            if not resultado['success']:
-                raise Exception(f"Erro ao submeter formulário: {resultado.get('error')}")
-            
-            relatorio_id = resultado['relatorio_id']
+            # 422 = authenticity_token rejeitado: recarregar formulário e tentar de novo
+            if resultado.get('status_code') == 422 and tentativa == 0:
+                logger.warning("Token do formulário rejeitado, recarregando formulário")
+                self.cache_formulario.invalidar()
+                continue
+            break
+        
+        if not resultado['success']:
+            raise Exception(f"Erro ao submeter formulário: {resultado.get('error')}")
+        
+        return resultado['relatorio_id']
+    
+    def gerar_relatorio_completo(self, filtros, progress_callback=None):
+        """Fluxo completo para gerar um relatório"""
+        try:
+            # 1-4. Acessar, preencher e submeter formulário
+            relatorio_id = self.submeter_relatorio(filtros, progress_callback)
             
             # 5. Aguardar processamento
             if progress_callback:
                 progress_callback(f"Aguardando processamento do relatório {relatorio_id}...", 50)
-            status_info = self.aguardar_relatorio(relatorio_id)
+            with self.metricas.etapa('espera', relatorio_id=relatorio_id):
+                status_info = self.aguardar_relatorio(relatorio_id, filtros)
             
             # 6. Baixar arquivo
             if progress_callback:
@@ -534,6 +777,631 @@ class GeradorRelatorios:
             raise
 
 
+class AgendadorRelatorios:
+    """
+    Agenda vários relatórios de uma vez: submete todos os jobs primeiro e
+    depois acompanha e baixa todos juntos, para que o servidor da UFF
+    processe os relatórios em paralelo.
+    
+    Com um governador de concorrência, só mantém em processamento o número
+    de relatórios que ele permite; os demais são submetidos conforme abrem vagas.
+    
+    No modo agregado, os jobs que só diferem no período e no desdobramento
+    viram um único relatório, dividido localmente depois do download.
+    
+    Com um diário de jobs, cada mudança de status é gravada em disco e jobs
+    adicionados de novo após uma interrupção retomam de onde pararam.
+    
+    Com um pool de sessões, cada job é submetido, acompanhado e baixado pela
+    conta escolhida pelo pool entre a do solicitante e as compartilhadas,
+    respeitando o limite de relatórios por conta; sem contas permitidas
+    saudáveis no pool, usa a sessão do gerador (a do solicitante).
+    
+    As etapas de cada job (submissão, espera na fila do servidor, verificação,
+    download, divisão) são registradas nas métricas do gerador.
+    """
+    
+    def __init__(self, gerador, timeout=300, verificacao_em_lote=True, pasta_downloads=None,
+                 cache_relatorios=None, governador=None, agregado=False, diario=None, pool=None,
+                 solicitante=None):
+        self.gerador = gerador
+        self.politica_polling = gerador.politica_polling
+        self.relogio = gerador.relogio
+        self.timeout = timeout
+        self.verificacao_em_lote = verificacao_em_lote
+        self.pasta_downloads = pasta_downloads
+        self.cache_relatorios = cache_relatorios
+        self.governador = governador
+        self.agregado = agregado
+        self.diario = diario
+        self.pool = pool
+        self.solicitante = solicitante      # conta de quem pediu os jobs (restringe as contas do pool)
+        self.metricas = gerador.metricas
+        self._geradores = {}    # conta do pool -> GeradorRelatorios
+        self.jobs = []
+        self._ordem = None      # jobs originais, enquanto há agregados no lugar deles
+    
+    def adicionar_job(self, curso, periodo, filtros):
+        """Registra um job de relatório (curso × período) a ser executado"""
+        job = {
+            'curso': curso,
+            'periodo': periodo,
+            'filtros': filtros,
+            'formulario': None,
+            'relatorio_id': None,
+            'status': 'PENDENTE',
+            'submetido_em': None,
+            'proxima_verificacao': None,
+            'ultimo_pendente': 0,   # última verificação sem o relatório pronto (s após a submissão)
+            'etapas': None,
+            'conteudo': None,
+            'arquivo': None,
+            'conta': None,
+            'error': None
+        }
+        if self.diario and self.diario.retomar(job) and job['status'] == 'SUBMETIDO' and job['conta'] \
+                and not (self.pool and job['conta'] in self.pool.contas_permitidas(self.solicitante)):
+            # Só a conta que submeteu enxerga o relatório: sem ela, submeter de novo
+            logger.info(f"Conta {job['conta']} indisponível para acompanhar o relatório "
+                        f"{job['relatorio_id']}; {curso} - {periodo} será submetido de novo")
+            job.update(status='PENDENTE', relatorio_id=None, submetido_em=None,
+                       proxima_verificacao=None, conta=None)
+        self.jobs.append(job)
+        return job
+    
+    def _notificar(self, progress_callback, job, msg):
+        if progress_callback:
+            progress_callback(job, msg)
+    
+    def _registrar(self, job):
+        """Grava o status do job no diário, sem interromper a execução se falhar"""
+        if not self.diario:
+            return
+        try:
+            self.diario.registrar(job)
+        except Exception as e:
+            logger.warning(f"Não foi possível registrar o job no diário: {str(e)}")
+    
+    def _rotulos(self, job):
+        """Identifica o job nas métricas das etapas abertas dentro do bloco"""
+        return self.metricas.job(curso=job['curso'], periodo=job['periodo'])
+    
+    def _gerador(self, job):
+        """Gerador da conta do job (pool de sessões) ou o gerador padrão"""
+        conta = job.get('conta')
+        if not self.pool or not conta:
+            return self.gerador
+        
+        session = self.pool.obter_session(conta)
+        if session is None:
+            logger.warning(f"Conta {conta} saiu do pool; usando a sessão padrão")
+            return self.gerador
+        
+        if conta not in self._geradores or self._geradores[conta].session is not session:
+            self._geradores[conta] = GeradorRelatorios(
+                session, politica_polling=self.politica_polling, metricas=self.metricas
+            )
+        return self._geradores[conta]
+    
+    def _escolher_conta(self):
+        """
+        Conta do pool para o próximo job
+        
+        Returns:
+            (pode_submeter, conta): conta None usa a sessão padrão; pode_submeter
+            False quando todas as contas estão no limite de relatórios
+        """
+        if not self.pool:
+            return True, None
+        if not self.pool.contas_permitidas(self.solicitante):
+            return True, None
+        
+        em_andamento = {}
+        for job in self.jobs:
+            if job['status'] == 'SUBMETIDO' and job.get('conta'):
+                em_andamento[job['conta']] = em_andamento.get(job['conta'], 0) + 1
+        
+        conta = self.pool.escolher(em_andamento, self.solicitante)
+        return conta is not None, conta
+    
+    def submeter_todos(self, progress_callback=None):
+        """Submete os jobs pendentes (até o limite do governador) sem aguardar o processamento"""
+        em_andamento = sum(1 for job in self.jobs if job['status'] == 'SUBMETIDO')
+        
+        for job in self.jobs:
+            if job['status'] != 'PENDENTE':
+                continue
+            if self.governador and self.governador.vagas(em_andamento) == 0:
+                break
+            
+            try:
+                with self._rotulos(job):
+                    if self._usar_cache(job):
+                        self._notificar(progress_callback, job, "Relatório obtido do cache local")
+                        continue
+                
+                pode_submeter, job['conta'] = self._escolher_conta()
+                if not pode_submeter:
+                    break
+                
+                self._notificar(progress_callback, job, "Submetendo formulário...")
+                with self._rotulos(job):
+                    job['relatorio_id'] = self._gerador(job).submeter_relatorio(job['filtros'])
+                job['submetido_em'] = self.relogio.monotonic()
+                job['proxima_verificacao'] = job['submetido_em'] + self.politica_polling.proximo_intervalo(
+                    PoliticaPolling.chave_filtros(job['filtros']), 0
+                )
+                job['status'] = 'SUBMETIDO'
+                em_andamento += 1
+                self._registrar(job)
+                self._notificar(progress_callback, job, f"Relatório {job['relatorio_id']} submetido")
+            except Exception as e:
+                job['status'] = 'ERRO'
+                job['error'] = str(e)
+                self._registrar(job)
+                logger.error(f"Erro ao submeter {job['curso']} - {job['periodo']}: {str(e)}")
+                self._notificar(progress_callback, job, f"Erro: {str(e)}")
+    
+    def coletar_todos(self, progress_callback=None):
+        """Verifica os jobs submetidos quando vencer o intervalo de cada um e baixa os que ficarem prontos"""
+        while True:
+            # Ocupar as vagas liberadas pelos jobs concluídos
+            self.submeter_todos(progress_callback)
+            
+            pendentes = [job for job in self.jobs if job['status'] == 'SUBMETIDO']
+            if not pendentes:
+                break
+            
+            # Dormir até o próximo job que precisa ser verificado
+            proxima = min(job['proxima_verificacao'] for job in pendentes)
+            espera = proxima - self.relogio.monotonic()
+            if espera > 0:
+                self.relogio.sleep(espera)
+            
+            agora = self.relogio.monotonic()
+            status_lote = self._verificar_lote(pendentes)
+            
+            for job in pendentes:
+                vencido = job['proxima_verificacao'] <= agora
+                status_info = status_lote.get(job['relatorio_id'])
+                
+                if status_info is None or status_info['status'] in ('DESCONHECIDO', 'ERRO'):
+                    # Fora do índice: verificar individualmente quando vencer
+                    if not vencido:
+                        continue
+                    with self._rotulos(job), self.metricas.etapa('verificacao', relatorio_id=job['relatorio_id']):
+                        status_info = self._gerador(job).verificar_status_relatorio(job['relatorio_id'])
+                elif status_info['status'] != 'PRONTO' and not vencido:
+                    job['ultimo_pendente'] = self.relogio.monotonic() - job['submetido_em']
+                    continue
+                
+                chave = PoliticaPolling.chave_filtros(job['filtros'])
+                decorrido = self.relogio.monotonic() - job['submetido_em']
+                
+                if status_info['status'] == 'PRONTO':
+                    self.politica_polling.registrar_conclusao(chave, decorrido, job['etapas'],
+                                                              job['ultimo_pendente'])
+                    with self._rotulos(job):
+                        self.metricas.registrar('espera', decorrido, relatorio_id=job['relatorio_id'])
+                    try:
+                        self._notificar(progress_callback, job, "Baixando arquivo...")
+                        with self._rotulos(job):
+                            if self.pasta_downloads:
+                                job['arquivo'] = self._gerador(job).baixar_relatorio(
+                                    status_info['download_url'], self._destino(job)
+                                )
+                                if self.cache_relatorios and job['formulario']:
+                                    self.cache_relatorios.guardar(job['formulario'], self._periodo_cache(job),
+                                                                  job['arquivo'])
+                            else:
+                                job['conteudo'] = self._gerador(job).baixar_relatorio(status_info['download_url'])
+                        job['status'] = 'CONCLUIDO'
+                        self._notificar(progress_callback, job, "Relatório gerado com sucesso!")
+                    except Exception as e:
+                        job['status'] = 'ERRO'
+                        job['error'] = str(e)
+                        self._notificar(progress_callback, job, f"Erro: {str(e)}")
+                elif status_info['status'] == 'ERRO':
+                    job['status'] = 'ERRO'
+                    job['error'] = f"Erro ao verificar status: {status_info.get('error')}"
+                    self._notificar(progress_callback, job, job['error'])
+                elif decorrido >= job.get('timeout', self.timeout):
+                    job['status'] = 'ERRO'
+                    job['error'] = f"Timeout aguardando relatório {job['relatorio_id']}"
+                    with self._rotulos(job):
+                        self.metricas.registrar('espera', decorrido, erro=True, relatorio_id=job['relatorio_id'])
+                    self._notificar(progress_callback, job, job['error'])
+                else:
+                    job['ultimo_pendente'] = decorrido
+                    job['etapas'] = status_info.get('etapas', job['etapas'])
+                    # Sem passar do prazo: a última verificação acontece no próprio timeout
+                    job['proxima_verificacao'] = self.relogio.monotonic() + min(
+                        self.politica_polling.proximo_intervalo(chave, decorrido, job['etapas']),
+                        job.get('timeout', self.timeout) - decorrido
+                    )
+                
+                if job['status'] != 'SUBMETIDO':
+                    self._registrar(job)
+        
+        return self.jobs
+    
+    @staticmethod
+    def _periodo_cache(job):
+        """Período do job para a validade do cache (None para agregados, que cobrem também semestres abertos)"""
+        return None if job.get('partes') else job['periodo']
+    
+    def _usar_cache(self, job):
+        """Resolve o formulário do job e, se houver relatório em cache, conclui o job sem submeter"""
+        if not self.cache_relatorios or not self.pasta_downloads:
+            return False
+        
+        job['formulario'] = self.gerador.montar_formulario(job['filtros'])
+        arquivo = self.cache_relatorios.obter(job['formulario'], self._periodo_cache(job))
+        if not arquivo:
+            return False
+        
+        job['arquivo'] = arquivo
+        job['status'] = 'CONCLUIDO'
+        self._registrar(job)
+        return True
+    
+    def _destino(self, job):
+        """Caminho do arquivo de um job na pasta de downloads"""
+        nome = nome_arquivo_seguro(job['curso'], job['periodo'], job['relatorio_id'])
+        return os.path.join(self.pasta_downloads, f"{nome}.xlsx")
+    
+    def _verificar_lote(self, pendentes):
+        """Consulta todos os jobs pendentes de uma vez pelo índice de relatórios"""
+        if not self.verificacao_em_lote:
+            return {}
+        
+        # Cada conta só vê os próprios relatórios no índice
+        por_conta = {}
+        for job in pendentes:
+            por_conta.setdefault(job.get('conta'), []).append(job)
+        
+        status_lote = {}
+        for jobs_conta in por_conta.values():
+            gerador = self._gerador(jobs_conta[0])
+            with self.metricas.etapa('verificacao', relatorios=len(jobs_conta)):
+                status_lote.update(gerador.verificar_status_relatorios([job['relatorio_id'] for job in jobs_conta]))
+        
+        # Se o índice não reconhece nenhum dos IDs, voltar à verificação individual
+        if all(info['status'] == 'DESCONHECIDO' for info in status_lote.values()):
+            logger.warning("Relatórios não encontrados no índice; usando verificação individual")
+            self.verificacao_em_lote = False
+        
+        return status_lote
+    
+    def agrupar(self, progress_callback=None):
+        """
+        Troca os jobs pendentes por relatórios agregados (modo agregado)
+        
+        Jobs já disponíveis no cache local não entram nos grupos, e grupos de
+        um único job continuam como relatório individual.
+        """
+        ordem = list(self.jobs)
+        pendentes = []
+        for job in ordem:
+            if job['status'] != 'PENDENTE':
+                continue
+            try:
+                if self._usar_cache(job):
+                    self._notificar(progress_callback, job, "Relatório obtido do cache local")
+                    continue
+            except Exception as e:
+                logger.warning(f"Cache indisponível para {job['curso']} - {job['periodo']}: {str(e)}")
+            pendentes.append(job)
+        
+        agregados = []
+        for filtros, partes in agrupar_jobs(pendentes):
+            if len(partes) < 2:
+                continue
+            
+            cursos = list(dict.fromkeys(parte['curso'] for parte in partes))
+            periodo = max((parte['periodo'] for parte in partes),
+                          key=lambda p: extrair_ano_semestre(p) or (0, 0))
+            agregado = self.adicionar_job(f"Agregado ({', '.join(cursos)})", periodo, filtros)
+            agregado['partes'] = partes
+            # O relatório agregado cobre vários desdobramentos e demora proporcionalmente mais
+            agregado['timeout'] = self.timeout * len(partes)
+            agregados.append(agregado)
+            logger.info(f"{len(partes)} jobs agrupados em um relatório agregado: {filtros}")
+        
+        agrupados = {id(parte) for agregado in agregados for parte in agregado['partes']}
+        self.jobs = [job for job in ordem if id(job) not in agrupados] + agregados
+        self._ordem = ordem
+    
+    def dividir_agregados(self, progress_callback=None):
+        """
+        Divide os relatórios agregados baixados entre os jobs originais
+        
+        Se o agregado falhar (erro ou timeout) ou a planilha não puder ser
+        dividida, os jobs voltam a PENDENTE para serem gerados individualmente.
+        """
+        for agregado in [job for job in self.jobs if job.get('partes')]:
+            partes = agregado['partes']
+            
+            if agregado['status'] != 'CONCLUIDO':
+                logger.warning(f"Relatório agregado falhou ({agregado['error']}), gerando individualmente")
+                for parte in partes:
+                    parte['status'] = 'PENDENTE'
+                continue
+            
+            try:
+                self._notificar(progress_callback, agregado, "Dividindo relatório agregado...")
+                origem = agregado['arquivo'] or io.BytesIO(agregado['conteudo'])
+                with self._rotulos(agregado), self.metricas.etapa('divisao', partes=len(partes)):
+                    divididos = dividir_relatorio(pd.read_excel(origem),
+                                                  [(parte['curso'], parte['periodo']) for parte in partes])
+            except Exception as e:
+                logger.warning(f"Não foi possível dividir o relatório agregado, gerando individualmente: {str(e)}")
+                for parte in partes:
+                    parte['status'] = 'PENDENTE'
+                continue
+            
+            for parte in partes:
+                df = divididos.get((parte['curso'], parte['periodo']))
+                if df is None:
+                    parte['status'] = 'ERRO'
+                    parte['error'] = f"Desdobramento {parte['curso']} ausente do relatório agregado"
+                    self._registrar(parte)
+                    continue
+                
+                parte['relatorio_id'] = agregado['relatorio_id']
+                parte['conta'] = agregado['conta']
+                if self.pasta_downloads:
+                    parte['arquivo'] = self._destino(parte)
+                    df.to_excel(parte['arquivo'], index=False)
+                    if self.cache_relatorios and parte['formulario']:
+                        self.cache_relatorios.guardar(parte['formulario'], parte['periodo'], parte['arquivo'])
+                else:
+                    saida = io.BytesIO()
+                    df.to_excel(saida, index=False)
+                    parte['conteudo'] = saida.getvalue()
+                parte['status'] = 'CONCLUIDO'
+                self._registrar(parte)
+                self._notificar(progress_callback, parte, "Relatório extraído do agregado")
+        
+        if self._ordem is not None:
+            self.jobs = self._ordem
+            self._ordem = None
+    
+    def executar(self, progress_callback=None):
+        """Submete todos os jobs e depois coleta os resultados"""
+        if self.agregado:
+            self.agrupar(progress_callback)
+        
+        self.submeter_todos(progress_callback)
+        self.coletar_todos(progress_callback)
+        
+        if self.agregado:
+            self.dividir_agregados(progress_callback)
+            # Partes que não puderam ser extraídas do agregado
+            self.submeter_todos(progress_callback)
+            self.coletar_todos(progress_callback)
+        
+        return self.jobs
+
+
+def executar_lote(fila, lote, session, cache_formulario=None, pool=None):
+    """
+    Gera os relatórios de um lote reservado na fila e registra o resultado de cada pedido
+    
+    Usado pelo worker_relatorios.py e, sem worker, pela própria página.
+    
+    Args:
+        fila: FilaRelatorios de onde o lote foi reservado
+        lote: Dict devolvido por FilaRelatorios.reservar_lote
+        session: requests.Session autenticada da conta do solicitante do lote
+        cache_formulario: CacheFormulario a reaproveitar (opcional)
+        pool: PoolSessoes para distribuir os jobs entre contas (opcional)
+    
+    Returns:
+        Lista de jobs do AgendadorRelatorios
+    """
+    if not lote:
+        return []
+    
+    opcoes = lote['opcoes']
+    gerador = GeradorRelatorios(session, cache_formulario=cache_formulario)
+    agendador = AgendadorRelatorios(
+        gerador,
+        pasta_downloads=RELATORIOS_FOLDER,
+        cache_relatorios=CacheRelatorios() if opcoes.get('usar_cache', True) else None,
+        governador=GOVERNADOR_PADRAO,
+        agregado=opcoes.get('agregado', False),
+        diario=DiarioJobs(solicitante=lote.get('solicitante')),
+        pool=pool,
+        solicitante=lote.get('solicitante')
+    )
+    
+    jobs_por_pedido = {}
+    for pedido in lote['pedidos']:
+        job = agendador.adicionar_job(pedido['curso'], pedido['periodo'], pedido['filtros'])
+        job['pedido_id'] = pedido['id']
+        jobs_por_pedido[pedido['id']] = job
+    
+    # Só os pedidos ainda reservados por este trabalhador: um pedido devolvido
+    # à fila (liberar_orfaos) e reservado por outro não é sobrescrito
+    trabalhador = lote['trabalhador']
+    
+    def callback_progresso(job, msg):
+        # Um relatório agregado atualiza todos os pedidos que ele atende
+        for parte in job.get('partes') or [job]:
+            if parte.get('pedido_id') is not None:
+                fila.atualizar(parte['pedido_id'], mensagem=msg, trabalhador=trabalhador)
+    
+    try:
+        agendador.executar(callback_progresso)
+    finally:
+        for pedido_id, job in jobs_por_pedido.items():
+            if job['status'] in STATUS_FINAIS:
+                atualizado = fila.atualizar(pedido_id, status=job['status'], arquivo=job['arquivo'],
+                                            erro=job['error'], trabalhador=trabalhador)
+            else:
+                atualizado = fila.atualizar(pedido_id, status='ERRO', erro="Execução interrompida",
+                                            trabalhador=trabalhador)
+            if not atualizado:
+                logger.warning(f"Pedido {pedido_id} não está mais com {trabalhador}; resultado descartado")
+        gerador.metricas.exportar()
+    
+    return list(jobs_por_pedido.values())
+
+
+def _cabecalho_relatorio(caminho):
+    """Nomes das colunas de um relatório (primeira linha), lendo só essa linha"""
+    livro = openpyxl.load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        primeira = next(livro.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+    finally:
+        livro.close()
+    
+    colunas = list(primeira)
+    while colunas and colunas[-1] is None:
+        colunas.pop()
+    # Mesmos nomes que o pandas daria às colunas sem título ou repetidas
+    nomes = []
+    repeticoes = {}
+    for indice, nome in enumerate(colunas):
+        nome = str(nome) if nome is not None else f"Unnamed: {indice}"
+        if nome in repeticoes:
+            repeticoes[nome] += 1
+            nome = f"{nome}.{repeticoes[nome]}"
+        else:
+            repeticoes[nome] = 0
+        nomes.append(nome)
+    return nomes
+
+
+def escrever_consolidado(relatorios, destino):
+    """
+    Grava a planilha consolidada um relatório por vez, sem manter os dados em memória
+    
+    Args:
+        relatorios: Lista de (caminho, curso, periodo, colunas) dos relatórios
+        destino: Caminho do .xlsx consolidado
+    
+    As linhas de cada relatório são copiadas direto para a planilha de saída
+    (openpyxl em modo write_only), nas colunas de mesmo nome, seguidas de
+    curso e período.
+    """
+    colunas = list(dict.fromkeys(nome for _, _, _, nomes in relatorios for nome in nomes))
+    
+    livro_saida = openpyxl.Workbook(write_only=True)
+    planilha_saida = livro_saida.create_sheet('Dados Brutos')
+    planilha_saida.append(colunas + ['curso', 'periodo'])
+    posicao = {nome: indice for indice, nome in enumerate(colunas)}
+    
+    for caminho, curso, periodo, nomes in relatorios:
+        destinos = [posicao[nome] for nome in nomes]
+        livro = openpyxl.load_workbook(caminho, read_only=True, data_only=True)
+        try:
+            for valores in livro.worksheets[0].iter_rows(min_row=2, values_only=True):
+                if all(valor is None for valor in valores):
+                    continue
+                linha = [None] * len(colunas)
+                for indice, valor in zip(destinos, valores):
+                    linha[indice] = valor
+                planilha_saida.append(linha + [curso, periodo])
+        finally:
+            livro.close()
+    
+    # Gravar num temporário e renomear: um rerun nunca encontra a planilha pela metade
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    livro_saida.save(temporario)
+    os.replace(temporario, destino)
+
+
+def consolidar_pedidos(pedidos, lote):
+    """Consolida os relatórios concluídos de um lote em disco e oferece a planilha"""
+    # Registrar os arquivos baixados para o 2_processar_dados.py
+    arquivos = [pedido['arquivo'] for pedido in pedidos if pedido['status'] == 'CONCLUIDO']
+    with open(ARQUIVO_LISTA, 'w', encoding='utf-8') as f:
+        f.writelines(f"{arquivo}\n" for arquivo in arquivos)
+    
+    relatorios = []
+    for pedido in pedidos:
+        if pedido['status'] != 'CONCLUIDO':
+            st.error(f"Erro ao gerar relatório de {pedido['curso']} ({pedido['periodo']}): {pedido['erro']}")
+            continue
+        
+        try:
+            relatorios.append((pedido['arquivo'], pedido['curso'], pedido['periodo'],
+                               _cabecalho_relatorio(pedido['arquivo'])))
+        except Exception as e:
+            st.error(f"Erro ao ler relatório de {pedido['curso']} ({pedido['periodo']}): {str(e)}")
+            logger.error(f"Erro: {str(e)}")
+    
+    if not relatorios:
+        return
+    
+    # A página é redesenhada a cada interação: consolidar o lote uma vez só
+    destino = os.path.join(RELATORIOS_FOLDER, f"planilha_consolidada_lote_{lote}.xlsx")
+    if not os.path.exists(destino):
+        try:
+            os.makedirs(RELATORIOS_FOLDER, exist_ok=True)
+            escrever_consolidado(relatorios, destino)
+        except Exception as e:
+            st.error(f"Erro ao gerar a planilha consolidada: {str(e)}")
+            logger.error(f"Erro ao consolidar lote {lote}: {str(e)}")
+            return
+    
+    # Botão de download
+    st.success(f"✓ Planilha consolidada gerada com {len(relatorios)} relatório(s)!")
+    with open(destino, 'rb') as f:
+        st.download_button(
+            label="📥 Baixar Planilha Consolidada",
+            data=f,
+            file_name=f"planilha_consolidada_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            use_container_width=True
+        )
+
+
+def exibir_lote(fila, lote):
+    """Mostra o progresso de um lote da fila e, quando terminar, a planilha consolidada"""
+    pedidos = fila.pedidos(lote)
+    if not pedidos:
+        return
+    
+    finalizados = sum(1 for pedido in pedidos if pedido['status'] in STATUS_FINAIS)
+    
+    st.subheader(f"Lote {lote}: {finalizados}/{len(pedidos)} relatório(s) finalizados")
+    st.progress(finalizados / len(pedidos))
+    st.dataframe(
+        pd.DataFrame([
+            {
+                'Curso': pedido['curso'],
+                'Período': pedido['periodo'],
+                'Status': pedido['status'],
+                'Detalhe': pedido['erro'] or pedido['mensagem'] or '',
+            }
+            for pedido in pedidos
+        ]),
+        use_container_width=True,
+        hide_index=True
+    )
+    
+    if finalizados == len(pedidos):
+        consolidar_pedidos(pedidos, lote)
+        return
+    
+    # Sem worker rodando, ninguém mais devolve à fila os pedidos de execuções interrompidas
+    fila.liberar_orfaos()
+    
+    if fila.trabalhadores_ativos() == 0:
+        st.warning("Nenhum worker ativo. Execute `python worker_relatorios.py` ou marque "
+                   "'Executar nesta página'; o lote continua na fila.")
+        if st.button("Atualizar"):
+            st.rerun()
+        return
+    
+    # Atualizar a página enquanto o worker trabalha
+    time.sleep(INTERVALO_ATUALIZACAO_PAGINA)
+    st.rerun()
+
+
 def main():
     """Função principal da aplicação"""
     st.set_page_config(page_title="Automador de Relatórios UFF - Química", layout="wide")
@@ -548,23 +1416,59 @@ def main():
         if 'session' not in st.session_state:
             st.session_state.session = None
             st.session_state.login_instance = None
+            st.session_state.cache_formulario = CacheFormulario()
+            
+            # Nova aba ou servidor reiniciado: só a sessão lembrada por este navegador
+            token = st.query_params.get(PARAMETRO_SESSAO)
+            if token:
+                login = LoginUFF(ArmazemSessao(arquivo_navegador(token)))
+                if login.restaurar_sessao():
+                    st.session_state.session = login.get_session()
+                    st.session_state.login_instance = login
+                else:
+                    st.query_params.pop(PARAMETRO_SESSAO, None)
         
         if st.session_state.session is None:
             cpf = st.text_input("CPF:", type="password", help="Digite seu CPF sem pontuação")
             senha = st.text_input("Senha:", type="password")
+            lembrar_sessao = st.checkbox(
+                "Lembrar sessão neste navegador",
+                value=False,
+                help="Guarda a sessão criptografada no servidor; o endereço da página passa a ter um "
+                     "token que a restaura. Não marque em computadores compartilhados"
+            )
+            compartilhar_conta = st.checkbox(
+                "Disponibilizar minha sessão ao worker",
+                value=False,
+                help="A sessão entra no pool de contas do worker_relatorios.py, que distribui os "
+                     "relatórios dos lotes entre as contas conectadas"
+            )
             
             if st.button("Entrar", use_container_width=True):
                 with st.spinner("Autenticando no portal UFF..."):
-                    login = LoginUFF()
+                    token = novo_token_navegador() if lembrar_sessao else None
+                    login = LoginUFF(ArmazemSessao(arquivo_navegador(token)) if token else None)
                     if login.fazer_login(cpf, senha):
+                        if token:
+                            st.query_params[PARAMETRO_SESSAO] = token
+                        if compartilhar_conta:
+                            registrar_conta(login, compartilhada=True)
+                        else:
+                            # Desfaz um compartilhamento de um login anterior
+                            remover_conta(login.conta)
+                        st.session_state.usuario_pool = login.conta
                         st.session_state.session = login.get_session()
                         st.session_state.login_instance = login
+                        st.session_state.cache_formulario = CacheFormulario()
                         st.rerun()
         else:
             # Verificar se a sessão ainda é válida
             if st.session_state.login_instance and not st.session_state.login_instance.check_session():
                 st.warning("Sessão expirada")
                 if st.button("Reconectar", use_container_width=True):
+                    if st.session_state.login_instance.armazem_sessao:
+                        st.session_state.login_instance.armazem_sessao.apagar()
+                    st.query_params.pop(PARAMETRO_SESSAO, None)
                     st.session_state.session = None
                     st.session_state.login_instance = None
                     st.rerun()
@@ -572,6 +1476,12 @@ def main():
                 st.success("✓ Conectado ao portal UFF")
             
             if st.button("Sair", use_container_width=True):
+                if st.session_state.login_instance.armazem_sessao:
+                    st.session_state.login_instance.armazem_sessao.apagar()
+                st.query_params.pop(PARAMETRO_SESSAO, None)
+                if st.session_state.get('usuario_pool'):
+                    remover_conta(st.session_state.usuario_pool)
+                    st.session_state.usuario_pool = None
                 st.session_state.session = None
                 st.session_state.login_instance = None
                 st.rerun()
@@ -615,8 +1525,37 @@ def main():
                 default=list(DESDOBRAMENTOS_CURSOS.keys())
             )
         
+        usar_cache = st.checkbox(
+            "Reutilizar relatórios já baixados de semestres encerrados",
+            value=True,
+            help="Semestres encerrados são lidos do cache local; o semestre atual expira em poucas horas"
+        )
+        
+        busca_agregada = st.checkbox(
+            "Busca agregada (um relatório por curso, dividido localmente por período e desdobramento)",
+            value=False,
+            help="Reduz a espera na fila do servidor: os relatórios saem sem filtro de período e "
+                 "desdobramento e são separados pela matrícula e pela linha 'Alunos de ...'"
+        )
+        
+        retomar_execucao = st.checkbox(
+            "Retomar execução interrompida",
+            value=True,
+            help="Relatórios já baixados ou submetidos nas últimas 24h (registrados no diário de jobs) "
+                 "não são submetidos de novo"
+        )
+        
+        executar_na_pagina = st.checkbox(
+            "Executar nesta página (sem worker)",
+            value=False,
+            help="Sem o worker_relatorios.py rodando, a própria página gera os relatórios "
+                 "e fica ocupada até o fim do lote"
+        )
+        
         st.markdown("---")
         
+        fila = FilaRelatorios()
+        
         if st.button("Gerar Relatórios e Planilha Consolidada", use_container_width=True, type="primary"):
             if not cursos_selecionados:
                 st.error("Selecione pelo menos um curso!")
@@ -643,90 +1582,42 @@ def main():
             periodos = [periodo_inicio_fmt, periodo_fim_fmt]
             # Adicionar períodos intermediários se necessário
             
-            gerador = GeradorRelatorios(st.session_state.session)
-            
-            # Armazenar todos os dados
-            todos_dados = []
+            # O worker gera o lote com a sessão da conta de quem pediu
+            login = st.session_state.login_instance
             
-            # Barra de progresso
-            progress_bar = st.progress(0)
-            status_text = st.empty()
+            # O diário é sempre gravado; desmarcar a retomada descarta a execução anterior desta conta
+            if not retomar_execucao:
+                DiarioJobs(solicitante=login.conta).limpar()
+            registrar_conta(login)
+            st.session_state.usuario_pool = login.conta
             
-            total_relatorios = len(periodos) * len(cursos_selecionados)
-            relatorio_atual = 0
-            
-            try:
-                for periodo in periodos:
-                    # Determinar forma de ingresso
-                    semestre = '1' if '1°' in periodo else '2'
-                    forma_ingresso = FORMAS_INGRESSO[semestre]
-                    
-                    for curso_key in cursos_selecionados:
-                        relatorio_atual += 1
-                        
-                        curso_info = DESDOBRAMENTOS_CURSOS[curso_key]
-                        
-                        def callback_progresso(msg, pct):
-                            status_text.text(f"[{relatorio_atual}/{total_relatorios}] {curso_key} - {periodo}: {msg}")
-                            progress_bar.progress((relatorio_atual - 1 + pct/100) / total_relatorios)
-                        
-                        try:
-                            status_text.text(f"Gerando relatório: {curso_key} - {periodo}...")
-                            
-                            # Preparar filtros
-                            filtros = {
-                                'report_filter_localidade': 'Niterói',
-                                'report_filter_curso': curso_info['buscar_por'],
-                                'report_filter_desdobramento': curso_info['valor'],
-                                'report_filter_forma_ingresso': forma_ingresso,
-                                'report_filter_ano_semestre_ingresso': periodo
-                            }
-                            
-                            # Gerar relatório
-                            conteudo_excel = gerador.gerar_relatorio_completo(filtros, callback_progresso)
-                            
-                            # Ler dados do Excel
-                            df = pd.read_excel(io.BytesIO(conteudo_excel))
-                            df['curso'] = curso_key
-                            df['periodo'] = periodo
-                            todos_dados.append(df)
-                            
-                            st.success(f"✓ Relatório gerado: {curso_key} - {periodo}")
-                            
-                        except Exception as e:
-                            st.error(f"Erro ao gerar relatório de {curso_key} ({periodo}): {str(e)}")
-                            logger.error(f"Erro: {str(e)}")
-                
-                if todos_dados:
-                    status_text.text("Processando dados e gerando planilha consolidada...")
-                    
-                    # Combinar todos os dados
-                    df_consolidado = pd.concat(todos_dados, ignore_index=True)
-                    
-                    # Gerar arquivo Excel consolidado
-                    output = io.BytesIO()
-                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                        df_consolidado.to_excel(writer, sheet_name='Dados Brutos', index=False)
-                    
-                    output.seek(0)
-                    
-                    # Botão de download
-                    st.success("✓ Planilha consolidada gerada com sucesso!")
-                    st.download_button(
-                        label="📥 Baixar Planilha Consolidada",
-                        data=output.getvalue(),
-                        file_name=f"planilha_consolidada_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        use_container_width=True
-                    )
-                
-                progress_bar.progress(1.0)
-                status_text.text("✓ Processo concluído!")
+            pedidos = [
+                (curso_key, periodo, montar_filtros(curso_key, periodo))
+                for periodo in periodos
+                for curso_key in cursos_selecionados
+            ]
+            st.session_state.lote_atual = fila.enfileirar(
+                pedidos, opcoes={'usar_cache': usar_cache, 'agregado': busca_agregada}, solicitante=login.conta
+            )
             
-            except Exception as e:
-                st.error(f"Erro geral: {str(e)}")
-                logger.error(f"Erro: {str(e)}")
-
+            if executar_na_pagina:
+                # Identificação única por execução: o sinal de vida não renova reservas de outras execuções
+                executor = f"{PREFIXO_PAGINA}{os.getpid()}:{uuid.uuid4().hex[:8]}"
+                with st.spinner(f"Gerando {len(pedidos)} relatórios..."):
+                    try:
+                        with fila.manter_sinal_vida(executor):
+                            executar_lote(
+                                fila,
+                                fila.reservar_lote(executor, st.session_state.lote_atual),
+                                st.session_state.session,
+                                cache_formulario=st.session_state.cache_formulario
+                            )
+                    except Exception as e:
+                        st.error(f"Erro geral: {str(e)}")
+                        logger.error(f"Erro: {str(e)}")
+        
+        if st.session_state.get('lote_atual'):
+            exibir_lote(fila, st.session_state.lote_atual)
 
 if __name__ == "__main__":
     main()
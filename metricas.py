@@ -0,0 +1,213 @@
+"""
+metricas.py - Tempo, requisições e bytes de cada etapa da geração de relatórios
+
+As etapas são as mesmas do progress_callback do GeradorRelatorios:
+
+- acesso: GET da página de listagem (formulário)
+- analise: leitura do HTML e indexação das opções dos selects
+- preenchimento: aplicação dos filtros ao formulário
+- submissao: POST do formulário
+- espera: da submissão até o relatório ficar pronto (fila do servidor)
+- verificacao: consultas de status do AgendadorRelatorios (em lote ou por job)
+- download: download do arquivo
+- divisao: divisão local dos relatórios agregados
+
+Cada etapa vira um registro com tempo de parede, requisições e bytes
+recebidos (contados por um hook de resposta da requests.Session, atribuídos
+à etapa aberta na thread). Os registros são exportados em JSON lines (um por
+etapa de cada job) e os totais num arquivo texto no formato do Prometheus
+(para o textfile collector do node_exporter).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from config_sistema import ARQUIVO_METRICAS_JSONL, ARQUIVO_METRICAS_PROMETHEUS
+
+logger = logging.getLogger(__name__)
+
+# Limites (segundos) dos buckets do histograma de duração das etapas
+BUCKETS_DURACAO = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _bytes_resposta(response, stream=False):
+    """Bytes recebidos numa resposta (Content-Length, ou o corpo se já foi lido)"""
+    tamanho = response.headers.get('Content-Length')
+    if tamanho and tamanho.isdigit():
+        return int(tamanho)
+    if stream:
+        return 0
+    return len(response.content or b'')
+
+
+class MetricasRelatorios:
+    """Registra as etapas da geração de relatórios e exporta os resultados"""
+
+    def __init__(self):
+        self.registros = []     # etapas ainda não exportadas em JSON lines
+        self.totais = {}        # etapa -> totais acumulados no processo
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _pilha(self):
+        if not hasattr(self._local, 'pilha'):
+            self._local.pilha = []
+            self._local.rotulos = {}
+        return self._local.pilha
+
+    @contextmanager
+    def job(self, **rotulos):
+        """Rótulos (ex.: curso e período) aplicados às etapas abertas dentro do bloco"""
+        self._pilha()
+        anteriores = self._local.rotulos
+        self._local.rotulos = dict(anteriores, **rotulos)
+        try:
+            yield
+        finally:
+            self._local.rotulos = anteriores
+
+    @contextmanager
+    def etapa(self, nome, **rotulos):
+        """Mede uma etapa; as requisições feitas dentro do bloco contam para ela"""
+        pilha = self._pilha()
+        registro = {
+            'etapa': nome,
+            **self._local.rotulos,
+            **rotulos,
+            'inicio': datetime.now().isoformat(timespec='milliseconds'),
+            'requisicoes': 0,
+            'bytes': 0,
+            'erro': False,
+        }
+        pilha.append(registro)
+        inicio = time.monotonic()
+        try:
+            yield registro
+        except Exception:
+            registro['erro'] = True
+            raise
+        finally:
+            pilha.pop()
+            registro['duracao_s'] = round(time.monotonic() - inicio, 4)
+            self._finalizar(registro)
+
+    def registrar(self, nome, duracao, requisicoes=0, bytes_recebidos=0, erro=False, **rotulos):
+        """Registra uma etapa medida fora de um bloco etapa() (ex.: espera acompanhada pelo agendador)"""
+        self._pilha()
+        self._finalizar({
+            'etapa': nome,
+            **self._local.rotulos,
+            **rotulos,
+            'inicio': datetime.fromtimestamp(time.time() - duracao).isoformat(timespec='milliseconds'),
+            'requisicoes': requisicoes,
+            'bytes': bytes_recebidos,
+            'erro': erro,
+            'duracao_s': round(duracao, 4),
+        })
+
+    def _finalizar(self, registro):
+        with self._lock:
+            self.registros.append(registro)
+
+            totais = self.totais.setdefault(registro['etapa'], {
+                'execucoes': 0, 'segundos': 0.0, 'requisicoes': 0, 'bytes': 0, 'erros': 0,
+                'buckets': [0] * len(BUCKETS_DURACAO),
+            })
+            totais['execucoes'] += 1
+            totais['segundos'] += registro['duracao_s']
+            totais['requisicoes'] += registro['requisicoes']
+            totais['bytes'] += registro['bytes']
+            totais['erros'] += int(registro['erro'])
+            for indice, limite in enumerate(BUCKETS_DURACAO):
+                if registro['duracao_s'] <= limite:
+                    totais['buckets'][indice] += 1
+
+    def observar_sessao(self, session):
+        """Instala na sessão o hook que conta requisições e bytes da etapa aberta"""
+        if getattr(session, '_metricas_relatorios', None) is self:
+            return
+        session._metricas_relatorios = self
+        session.hooks['response'].append(self._contar_resposta)
+
+    def _contar_resposta(self, response, *args, **kwargs):
+        pilha = getattr(self._local, 'pilha', None)
+        if not pilha:
+            return response
+
+        registro = pilha[-1]
+        registro['requisicoes'] += 1 + len(response.history)
+        try:
+            registro['bytes'] += _bytes_resposta(response, kwargs.get('stream', False))
+        except Exception as e:
+            logger.debug(f"Não foi possível medir a resposta: {str(e)}")
+        return response
+
+    def resumo(self):
+        """Totais por etapa: execuções, segundos, requisições, bytes e erros"""
+        with self._lock:
+            return {
+                etapa: {chave: valor for chave, valor in totais.items() if chave != 'buckets'}
+                for etapa, totais in self.totais.items()
+            }
+
+    def exportar_jsonl(self, arquivo=ARQUIVO_METRICAS_JSONL):
+        """Acrescenta ao arquivo os registros ainda não exportados, um JSON por linha"""
+        with self._lock:
+            registros, self.registros = self.registros, []
+        if not registros:
+            return 0
+
+        with open(arquivo, 'a', encoding='utf-8') as f:
+            for registro in registros:
+                f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        return len(registros)
+
+    def exportar_prometheus(self, arquivo=ARQUIVO_METRICAS_PROMETHEUS):
+        """Grava os totais do processo no formato texto do Prometheus (substituindo o arquivo)"""
+        with self._lock:
+            totais = {etapa: dict(valores, buckets=list(valores['buckets']))
+                      for etapa, valores in self.totais.items()}
+
+        linhas = [
+            "# HELP relatorios_etapa_duracao_segundos Tempo de parede das etapas da geração de relatórios",
+            "# TYPE relatorios_etapa_duracao_segundos histogram",
+        ]
+        for etapa, valores in sorted(totais.items()):
+            for limite, quantidade in zip(BUCKETS_DURACAO, valores['buckets']):
+                linhas.append(f'relatorios_etapa_duracao_segundos_bucket{{etapa="{etapa}",le="{limite}"}} {quantidade}')
+            linhas.append(f'relatorios_etapa_duracao_segundos_bucket{{etapa="{etapa}",le="+Inf"}} {valores["execucoes"]}')
+            linhas.append(f'relatorios_etapa_duracao_segundos_sum{{etapa="{etapa}"}} {valores["segundos"]:.4f}')
+            linhas.append(f'relatorios_etapa_duracao_segundos_count{{etapa="{etapa}"}} {valores["execucoes"]}')
+
+        for nome, chave, descricao in (
+            ('relatorios_etapa_requisicoes_total', 'requisicoes', "Requisições HTTP feitas em cada etapa"),
+            ('relatorios_etapa_bytes_total', 'bytes', "Bytes recebidos em cada etapa"),
+            ('relatorios_etapa_erros_total', 'erros', "Etapas que terminaram em erro"),
+        ):
+            linhas.append(f"# HELP {nome} {descricao}")
+            linhas.append(f"# TYPE {nome} counter")
+            for etapa, valores in sorted(totais.items()):
+                linhas.append(f'{nome}{{etapa="{etapa}"}} {valores[chave]}')
+
+        # Gravar num temporário e renomear: o coletor nunca lê um arquivo pela metade
+        temporario = f"{arquivo}.{os.getpid()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(linhas) + '\n')
+        os.replace(temporario, arquivo)
+
+    def exportar(self, arquivo_jsonl=ARQUIVO_METRICAS_JSONL, arquivo_prometheus=ARQUIVO_METRICAS_PROMETHEUS):
+        """Exporta os registros em JSON lines e os totais para o Prometheus, sem interromper quem chamou"""
+        try:
+            exportados = self.exportar_jsonl(arquivo_jsonl)
+            self.exportar_prometheus(arquivo_prometheus)
+            logger.info(f"Métricas exportadas: {exportados} etapa(s) em {arquivo_jsonl}, totais em {arquivo_prometheus}")
+        except OSError as e:
+            logger.warning(f"Não foi possível exportar as métricas: {str(e)}")
+
+
+# Instância compartilhada pelo processo
+METRICAS_PADRAO = MetricasRelatorios()
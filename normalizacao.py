@@ -0,0 +1,99 @@
+"""
+normalizacao.py - Normalização de textos livres dos relatórios por mapas de palavras-chave
+
+Os relatórios trazem status e motivos de cancelamento como texto livre
+("CANCELADO - ABANDONO", "Desistencia do curso"...). Cada mapa de
+configuração (palavra-chave -> valor normalizado) vira uma única expressão
+regular compilada; a primeira palavra-chave do mapa contida no texto decide
+o valor, ignorando maiúsculas e acentos.
+
+Há poucas centenas de textos distintos em centenas de milhares de linhas,
+então cada texto distinto é normalizado uma vez (memoizado) e as colunas
+recebem o resultado como categorias.
+"""
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Textos que representam célula vazia (str() de None/NaN inclusive)
+TEXTOS_VAZIOS = frozenset({'', 'NAN', 'NONE', 'NAT', '<NA>'})
+
+
+def remover_acentos(texto):
+    """Texto sem acentos (decomposição NFKD sem as marcas combinantes)"""
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+
+
+class NormalizadorTextos:
+    """
+    Normaliza textos pelas palavras-chave de um mapa
+
+    Args:
+        mapa: Dict palavra-chave -> valor normalizado; a ordem do dict é a
+              prioridade quando o texto contém mais de uma palavra-chave
+        vazio: Valor para textos vazios
+
+    Textos sem nenhuma palavra-chave ficam em maiúsculas, sem espaços nas pontas.
+    """
+
+    def __init__(self, mapa, vazio='Desconhecido'):
+        self.mapa = dict(mapa)
+        self.vazio = vazio
+        self._valores = list(self.mapa.values())
+        self._prioridade = {remover_acentos(chave.upper()): indice for indice, chave in enumerate(self.mapa)}
+        # Lookahead: encontra as palavras-chave em todas as posições, inclusive sobrepostas
+        self._padrao = re.compile(
+            '(?=(' + '|'.join(re.escape(chave) for chave in self._prioridade) + '))'
+        ) if self._prioridade else None
+        self._memo = {}
+
+    def normalizar(self, texto):
+        """Valor normalizado de um texto"""
+        try:
+            return self._memo[texto]
+        except (KeyError, TypeError):
+            pass
+
+        valor = self._normalizar(texto)
+        try:
+            self._memo[texto] = valor
+        except TypeError:
+            pass    # valor não hashable: não memoiza
+        return valor
+
+    def _normalizar(self, texto):
+        if texto is None or (isinstance(texto, float) and texto != texto):
+            return self.vazio
+
+        maiusculo = str(texto).upper().strip()
+        if maiusculo in TEXTOS_VAZIOS:
+            return self.vazio
+
+        if self._padrao is not None:
+            encontradas = [self._prioridade[m.group(1)] for m in self._padrao.finditer(remover_acentos(maiusculo))]
+            if encontradas:
+                return self._valores[min(encontradas)]
+
+        return maiusculo
+
+    def aplicar(self, serie):
+        """
+        Normaliza uma coluna inteira
+
+        Returns:
+            Series categórica no índice da original (cada texto distinto é
+            normalizado uma única vez)
+        """
+        codigos, distintos = pd.factorize(serie, use_na_sentinel=False)
+        normalizados = [self.normalizar(texto) for texto in distintos]
+
+        categorias = list(dict.fromkeys(normalizados))
+        posicao = {valor: indice for indice, valor in enumerate(categorias)}
+        traducao = np.array([posicao[valor] for valor in normalizados], dtype=np.int32)
+
+        return pd.Series(
+            pd.Categorical.from_codes(traducao[codigos] if len(traducao) else [], categories=categorias),
+            index=serie.index, name=serie.name
+        )
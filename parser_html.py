@@ -0,0 +1,74 @@
+"""
+parser_html.py - Análise de HTML direcionada para as páginas do sistema UFF
+
+Usa o parser lxml (mais rápido que o html.parser) e analisa apenas os
+elementos de que cada chamada precisa: o formulário de login, o formulário
+de relatório ou os links de download e etapas da página de status.
+"""
+import logging
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+logger = logging.getLogger(__name__)
+
+try:
+    import lxml  # noqa: F401
+    PARSER_HTML = 'lxml'
+except ImportError:
+    PARSER_HTML = 'html.parser'
+    logger.warning("lxml não instalado, usando html.parser")
+
+# <div class="... step ..."> (a classe step entre as demais, como no seletor div.step)
+PADRAO_ETAPA = re.compile(r"""<div\b[^>]*?\bclass\s*=\s*(["'])(?:[^"']*\s)?step(?:\s[^"']*)?\1""", re.I)
+
+
+def criar_soup(html, elementos=None):
+    """
+    Analisa o HTML, opcionalmente restrito a alguns elementos
+
+    Args:
+        html: Conteúdo HTML da página
+        elementos: Nome ou lista de nomes de tags a manter (com suas subárvores);
+            None analisa o documento inteiro
+
+    Returns:
+        BeautifulSoup com os elementos analisados
+    """
+    parse_only = SoupStrainer(elementos) if elementos else None
+    return BeautifulSoup(html, PARSER_HTML, parse_only=parse_only)
+
+
+def analisar_formularios(html):
+    """Analisa apenas os formulários da página (login ou relatório)"""
+    return criar_soup(html, 'form')
+
+
+def analisar_tokens(html):
+    """Analisa apenas as tags meta e input, onde ficam os tokens CSRF"""
+    return criar_soup(html, ['meta', 'input'])
+
+
+def extrair_links(html, padrao=r'\.xlsx'):
+    """Retorna os hrefs dos links cujo endereço casa com o padrão, na ordem da página"""
+    soup = BeautifulSoup(html, PARSER_HTML, parse_only=SoupStrainer('a', href=re.compile(padrao, re.I)))
+    return [link['href'] for link in soup.find_all('a')]
+
+
+def contar_etapas(html):
+    """Quantidade de etapas de processamento (div com a classe step), sem montar a árvore"""
+    return len(PADRAO_ETAPA.findall(html))
+
+
+def analisar_pagina_relatorio(html, padrao=r'\.xlsx'):
+    """
+    Analisa a página de um relatório a cada verificação de status
+
+    Só os links de download entram na árvore (as divs do layout envolvem
+    quase o documento inteiro); as etapas são contadas direto no texto.
+
+    Returns:
+        Tupla (hrefs dos links que casam com o padrão, na ordem da página;
+        quantidade de etapas de processamento div.step)
+    """
+    return extrair_links(html, padrao), contar_etapas(html)
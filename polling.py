@@ -0,0 +1,132 @@
+"""
+polling.py - Política de verificação adaptativa dos relatórios UFF
+
+Calcula quando verificar novamente um relatório em processamento a partir de:
+- tempos de conclusão anteriores para o mesmo conjunto de filtros
+- quantidade de etapas (div.step) já concluídas na página do relatório
+- backoff proporcional ao tempo decorrido para relatórios demorados
+"""
+import json
+import logging
+import os
+import statistics
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Configurações
+HISTORICO_POLLING_ARQUIVO = "historico_polling.json"
+INTERVALO_MINIMO = 2          # Menor espera entre verificações (segundos)
+INTERVALO_MAXIMO = 60         # Maior espera entre verificações (segundos)
+FRACAO_BACKOFF = 0.2          # Sem estimativa, espera 20% do tempo já decorrido
+MAX_AMOSTRAS_HISTORICO = 20   # Tempos de conclusão guardados por conjunto de filtros
+
+
+class PoliticaPolling:
+    """Define o intervalo até a próxima verificação de um relatório"""
+
+    def __init__(self, arquivo_historico=HISTORICO_POLLING_ARQUIVO,
+                 intervalo_minimo=INTERVALO_MINIMO, intervalo_maximo=INTERVALO_MAXIMO,
+                 fracao_backoff=FRACAO_BACKOFF):
+        self.arquivo_historico = arquivo_historico
+        self.intervalo_minimo = intervalo_minimo
+        self.intervalo_maximo = intervalo_maximo
+        self.fracao_backoff = fracao_backoff
+        self._lock = threading.Lock()
+        self.historico = self._carregar_historico()
+
+    @staticmethod
+    def chave_filtros(filtros):
+        """Gera uma chave estável para um conjunto de filtros"""
+        if not filtros:
+            return ''
+        return json.dumps(filtros, sort_keys=True, ensure_ascii=False)
+
+    def _carregar_historico(self):
+        if not self.arquivo_historico or not os.path.exists(self.arquivo_historico):
+            return {}
+
+        try:
+            with open(self.arquivo_historico, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Não foi possível carregar histórico de polling: {str(e)}")
+            return {}
+
+    def _salvar_historico(self):
+        if not self.arquivo_historico:
+            return
+
+        try:
+            with open(self.arquivo_historico, 'w', encoding='utf-8') as f:
+                json.dump(self.historico, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.warning(f"Não foi possível salvar histórico de polling: {str(e)}")
+
+    def estimar_duracao(self, chave):
+        """Retorna a duração mediana de conclusão para a chave, ou None"""
+        with self._lock:
+            duracoes = self.historico.get(chave, {}).get('duracoes', [])
+            return statistics.median(duracoes) if duracoes else None
+
+    def estimar_total_etapas(self, chave):
+        """Retorna o maior número de etapas já observado para a chave, ou None"""
+        with self._lock:
+            return self.historico.get(chave, {}).get('etapas')
+
+    def registrar_conclusao(self, chave, duracao, etapas=None, ultimo_pendente=0):
+        """
+        Registra o tempo de conclusão de um relatório
+
+        Args:
+            chave: Chave do conjunto de filtros (ver chave_filtros)
+            duracao: Segundos da submissão até a verificação que encontrou o relatório pronto
+            etapas: Etapas observadas, se conhecidas
+            ultimo_pendente: Segundos da submissão até a última verificação sem o relatório pronto
+
+        O relatório ficou pronto em algum momento entre ultimo_pendente e
+        duracao; registrar só duracao faria a estimativa crescer sempre (a
+        primeira verificação já é agendada na mediana). Registra o ponto médio.
+        """
+        amostra = (min(ultimo_pendente, duracao) + duracao) / 2
+        with self._lock:
+            entrada = self.historico.setdefault(chave, {'duracoes': [], 'etapas': None})
+            entrada['duracoes'] = (entrada['duracoes'] + [round(amostra, 2)])[-MAX_AMOSTRAS_HISTORICO:]
+            if etapas:
+                entrada['etapas'] = max(etapas, entrada.get('etapas') or 0)
+            self._salvar_historico()
+
+        logger.info(f"Relatório concluído entre {ultimo_pendente:.1f}s e {duracao:.1f}s "
+                    f"(amostras: {len(entrada['duracoes'])})")
+
+    def proximo_intervalo(self, chave, decorrido, etapas=None):
+        """
+        Calcula a espera até a próxima verificação
+
+        Args:
+            chave: Chave do conjunto de filtros (ver chave_filtros)
+            decorrido: Segundos desde a submissão do relatório
+            etapas: Etapas concluídas na última verificação, se conhecidas
+
+        Returns:
+            Segundos até a próxima verificação
+        """
+        estimativas = []
+
+        # Tempo restante pelo histórico de conclusões
+        duracao_estimada = self.estimar_duracao(chave)
+        if duracao_estimada is not None and duracao_estimada > decorrido:
+            estimativas.append(duracao_estimada - decorrido)
+
+        # Tempo restante pela fração de etapas concluídas
+        total_etapas = self.estimar_total_etapas(chave)
+        if etapas and total_etapas and etapas < total_etapas and decorrido > 0:
+            estimativas.append(decorrido * (total_etapas - etapas) / etapas)
+
+        if estimativas:
+            intervalo = min(estimativas)
+        else:
+            # Sem estimativa (ou já passou do esperado): backoff pelo tempo decorrido
+            intervalo = decorrido * self.fracao_backoff
+
+        return max(self.intervalo_minimo, min(intervalo, self.intervalo_maximo))
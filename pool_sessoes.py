@@ -0,0 +1,268 @@
+"""
+pool_sessoes.py - Pool de sessões autenticadas de várias contas UFF
+
+O servidor limita quantos relatórios cada usuário processa ao mesmo tempo;
+com várias contas (ex.: cada coordenador com o próprio login) os lotes
+grandes se espalham entre elas.
+
+- Quem enfileira um lote grava a sessão da própria conta em PASTA_CONTAS
+  (criptografada, ver sessao_persistente.py); o worker gera esse lote com
+  ela, e só com ela
+- Com "Disponibilizar minha sessão ao worker" marcado no login, a conta
+  também fica compartilhada (arquivo .compartilhada ao lado da sessão) e
+  pode gerar relatórios dos lotes de qualquer um
+- O worker carrega todas as contas salvas no pool, que escolhe a conta de
+  cada job entre a do solicitante e as compartilhadas (a menos ocupada
+  dentro do limite por conta)
+- Uma thread verifica periodicamente cada sessão com check_session, numa
+  cópia da requests.Session (os lotes em andamento continuam usando a
+  original), e marca como não saudáveis as que o servidor recusar; elas
+  voltam quando carregar_pasta conseguir restaurar a sessão salva (ex.:
+  depois de um novo login do dono)
+
+Qualquer objeto de login com get_session(), check_session(session=None),
+restaurar_sessao(), salvar_sessao(armazem=None) e o atributo conta serve
+(ex.: main.LoginUFF).
+"""
+import logging
+import os
+import re
+import threading
+
+import requests
+
+from sessao_persistente import ARQUIVO_CHAVE, ArmazemSessao
+
+logger = logging.getLogger(__name__)
+
+PASTA_CONTAS = ".sessoes_uff"
+RELATORIOS_POR_CONTA = 3           # Relatórios em processamento por conta ao mesmo tempo
+INTERVALO_VERIFICACAO_POOL = 120   # Segundos entre verificações das sessões
+
+# Contas gravadas antes do identificador com HMAC (sha256 do CPF, compartilhadas por padrão)
+PADRAO_CONTA_ANTIGA = re.compile(r'conta_[0-9a-f]{16}')
+SUFIXO_COMPARTILHADA = ".compartilhada"
+
+
+def arquivo_conta(conta, pasta=PASTA_CONTAS):
+    """
+    Arquivo da sessão de uma conta
+
+    Args:
+        conta: Identificador da conta (identificador_protegido do CPF, ver
+               sessao_persistente.py), que não expõe o CPF
+    """
+    return os.path.join(pasta, f"conta_{conta}")
+
+
+def registrar_conta(login, compartilhada=None, pasta=PASTA_CONTAS):
+    """
+    Grava a sessão de um login bem-sucedido (com login.conta) na pasta de contas do pool
+
+    Args:
+        compartilhada: True/False marca ou desmarca a conta como disponível
+                       para os lotes de outros usuários; None mantém como está
+    """
+    os.makedirs(pasta, mode=0o700, exist_ok=True)
+    arquivo = arquivo_conta(login.conta, pasta)
+    login.salvar_sessao(ArmazemSessao(arquivo=arquivo, arquivo_chave=ARQUIVO_CHAVE))
+
+    if compartilhada:
+        open(arquivo + SUFIXO_COMPARTILHADA, 'a').close()
+    elif compartilhada is not None and os.path.exists(arquivo + SUFIXO_COMPARTILHADA):
+        os.remove(arquivo + SUFIXO_COMPARTILHADA)
+
+
+def copiar_session(session):
+    """Cópia da requests.Session (cookies, cabeçalhos e autenticação) para verificar sem tocar na original"""
+    copia = requests.Session()
+    copia.headers.update(session.headers)
+    copia.cookies.update(session.cookies.copy())
+    copia.auth = session.auth
+    copia.verify = session.verify
+    return copia
+
+
+def remover_conta(conta, pasta=PASTA_CONTAS):
+    """Remove a sessão de uma conta do pool (ex.: ao sair)"""
+    arquivo = arquivo_conta(conta, pasta)
+    ArmazemSessao(arquivo=arquivo, arquivo_chave=ARQUIVO_CHAVE).apagar()
+    if os.path.exists(arquivo + SUFIXO_COMPARTILHADA):
+        os.remove(arquivo + SUFIXO_COMPARTILHADA)
+
+
+class PoolSessoes:
+    """Contas autenticadas disponíveis para os jobs, com verificação em segundo plano"""
+
+    def __init__(self, relatorios_por_conta=RELATORIOS_POR_CONTA, intervalo_verificacao=INTERVALO_VERIFICACAO_POOL):
+        self.relatorios_por_conta = relatorios_por_conta
+        self.intervalo_verificacao = intervalo_verificacao
+        self.contas = {}        # conta -> {'login', 'saudavel', 'compartilhada'}
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def de_pasta(cls, fabrica_login, pasta=PASTA_CONTAS, **opcoes):
+        """
+        Cria o pool com as contas salvas na pasta
+
+        Args:
+            fabrica_login: Função que recebe um ArmazemSessao e devolve o objeto de login
+            pasta: Pasta com as sessões das contas
+        """
+        pool = cls(**opcoes)
+        pool.carregar_pasta(fabrica_login, pasta)
+        return pool
+
+    def carregar_pasta(self, fabrica_login, pasta=PASTA_CONTAS):
+        """
+        Sincroniza o pool com a pasta de contas
+
+        Adiciona as contas novas que ainda são válidas, tenta restaurar as não
+        saudáveis pela sessão salva (o dono pode ter entrado de novo), atualiza
+        quais estão compartilhadas e tira do pool as que saíram (sessão apagada
+        ao sair).
+        """
+        if not os.path.isdir(pasta):
+            return 0
+
+        arquivos = set(os.listdir(pasta))
+        for conta in [conta for conta in self.contas if f"conta_{conta}" not in arquivos]:
+            logger.info(f"Conta {conta} saiu do pool")
+            self.remover(conta)
+
+        adicionadas = 0
+        for nome in sorted(arquivos):
+            if not nome.startswith('conta_') or '.' in nome:
+                continue
+            if PADRAO_CONTA_ANTIGA.fullmatch(nome):
+                # A conta volta ao pool quando o dono entrar de novo escolhendo compartilhar
+                ArmazemSessao(arquivo=os.path.join(pasta, nome), arquivo_chave=ARQUIVO_CHAVE).apagar()
+                logger.info(f"Sessão {nome} no formato antigo removida do pool")
+                continue
+
+            conta = nome[len('conta_'):]
+            compartilhada = nome + SUFIXO_COMPARTILHADA in arquivos
+            with self._lock:
+                existente = self.contas.get(conta)
+                if existente:
+                    existente['compartilhada'] = compartilhada
+            if existente and existente['saudavel']:
+                continue
+
+            # Um login novo, com sessão própria: a do login antigo pode estar em uso num lote
+            login = fabrica_login(ArmazemSessao(arquivo=os.path.join(pasta, nome), arquivo_chave=ARQUIVO_CHAVE))
+            if login.restaurar_sessao():
+                self.adicionar(conta, login, compartilhada)
+                adicionadas += 1
+            elif existente:
+                self.remover(conta)
+                logger.info(f"Sessão salva da conta {conta} não é mais válida; removida do pool")
+            else:
+                logger.info(f"Sessão da conta {conta} não é mais válida")
+
+        return adicionadas
+
+    def adicionar(self, conta, login, compartilhada=False):
+        """Adiciona uma conta já autenticada"""
+        with self._lock:
+            self.contas[conta] = {'login': login, 'saudavel': True, 'compartilhada': compartilhada}
+        logger.info(f"Conta {conta} adicionada ao pool ({len(self.contas)} conta(s))")
+
+    def remover(self, nome):
+        with self._lock:
+            self.contas.pop(nome, None)
+
+    def contas_saudaveis(self):
+        with self._lock:
+            return [nome for nome, conta in self.contas.items() if conta['saudavel']]
+
+    def contas_permitidas(self, solicitante=None):
+        """
+        Contas saudáveis que podem gerar os relatórios de um lote
+
+        Args:
+            solicitante: Conta de quem pediu o lote; ela e as compartilhadas
+                         servem (sem solicitante, só as compartilhadas)
+        """
+        with self._lock:
+            return [
+                nome for nome, conta in self.contas.items()
+                if conta['saudavel'] and (conta['compartilhada'] or nome == solicitante)
+            ]
+
+    def obter_login(self, nome):
+        """Objeto de login da conta, ou None se ela não está no pool"""
+        with self._lock:
+            conta = self.contas.get(nome)
+        return conta['login'] if conta else None
+
+    def obter_session(self, nome):
+        """requests.Session da conta, ou None se ela saiu do pool"""
+        login = self.obter_login(nome)
+        return login.get_session() if login else None
+
+    def escolher(self, em_andamento, solicitante=None):
+        """
+        Escolhe a conta para o próximo job
+
+        Args:
+            em_andamento: Dict conta -> relatórios dela em processamento
+            solicitante: Conta de quem pediu o lote (ver contas_permitidas)
+
+        Returns:
+            Nome da conta permitida menos ocupada abaixo do limite, ou None
+        """
+        livres = [
+            nome for nome in self.contas_permitidas(solicitante)
+            if em_andamento.get(nome, 0) < self.relatorios_por_conta
+        ]
+        if not livres:
+            return None
+        return min(livres, key=lambda nome: em_andamento.get(nome, 0))
+
+    def verificar(self):
+        """
+        Verifica todas as sessões e marca como não saudáveis as recusadas
+
+        A verificação usa uma cópia da sessão: uma falha não limpa os cookies
+        nem apaga a sessão salva de uma conta que esteja gerando um lote.
+        """
+        with self._lock:
+            contas = list(self.contas.items())
+
+        for nome, conta in contas:
+            login = conta['login']
+            try:
+                saudavel = login.check_session(copiar_session(login.get_session()))
+            except Exception as e:
+                logger.warning(f"Erro ao verificar a conta {nome}: {str(e)}")
+                saudavel = False
+
+            if saudavel:
+                # Guardar tokens renovados
+                login.salvar_sessao()
+            elif conta['saudavel']:
+                logger.warning(f"Sessão da conta {nome} expirou; fora do pool até ser restaurada")
+
+            with self._lock:
+                conta['saudavel'] = saudavel
+
+    def _verificar_periodicamente(self):
+        while not self._parar.wait(self.intervalo_verificacao):
+            self.verificar()
+
+    def iniciar(self):
+        """Inicia a verificação em segundo plano"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._verificar_periodicamente, daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
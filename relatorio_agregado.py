@@ -0,0 +1,118 @@
+"""
+relatorio_agregado.py - Busca agregada: um relatório largo dividido localmente
+
+Em vez de um relatório por curso × período (cada um esperando na fila do
+servidor), pede um único relatório sem os filtros de período de ingresso e
+de desdobramento para cada combinação dos filtros restantes e divide a
+planilha localmente:
+- desdobramento: pelas linhas "Alunos de ..." que fecham o bloco de cada
+  desdobramento (mesma regra do identificar_curso do 2_processar_dados.py)
+- período: pela matrícula (extrair_periodos_ingresso do 2_processar_dados.py)
+
+Cada parte é gravada no mesmo formato de um relatório individual (alunos
+seguidos da linha "Alunos de ..."), então o restante do fluxo não muda.
+"""
+import importlib
+import logging
+
+import pandas as pd
+
+from cache_relatorios import extrair_ano_semestre
+
+logger = logging.getLogger(__name__)
+
+# Filtros removidos do relatório agregado e resolvidos na divisão local
+FILTROS_DIVIDIDOS = ('report_filter_ano_semestre_ingresso', 'report_filter_desdobramento')
+
+# Início da linha que fecha o bloco de cada desdobramento
+PREFIXO_TOTALIZADOR = 'ALUNOS DE'
+
+# O nome do arquivo começa com dígito, então não dá para usar "import"
+processamento = importlib.import_module('2_processar_dados')
+
+
+def filtros_agregados(filtros):
+    """Filtros do relatório agregado: os do job sem período e desdobramento"""
+    return {campo: valor for campo, valor in filtros.items() if campo not in FILTROS_DIVIDIDOS}
+
+
+def agrupar_jobs(jobs):
+    """
+    Agrupa os jobs pelos filtros que sobram no relatório agregado
+
+    Returns:
+        Lista de tuplas (filtros_agregados, jobs_do_grupo), na ordem dos jobs
+    """
+    grupos = {}
+    for job in jobs:
+        filtros = filtros_agregados(job['filtros'])
+        chave = tuple(sorted(filtros.items()))
+        grupos.setdefault(chave, (filtros, []))[1].append(job)
+    return list(grupos.values())
+
+
+def separar_blocos(df, processador=None):
+    """
+    Separa a planilha agregada nos blocos de cada desdobramento
+
+    Returns:
+        Lista de tuplas (curso, linhas_alunos, linha_totalizadora)
+
+    Raises:
+        ValueError: se nenhuma linha "Alunos de ..." for encontrada
+    """
+    processador = processador or processamento.ProcessadorDados()
+    primeira_coluna = df.iloc[:, 0].astype(str).str.strip().str.upper()
+    fins = [posicao for posicao, texto in enumerate(primeira_coluna) if texto.startswith(PREFIXO_TOTALIZADOR)]
+
+    if not fins:
+        raise ValueError("Relatório agregado sem linhas 'Alunos de ...' para separar os desdobramentos")
+
+    blocos = []
+    inicio = 0
+    for fim in fins:
+        curso = processador.identificar_curso(df.iloc[inicio:fim + 1])
+        blocos.append((curso, df.iloc[inicio:fim], df.iloc[fim:fim + 1]))
+        inicio = fim + 1
+
+    return blocos
+
+
+def dividir_relatorio(df, partes, processador=None):
+    """
+    Divide o relatório agregado nas partes pedidas (curso × período)
+
+    Args:
+        df: DataFrame do relatório agregado
+        partes: Lista de tuplas (curso, periodo), com curso como em
+                DESDOBRAMENTOS_CURSOS e periodo no formato '2025/1°'
+        processador: ProcessadorDados usado na identificação (opcional)
+
+    Returns:
+        Dict (curso, periodo) -> DataFrame no formato de um relatório
+        individual; partes cujo desdobramento não aparece ficam de fora
+    """
+    processador = processador or processamento.ProcessadorDados()
+    blocos = {}
+    for curso, linhas, totalizador in separar_blocos(df, processador):
+        if curso in blocos:
+            logger.warning(f"Desdobramento {curso} aparece mais de uma vez no relatório agregado")
+            anteriores, _ = blocos[curso]
+            linhas = pd.concat([anteriores, linhas])
+        blocos[curso] = (linhas, totalizador)
+
+    resultado = {}
+    for curso, periodo in partes:
+        if curso not in blocos:
+            logger.warning(f"Desdobramento {curso} não encontrado no relatório agregado")
+            continue
+
+        linhas, totalizador = blocos[curso]
+        periodos_alunos = processador.extrair_periodos_ingresso(linhas.iloc[:, 0])
+        alvo = extrair_ano_semestre(periodo) or (None, None)
+        selecionados = (periodos_alunos['ano'] == alvo[0]) & (periodos_alunos['semestre'] == alvo[1])
+
+        resultado[(curso, periodo)] = pd.concat([linhas[selecionados], totalizador], ignore_index=True)
+        logger.info(f"Parte {curso} - {periodo}: {int(selecionados.sum())} alunos")
+
+    return resultado
@@ -0,0 +1,506 @@
+"""
+servidor_mock_uff.py - Servidor local que imita o portal app.uff.br
+
+Cobre o necessário para exercitar LoginUFF, GeradorRelatorios e
+GeradorRelatoriosManual sem acessar o portal real:
+- formulário de login do Keycloak e redirecionamento de volta à aplicação
+- formulário listagens_alunos com selects realistas e authenticity_token
+- relatórios com tempo de processamento configurável (div.step enquanto processa)
+- índice /relatorios e download .xlsx (com suporte a Range)
+
+Executa: python servidor_mock_uff.py --porta 8080
+Depois:  UFF_BASE_URL=http://127.0.0.1:8080 streamlit run main.py
+"""
+import argparse
+import io
+import json
+import logging
+import random
+import re
+import secrets
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from openpyxl import Workbook
+
+logger = logging.getLogger(__name__)
+
+# Caminhos imitando o portal
+APLICACAO_PATH = "/graduacao/administracaoacademica"
+RELATORIOS_PATH = f"{APLICACAO_PATH}/relatorios"
+LISTAGEM_PATH = f"{RELATORIOS_PATH}/listagens_alunos"
+AUTH_PATH = "/auth/realms/master/protocol/openid-connect/auth"
+LOGIN_ACTION_PATH = "/auth/realms/master/login-actions/authenticate"
+TOKEN_PATH = "/auth/realms/master/protocol/openid-connect/token"
+
+TOTAL_ETAPAS = 4
+
+# Opções dos selects (amostra realista do formulário)
+LOCALIDADES = ['Niterói', 'Angra dos Reis', 'Arraial do Cabo', 'Bom Jesus do Itabapoana',
+               'Cabo Frio', 'Campos dos Goytacazes', 'Macaé', 'Nova Friburgo', 'Petrópolis',
+               'Rio das Ostras', 'Santo Antônio de Pádua', 'Volta Redonda']
+CURSOS = ['Administração', 'Arquitetura e Urbanismo', 'Biomedicina', 'Ciência da Computação',
+          'Ciências Biológicas', 'Ciências Contábeis', 'Ciências Econômicas', 'Direito',
+          'Enfermagem', 'Engenharia Civil', 'Engenharia de Petróleo', 'Engenharia Elétrica',
+          'Engenharia Mecânica', 'Engenharia Química', 'Farmácia', 'Física', 'Geografia',
+          'História', 'Letras', 'Matemática', 'Medicina', 'Medicina Veterinária', 'Nutrição',
+          'Odontologia', 'Pedagogia', 'Psicologia', 'Química', 'Química Industrial',
+          'Serviço Social', 'Sistemas de Informação']
+DESDOBRAMENTOS = {
+    'Química (Licenciatura) (12700)': 'LICENCIADO EM QUÍMICA',
+    'Química (Bacharelado) (312700)': 'BACHAREL EM QUÍMICA',
+    'Química Industrial (12709)': 'QUÍMICO INDUSTRIAL',
+}
+FORMAS_INGRESSO = ['SISU 1ª Edição', 'SISU 2ª Edição', 'Convenio Cultural/PEC-G',
+                   'Transferência Facultativa', 'Mudança de Curso', 'Reingresso',
+                   'Curso à Distância - REVINCULAÇÃO']
+# Períodos incluídos quando o relatório não filtra o período de ingresso
+PERIODOS_AGREGADOS = [f"{ano}/{semestre}°" for ano in range(2022, 2026) for semestre in (1, 2)]
+STATUS_ALUNOS = [('ATIVO', None), ('ATIVO', None), ('ATIVO', None),
+                 ('CANCELADO', 'ABANDONO'), ('CANCELADO', 'DESISTÊNCIA'),
+                 ('TRANCADO', None), ('FORMADO', None)]
+
+
+def _opcoes_html(valores, com_codigo=False):
+    linhas = ['<option value="">Selecione</option>']
+    for indice, texto in enumerate(valores, start=1):
+        valor = re.search(r'\((\d+)\)$', texto).group(1) if com_codigo else str(indice)
+        linhas.append(f'<option value="{valor}">{texto}</option>')
+    return '\n'.join(linhas)
+
+
+def _periodos():
+    return [f"{ano}/{semestre}°" for ano in range(2026, 1999, -1) for semestre in (2, 1)]
+
+
+def _desdobramentos():
+    # Desdobramentos de Química mais um código para cada outro curso
+    extras = [f"{curso} ({20000 + indice})" for indice, curso in enumerate(CURSOS)]
+    return list(DESDOBRAMENTOS) + extras
+
+
+class EstadoMock:
+    """Estado compartilhado do servidor: sessões, relatórios e contadores"""
+
+    def __init__(self, atraso_min=2.0, atraso_max=6.0, alunos_por_relatorio=200,
+                 cpf=None, senha=None, semente=None, aceitar_token=True, validade_token=300):
+        self.atraso_min = atraso_min
+        self.atraso_max = atraso_max
+        self.alunos_por_relatorio = alunos_por_relatorio
+        self.cpf = cpf
+        self.senha = senha
+        self.aceitar_token = aceitar_token       # direct access grants habilitado no realm
+        self.validade_token = validade_token
+        self.tokens = {}        # access token -> (sessao, expira_em)
+        self.refresh_tokens = {}    # refresh token -> sessao
+        self.random = random.Random(semente)
+        self.lock = threading.Lock()
+        self.sessoes = {}       # cookie -> authenticity_token
+        self.relatorios = {}    # id -> dict
+        self.proximo_id = 1000
+        self.contadores = Counter()
+        self.latencias = {}     # categoria -> lista de segundos
+
+    def registrar(self, categoria, duracao):
+        with self.lock:
+            self.contadores[categoria] += 1
+            self.latencias.setdefault(categoria, []).append(duracao)
+
+    def estatisticas(self):
+        with self.lock:
+            return {
+                'requisicoes': dict(self.contadores),
+                'total_requisicoes': sum(self.contadores.values()),
+                'relatorios_criados': len(self.relatorios),
+                'latencia_media': {
+                    categoria: sum(valores) / len(valores)
+                    for categoria, valores in self.latencias.items() if valores
+                },
+            }
+
+    def criar_relatorio(self, campos):
+        with self.lock:
+            relatorio_id = self.proximo_id
+            self.proximo_id += 1
+            self.relatorios[relatorio_id] = {
+                'campos': campos,
+                'criado_em': time.monotonic(),
+                'atraso': self.random.uniform(self.atraso_min, self.atraso_max),
+                'arquivo': None,
+            }
+        return relatorio_id
+
+    def progresso(self, relatorio):
+        decorrido = time.monotonic() - relatorio['criado_em']
+        return min(1.0, decorrido / relatorio['atraso']) if relatorio['atraso'] else 1.0
+
+    def gerar_xlsx(self, relatorio):
+        """Gera (uma vez) a planilha do relatório no formato do sistema"""
+        if relatorio['arquivo'] is not None:
+            return relatorio['arquivo']
+
+        # Sem desdobramento ou período no filtro, o relatório traz um bloco
+        # por desdobramento do curso, com alunos de vários períodos
+        campos = relatorio['campos']
+        desdobramento = campos.get('report_filter_desdobramento_texto', '')
+        curso = campos.get('report_filter_curso_texto', '')
+        if desdobramento:
+            desdobramentos = [desdobramento]
+        else:
+            desdobramentos = [d for d in DESDOBRAMENTOS if not curso or d.startswith(f"{curso} (")]
+        periodo = campos.get('report_filter_ano_semestre_ingresso_texto', '')
+        periodos = [periodo] if periodo else PERIODOS_AGREGADOS
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet('Listagem')
+        ws.append(['Matrícula', 'Nome', 'Situação', 'Motivo'])
+        for desdobramento in desdobramentos:
+            total = 0
+            for periodo in periodos:
+                match = re.match(r'(\d{4})/([12])', periodo)
+                ano, semestre = (int(match.group(1)), int(match.group(2))) if match else (2025, 1)
+                for sequencial in range(self.alunos_por_relatorio):
+                    status, motivo = self.random.choice(STATUS_ALUNOS)
+                    ws.append([f"{semestre}{ano % 100:02d}{sequencial:06d}", f"Aluno Teste {sequencial}",
+                               status, motivo])
+                total += self.alunos_por_relatorio
+            ws.append([f"Alunos de {DESDOBRAMENTOS.get(desdobramento, desdobramento.upper())}: {total}"])
+
+        saida = io.BytesIO()
+        wb.save(saida)
+        relatorio['arquivo'] = saida.getvalue()
+        return relatorio['arquivo']
+
+
+class ManipuladorMock(BaseHTTPRequestHandler):
+    """Rotas do portal simulado"""
+
+    protocol_version = 'HTTP/1.1'
+    estado = None   # definido em criar_servidor
+
+    def log_message(self, formato, *args):
+        logger.debug(formato % args)
+
+    # --- utilitários -----------------------------------------------------
+
+    def _cookie_sessao(self):
+        autorizacao = self.headers.get('Authorization', '')
+        if autorizacao.startswith('Bearer '):
+            sessao, expira_em = self.estado.tokens.get(autorizacao[7:], (None, 0))
+            return sessao if expira_em > time.monotonic() else None
+
+        cookies = self.headers.get('Cookie', '')
+        match = re.search(r'_uff_session=([\w-]+)', cookies)
+        if match and match.group(1) in self.estado.sessoes:
+            return match.group(1)
+        return None
+
+    def _responder(self, status, corpo=b'', tipo='text/html; charset=utf-8', headers=None):
+        if isinstance(corpo, str):
+            corpo = corpo.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(corpo)))
+        for nome, valor in (headers or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(corpo)
+
+    def _redirecionar(self, destino, headers=None):
+        headers = dict(headers or {})
+        headers['Location'] = destino
+        self._responder(302, b'', headers=headers)
+
+    def _ler_formulario(self):
+        tamanho = int(self.headers.get('Content-Length', 0))
+        corpo = self.rfile.read(tamanho).decode('utf-8')
+        return {chave: valores[0] for chave, valores in parse_qs(corpo, keep_blank_values=True).items()}
+
+    def _exigir_login(self):
+        if self._cookie_sessao():
+            return True
+        if self.headers.get('Authorization', '').startswith('Bearer '):
+            self._responder(401, 'Token inválido ou expirado')
+            return False
+        self._redirecionar(f"{AUTH_PATH}?client_id=administracaoacademica&response_type=code")
+        return False
+
+    # --- páginas ---------------------------------------------------------
+
+    def _pagina_login(self, erro=None):
+        codigo = secrets.token_hex(8)
+        mensagem = f'<div id="kc-error-message">{erro}</div>' if erro else ''
+        return f"""<html><head><title>Login UFF</title></head><body>
+{mensagem}
+<form id="kc-form-login" action="{LOGIN_ACTION_PATH}?session_code={codigo}&amp;execution=x&amp;client_id=administracaoacademica" method="post">
+<input type="text" name="username"><input type="password" name="password">
+<input type="hidden" name="credentialId" value="">
+<input type="checkbox" name="rememberMe">
+<input type="submit" value="Entrar">
+</form></body></html>"""
+
+    def _pagina_aplicacao(self, sessao):
+        return f"""<html><head><meta name="csrf-token" content="{self.estado.sessoes[sessao]}">
+<title>Administração Acadêmica</title></head><body><h1>Administração Acadêmica</h1>
+<a href="{RELATORIOS_PATH}">Relatórios</a></body></html>"""
+
+    def _pagina_listagem(self, sessao):
+        token = self.estado.sessoes[sessao]
+        return f"""<html><head><meta name="csrf-token" content="{token}"></head><body>
+<form action="{LISTAGEM_PATH}" method="post">
+<input type="hidden" name="utf8" value="✓">
+<input type="hidden" name="authenticity_token" value="{token}">
+<input type="hidden" name="format" value="xlsx">
+<select name="report_filter_localidade">{_opcoes_html(LOCALIDADES)}</select>
+<select name="report_filter_curso">{_opcoes_html(CURSOS)}</select>
+<select name="report_filter_desdobramento">{_opcoes_html(_desdobramentos(), com_codigo=True)}</select>
+<select name="report_filter_forma_ingresso">{_opcoes_html(FORMAS_INGRESSO)}</select>
+<select name="report_filter_ano_semestre_ingresso">{_opcoes_html(_periodos())}</select>
+<input type="submit" value="Gerar">
+</form></body></html>"""
+
+    def _link_arquivo(self, relatorio_id):
+        return f"{RELATORIOS_PATH}/{relatorio_id}/listagem_alunos_{relatorio_id}.xlsx"
+
+    def _pagina_relatorio(self, relatorio_id, relatorio):
+        progresso = self.estado.progresso(relatorio)
+        if progresso >= 1.0:
+            conteudo = f'<p>Relatório pronto</p><a href="{self._link_arquivo(relatorio_id)}">Baixar planilha</a>'
+        else:
+            etapas = 1 + int(progresso * (TOTAL_ETAPAS - 1))
+            conteudo = '\n'.join(f'<div class="step">Etapa {i + 1}</div>' for i in range(etapas))
+        return f"<html><body><h1>Relatório {relatorio_id}</h1>{conteudo}</body></html>"
+
+    def _pagina_indice(self):
+        linhas = []
+        for relatorio_id, relatorio in sorted(self.estado.relatorios.items(), reverse=True):
+            pronto = self.estado.progresso(relatorio) >= 1.0
+            arquivo = f'<a href="{self._link_arquivo(relatorio_id)}">xlsx</a>' if pronto else 'Processando'
+            linhas.append(f'<tr><td><a href="{RELATORIOS_PATH}/{relatorio_id}">Relatório {relatorio_id}</a></td>'
+                          f'<td>{arquivo}</td></tr>')
+        return f"<html><body><table>{''.join(linhas)}</table></body></html>"
+
+    # --- rotas -----------------------------------------------------------
+
+    def do_GET(self):
+        inicio = time.monotonic()
+        caminho = urlparse(self.path).path
+        categoria = 'outros'
+
+        if caminho == '/__mock/estatisticas':
+            self._responder(200, json.dumps(self.estado.estatisticas()), 'application/json')
+            return
+
+        if caminho.startswith('/auth/'):
+            categoria = 'login'
+            self._responder(200, self._pagina_login())
+        elif caminho.rstrip('/') == APLICACAO_PATH:
+            categoria = 'login'
+            if self._exigir_login():
+                self._responder(200, self._pagina_aplicacao(self._cookie_sessao()))
+        elif caminho == LISTAGEM_PATH:
+            categoria = 'formulario'
+            if self._exigir_login():
+                self._responder(200, self._pagina_listagem(self._cookie_sessao()))
+        elif caminho.rstrip('/') == RELATORIOS_PATH:
+            categoria = 'polling'
+            if self._exigir_login():
+                self._responder(200, self._pagina_indice())
+        elif re.fullmatch(rf'{RELATORIOS_PATH}/(\d+)/[\w.-]+\.xlsx', caminho):
+            categoria = 'download'
+            if self._exigir_login():
+                self._baixar(int(caminho.split('/')[-2]))
+        elif re.fullmatch(rf'{RELATORIOS_PATH}/(\d+)', caminho):
+            categoria = 'polling'
+            if self._exigir_login():
+                relatorio_id = int(caminho.split('/')[-1])
+                relatorio = self.estado.relatorios.get(relatorio_id)
+                if relatorio is None:
+                    self._responder(404, 'Relatório não encontrado')
+                else:
+                    self._responder(200, self._pagina_relatorio(relatorio_id, relatorio))
+        else:
+            self._responder(404, 'Não encontrado')
+
+        self.estado.registrar(categoria, time.monotonic() - inicio)
+
+    def do_POST(self):
+        inicio = time.monotonic()
+        caminho = urlparse(self.path).path
+        categoria = 'outros'
+
+        if caminho == LOGIN_ACTION_PATH:
+            categoria = 'login'
+            self._autenticar(self._ler_formulario())
+        elif caminho == TOKEN_PATH:
+            categoria = 'login'
+            self._emitir_token(self._ler_formulario())
+        elif caminho == LISTAGEM_PATH:
+            categoria = 'submissao'
+            if self._exigir_login():
+                self._submeter(self._ler_formulario())
+        else:
+            self._responder(404, 'Não encontrado')
+
+        self.estado.registrar(categoria, time.monotonic() - inicio)
+
+    def _credenciais_ok(self, usuario, senha):
+        return bool(usuario and senha) and (
+            self.estado.cpf is None or (usuario == self.estado.cpf and senha == self.estado.senha)
+        )
+
+    def _emitir_token(self, dados):
+        def erro(status, codigo, descricao):
+            self._responder(status, json.dumps({'error': codigo, 'error_description': descricao}),
+                            'application/json')
+
+        if not self.estado.aceitar_token:
+            erro(400, 'unauthorized_client', 'Client not allowed for direct access grants')
+            return
+
+        tipo = dados.get('grant_type')
+        if tipo == 'password':
+            if not self._credenciais_ok(dados.get('username', ''), dados.get('password', '')):
+                erro(401, 'invalid_grant', 'Invalid user credentials')
+                return
+            sessao = secrets.token_urlsafe(16)
+            with self.estado.lock:
+                self.estado.sessoes[sessao] = secrets.token_urlsafe(32)
+        elif tipo == 'refresh_token':
+            sessao = self.estado.refresh_tokens.get(dados.get('refresh_token', ''))
+            if sessao is None:
+                erro(400, 'invalid_grant', 'Invalid refresh token')
+                return
+        else:
+            erro(400, 'unsupported_grant_type', 'Unsupported grant type')
+            return
+
+        access_token, refresh_token = secrets.token_urlsafe(24), secrets.token_urlsafe(24)
+        with self.estado.lock:
+            self.estado.tokens[access_token] = (sessao, time.monotonic() + self.estado.validade_token)
+            self.estado.refresh_tokens[refresh_token] = sessao
+        self._responder(200, json.dumps({
+            'access_token': access_token, 'expires_in': self.estado.validade_token,
+            'refresh_token': refresh_token, 'refresh_expires_in': 1800, 'token_type': 'Bearer',
+        }), 'application/json')
+
+    def _autenticar(self, dados):
+        if not self._credenciais_ok(dados.get('username', ''), dados.get('password', '')):
+            self._responder(200, self._pagina_login('Invalid username or password.'))
+            return
+
+        sessao = secrets.token_urlsafe(16)
+        with self.estado.lock:
+            self.estado.sessoes[sessao] = secrets.token_urlsafe(32)
+        self._redirecionar(APLICACAO_PATH, {'Set-Cookie': f'_uff_session={sessao}; Path=/; HttpOnly'})
+
+    def _submeter(self, dados):
+        sessao = self._cookie_sessao()
+        if dados.get('authenticity_token') != self.estado.sessoes[sessao]:
+            self._responder(422, 'ActionController::InvalidAuthenticityToken')
+            return
+
+        # Guardar também os textos das opções escolhidas, para montar a planilha
+        campos = dict(dados)
+        for nome, opcoes in (('report_filter_curso', CURSOS),
+                             ('report_filter_desdobramento', _desdobramentos()),
+                             ('report_filter_ano_semestre_ingresso', _periodos())):
+            valor = dados.get(nome, '')
+            for indice, texto in enumerate(opcoes, start=1):
+                codigo = re.search(r'\((\d+)\)$', texto)
+                if valor in (str(indice), codigo.group(1) if codigo else None):
+                    campos[f'{nome}_texto'] = texto
+                    break
+
+        relatorio_id = self.estado.criar_relatorio(campos)
+        self._redirecionar(f"{RELATORIOS_PATH}/{relatorio_id}")
+
+    def _baixar(self, relatorio_id):
+        relatorio = self.estado.relatorios.get(relatorio_id)
+        if relatorio is None or self.estado.progresso(relatorio) < 1.0:
+            self._responder(404, 'Arquivo não disponível')
+            return
+
+        conteudo = self.estado.gerar_xlsx(relatorio)
+        tipo = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        faixa = re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range', ''))
+
+        if faixa:
+            inicio = int(faixa.group(1))
+            if inicio >= len(conteudo):
+                self._responder(416, b'', tipo, {'Content-Range': f'bytes */{len(conteudo)}'})
+                return
+            self._responder(206, conteudo[inicio:], tipo, {
+                'Content-Range': f'bytes {inicio}-{len(conteudo) - 1}/{len(conteudo)}',
+                'Accept-Ranges': 'bytes',
+            })
+        else:
+            self._responder(200, conteudo, tipo, {'Accept-Ranges': 'bytes'})
+
+
+def criar_servidor(host='127.0.0.1', porta=0, **opcoes):
+    """
+    Cria o servidor simulado (porta 0 escolhe uma porta livre)
+
+    Args:
+        host: Endereço de escuta
+        porta: Porta de escuta
+        **opcoes: Parâmetros de EstadoMock (atraso_min, atraso_max, alunos_por_relatorio...)
+
+    Returns:
+        Tupla (servidor, estado); a URL base é http://host:servidor.server_port
+    """
+    estado = EstadoMock(**opcoes)
+    manipulador = type('ManipuladorMockConfigurado', (ManipuladorMock,), {'estado': estado})
+    servidor = ThreadingHTTPServer((host, porta), manipulador)
+    servidor.daemon_threads = True
+    return servidor, estado
+
+
+def iniciar_em_segundo_plano(**opcoes):
+    """Inicia o servidor numa thread e retorna (servidor, estado, url_base)"""
+    servidor, estado = criar_servidor(**opcoes)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    host, porta = servidor.server_address[:2]
+    return servidor, estado, f"http://{host}:{porta}"
+
+
+def main():
+    """Executa o servidor simulado até Ctrl+C"""
+    parser = argparse.ArgumentParser(description="Servidor simulado do portal UFF")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8080)
+    parser.add_argument('--atraso-min', type=float, default=2.0, help="Processamento mínimo (s)")
+    parser.add_argument('--atraso-max', type=float, default=6.0, help="Processamento máximo (s)")
+    parser.add_argument('--alunos', type=int, default=200, help="Alunos por relatório")
+    parser.add_argument('--cpf', help="Aceitar apenas este CPF (padrão: qualquer)")
+    parser.add_argument('--senha', help="Senha exigida junto com --cpf")
+    parser.add_argument('--sem-token', action='store_true',
+                        help="Recusar o endpoint de token (realm sem direct access grants)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    servidor, estado = criar_servidor(
+        args.host, args.porta,
+        atraso_min=args.atraso_min, atraso_max=args.atraso_max,
+        alunos_por_relatorio=args.alunos, cpf=args.cpf, senha=args.senha,
+        aceitar_token=not args.sem_token
+    )
+    print(f"Servidor simulado em http://{args.host}:{servidor.server_port}")
+    print(f"Use: UFF_BASE_URL=http://{args.host}:{servidor.server_port} streamlit run main.py")
+
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(estado.estatisticas(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+sessao_http.py - Fábrica das sessões HTTP usadas com o sistema UFF
+
+Todas as sessões saem daqui com:
+- pool de conexões dimensionado para vários jobs simultâneos
+- novas tentativas com backoff em falhas de conexão e respostas 502/503/504
+- cookie jar protegido por lock, para ser compartilhado entre threads
+- limite de taxa por tipo de endpoint e medição de latência/erros para o
+  governador de concorrência (limitador.py)
+- gravação ou reprodução das requisições num cassete, se configurado pelo
+  ambiente (cassete_http.py)
+"""
+import logging
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import RequestsCookieJar
+from urllib3.util.retry import Retry
+
+from cassete_http import AdaptadorReproducao, cassete_do_ambiente
+from limitador import GOVERNADOR_PADRAO, LIMITADOR_PADRAO
+
+logger = logging.getLogger(__name__)
+
+# Configurações
+POOL_CONEXOES = 20                     # Conexões mantidas por host
+TENTATIVAS_HTTP = 3                    # Novas tentativas por requisição
+FATOR_BACKOFF = 0.5                    # Espera 0.5s, 1s, 2s... entre tentativas
+STATUS_NOVA_TENTATIVA = (429, 502, 503, 504)  # 429 respeita o Retry-After
+STATUS_SOBRECARGA = (429, 500, 502, 503, 504)
+
+
+class CookieJarCompartilhado(RequestsCookieJar):
+    """RequestsCookieJar com leitura e escrita protegidas pelo lock interno do CookieJar"""
+
+    def set(self, name, value, **kwargs):
+        with self._cookies_lock:
+            return super().set(name, value, **kwargs)
+
+    def set_cookie(self, cookie, *args, **kwargs):
+        with self._cookies_lock:
+            return super().set_cookie(cookie, *args, **kwargs)
+
+    def get(self, name, default=None, domain=None, path=None):
+        with self._cookies_lock:
+            return super().get(name, default, domain, path)
+
+    def __iter__(self):
+        # Iterar sobre uma cópia, para não ver o jar mudando no meio
+        with self._cookies_lock:
+            cookies = list(super().__iter__())
+        return iter(cookies)
+
+    def clear(self, domain=None, path=None, name=None):
+        with self._cookies_lock:
+            return super().clear(domain, path, name)
+
+    def copy(self):
+        novo = CookieJarCompartilhado()
+        novo.set_policy(self.get_policy())
+        novo.update(self)
+        return novo
+
+
+class AdaptadorLimitado(HTTPAdapter):
+    """
+    HTTPAdapter que espera o limite de taxa antes de cada envio e informa
+    latência e erros ao governador de concorrência
+
+    Cada redirect passa de novo pelo adaptador, então também conta no limite.
+    A latência medida é até os headers da resposta (o corpo é lido depois).
+    Com um cassete em modo de gravação, cada resposta é gravada nele.
+    """
+
+    def __init__(self, limitador=None, governador=None, cassete=None, **kwargs):
+        self.limitador = limitador
+        self.governador = governador
+        self.cassete = cassete
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.limitador:
+            self.limitador.aguardar(request.method, request.url)
+
+        inicio = time.monotonic()
+        try:
+            response = super().send(request, **kwargs)
+        except requests.exceptions.RequestException:
+            if self.governador:
+                self.governador.registrar(time.monotonic() - inicio, erro=True)
+            raise
+
+        if self.governador:
+            self.governador.registrar(time.monotonic() - inicio,
+                                      erro=response.status_code in STATUS_SOBRECARGA)
+        if self.cassete:
+            self.cassete.gravar(request, response, inicio)
+        return response
+
+
+def criar_adaptador(pool=POOL_CONEXOES, tentativas=TENTATIVAS_HTTP, backoff=FATOR_BACKOFF,
+                    limitador=None, governador=None, cassete=None):
+    """
+    Cria o HTTPAdapter com pool, política de novas tentativas e limite de taxa
+
+    POSTs só são repetidos em falhas de conexão (quando a requisição não chegou
+    ao servidor), para não submeter o mesmo relatório duas vezes. Com um
+    cassete em modo de reprodução, nada sai para a rede.
+    """
+    if cassete and cassete.modo == 'reproduzir':
+        return AdaptadorReproducao(cassete, pool_connections=pool, pool_maxsize=pool)
+
+    retry = Retry(
+        total=tentativas,
+        connect=tentativas,
+        read=tentativas,
+        status=tentativas,
+        backoff_factor=backoff,
+        status_forcelist=STATUS_NOVA_TENTATIVA,
+        allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+        raise_on_status=False,
+    )
+    return AdaptadorLimitado(limitador=limitador, governador=governador, cassete=cassete,
+                             pool_connections=pool, pool_maxsize=pool, max_retries=retry)
+
+
+def criar_sessao(headers=None, pool=POOL_CONEXOES, tentativas=TENTATIVAS_HTTP,
+                 limitador=LIMITADOR_PADRAO, governador=GOVERNADOR_PADRAO, cassete=None):
+    """
+    Cria uma requests.Session pronta para uso concorrente
+
+    Args:
+        headers: Headers padrão da sessão (ex.: HEADERS de simulação de navegador)
+        pool: Tamanho do pool de conexões por host
+        tentativas: Novas tentativas em falhas transitórias
+        limitador: LimitadorRequisicoes aplicado antes de cada envio (None desativa)
+        governador: GovernadorConcorrencia que recebe latência e erros (None desativa)
+        cassete: CasseteHTTP para gravar ou reproduzir as requisições (padrão: o
+                 configurado por UFF_CASSETE, se houver)
+
+    Returns:
+        requests.Session configurada
+    """
+    session = requests.Session()
+    session.cookies = CookieJarCompartilhado()
+
+    adaptador = criar_adaptador(pool, tentativas, limitador=limitador, governador=governador,
+                                cassete=cassete or cassete_do_ambiente())
+    session.mount('https://', adaptador)
+    session.mount('http://', adaptador)
+
+    if headers:
+        session.headers.update(headers)
+
+    return session
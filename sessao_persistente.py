@@ -0,0 +1,169 @@
+"""
+sessao_persistente.py - Armazenamento criptografado da sessão UFF em disco
+
+Guarda os cookies de uma sessão autenticada (criptografados com Fernet),
+e os tokens OIDC quando o login foi pelo endpoint de token, para que uma
+nova aba do navegador ou um reinício do servidor reaproveitem a sessão em
+vez de refazer o login no Keycloak.
+
+Na página, lembrar a sessão é opcional e vale por navegador: o login com
+"Lembrar sessão" gera um token aleatório que fica no endereço da página, e
+a sessão é salva num arquivo próprio desse token. Quem abre a página sem o
+token (outro navegador, outro usuário) não recebe sessão nenhuma.
+
+Os nomes dos arquivos usam identificador_protegido (HMAC com a chave do
+armazém), que não revela o CPF nem o token. A chave pode vir da variável de
+ambiente UFF_SESSAO_CHAVE ou de um arquivo local.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+
+from cryptography.fernet import Fernet, InvalidToken
+
+logger = logging.getLogger(__name__)
+
+# Configurações
+ARQUIVO_CHAVE = ".sessao_uff.chave"
+PASTA_SESSOES_NAVEGADOR = ".sessoes_navegador"     # Sessões lembradas na página, uma por navegador
+VARIAVEL_CHAVE = "UFF_SESSAO_CHAVE"
+VALIDADE_MAXIMA_SESSAO = 12 * 3600    # Sessões salvas há mais tempo são descartadas
+
+
+def obter_chave(arquivo_chave=ARQUIVO_CHAVE):
+    """Chave do armazém (UFF_SESSAO_CHAVE ou arquivo local, criado na primeira execução)"""
+    chave = os.environ.get(VARIAVEL_CHAVE)
+    if chave:
+        return chave.encode()
+
+    try:
+        # Primeira execução: gerar chave legível apenas pelo usuário atual
+        descritor = os.open(arquivo_chave, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(arquivo_chave, 'rb') as f:
+            return f.read().strip()
+
+    chave = Fernet.generate_key()
+    with os.fdopen(descritor, 'wb') as f:
+        f.write(chave)
+    logger.info(f"Chave de sessão criada em {arquivo_chave}")
+    return chave
+
+
+def identificador_protegido(valor, arquivo_chave=ARQUIVO_CHAVE):
+    """
+    Identificador estável de um valor que não pode aparecer em nomes de arquivo (CPF, token)
+
+    HMAC-SHA256 com a chave do armazém: sem a chave, não dá para testar CPFs
+    até achar o que gerou o identificador.
+    """
+    return hmac.new(obter_chave(arquivo_chave), valor.encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+
+
+def novo_token_navegador():
+    """Token aleatório que identifica um navegador com a sessão lembrada"""
+    return secrets.token_urlsafe(32)
+
+
+def arquivo_navegador(token, pasta=PASTA_SESSOES_NAVEGADOR, arquivo_chave=ARQUIVO_CHAVE):
+    """Arquivo da sessão lembrada por um navegador"""
+    return os.path.join(pasta, f"navegador_{identificador_protegido(token, arquivo_chave)}")
+
+
+class ArmazemSessao:
+    """Salva e restaura os cookies de uma requests.Session, criptografados"""
+
+    def __init__(self, arquivo, arquivo_chave=ARQUIVO_CHAVE,
+                 validade_maxima=VALIDADE_MAXIMA_SESSAO):
+        self.arquivo = arquivo
+        self.arquivo_chave = arquivo_chave
+        self.validade_maxima = validade_maxima
+        self.tokens = None      # tokens OIDC da última sessão carregada
+        self.conta = None       # identificador da conta da última sessão carregada
+        self._fernet = Fernet(obter_chave(arquivo_chave))
+
+    def salvar(self, session, tokens=None, conta=None):
+        """Criptografa e grava os cookies da sessão (e os tokens OIDC e a conta, se houver)"""
+        cookies = [
+            {
+                'name': cookie.name,
+                'value': cookie.value,
+                'domain': cookie.domain,
+                'path': cookie.path,
+                'expires': cookie.expires,
+                'secure': cookie.secure,
+            }
+            for cookie in session.cookies
+        ]
+        dados = json.dumps({'salvo_em': time.time(), 'cookies': cookies, 'tokens': tokens,
+                            'conta': conta}).encode('utf-8')
+
+        try:
+            pasta = os.path.dirname(self.arquivo)
+            if pasta:
+                os.makedirs(pasta, mode=0o700, exist_ok=True)
+            descritor = os.open(self.arquivo, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(descritor, 'wb') as f:
+                f.write(self._fernet.encrypt(dados))
+            logger.info(f"Sessão salva ({len(cookies)} cookies)")
+        except Exception as e:
+            logger.warning(f"Não foi possível salvar a sessão: {str(e)}")
+
+    def carregar(self, session):
+        """
+        Restaura na sessão os cookies salvos; os tokens OIDC ficam em self.tokens
+        e a conta em self.conta
+
+        Não faz requisições: descarta a sessão salva se estiver corrompida, for
+        mais antiga que a validade máxima ou não tiver cookies válidos nem tokens.
+
+        Returns:
+            True se algum cookie ou token foi restaurado
+        """
+        if not os.path.exists(self.arquivo):
+            return False
+
+        try:
+            with open(self.arquivo, 'rb') as f:
+                dados = json.loads(self._fernet.decrypt(f.read()))
+        except (InvalidToken, ValueError, OSError) as e:
+            logger.warning(f"Sessão salva inválida, descartando: {str(e)}")
+            self.apagar()
+            return False
+
+        agora = time.time()
+        if agora - dados.get('salvo_em', 0) > self.validade_maxima:
+            logger.info("Sessão salva expirada")
+            self.apagar()
+            return False
+
+        validos = [c for c in dados.get('cookies', []) if not c['expires'] or c['expires'] > agora]
+        self.tokens = dados.get('tokens')
+        self.conta = dados.get('conta')
+        if not validos and not self.tokens:
+            logger.info("Cookies da sessão salva expirados")
+            self.apagar()
+            return False
+
+        for cookie in validos:
+            session.cookies.set(
+                cookie['name'], cookie['value'],
+                domain=cookie['domain'], path=cookie['path'],
+                expires=cookie['expires'], secure=cookie['secure']
+            )
+
+        logger.info(f"Sessão restaurada do disco ({len(validos)} cookies"
+                    f"{', com tokens OIDC' if self.tokens else ''})")
+        return True
+
+    def apagar(self):
+        """Remove a sessão salva"""
+        try:
+            if os.path.exists(self.arquivo):
+                os.remove(self.arquivo)
+        except OSError as e:
+            logger.warning(f"Não foi possível remover a sessão salva: {str(e)}")
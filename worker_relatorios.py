@@ -0,0 +1,148 @@
+"""
+worker_relatorios.py - Worker que gera os relatórios enfileirados pela página
+
+Reserva lotes da fila (fila_relatorios.py), gera os relatórios com o mesmo
+fluxo do main.py e registra o resultado de cada pedido. Cada lote é gerado
+com a sessão da conta que o enfileirou, gravada pela página no pool de
+contas (pool_sessoes.py), então o worker não precisa de CPF e senha; se a
+sessão dessa conta expirar, o lote espera um novo login dela na página.
+
+As contas que fizeram login na página com "Disponibilizar minha sessão ao
+worker" também entram em todos os lotes: os relatórios de cada lote são
+distribuídos entre a conta do solicitante e as compartilhadas.
+
+Vários workers podem rodar ao mesmo tempo, na mesma máquina ou em máquinas
+que compartilhem a pasta (fila, diário e relatórios).
+
+Executa: python worker_relatorios.py
+"""
+import argparse
+import logging
+import os
+import socket
+import threading
+
+import main as app
+from fila_relatorios import FilaRelatorios
+from pool_sessoes import PoolSessoes
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_FILA = 5             # segundos entre consultas à fila vazia
+INTERVALO_SESSAO = 30          # segundos entre tentativas quando não há sessão válida
+
+
+class TrabalhadorRelatorios:
+    """Laço do worker: reserva lotes, gera os relatórios e dá sinal de vida"""
+
+    def __init__(self, fila=None):
+        self.fila = fila or FilaRelatorios()
+        self.identificador = f"{socket.gethostname()}:{os.getpid()}"
+        self.caches_formulario = {}     # conta -> CacheFormulario (o token do formulário é da sessão)
+        self.pool = PoolSessoes()
+        self.sem_sessao = False         # há pedidos, mas nenhum com sessão válida do solicitante
+        self._parar = threading.Event()
+
+    def _cache_formulario(self, conta, login):
+        cache = self.caches_formulario.get(conta)
+        if cache is None or cache[0] is not login:
+            cache = (login, app.CacheFormulario())
+            self.caches_formulario[conta] = cache
+        return cache[1]
+
+    def processar_proximo(self):
+        """
+        Processa o próximo lote da fila, se houver
+
+        Returns:
+            True se um lote foi processado
+        """
+        if not self.fila.ha_pendentes():
+            return False
+
+        # Contas que enfileiraram lotes ou fizeram login na página desde o último lote
+        self.pool.carregar_pasta(app.LoginUFF)
+
+        # Só lotes cujo solicitante tem sessão válida (lotes sem solicitante: contas compartilhadas)
+        compartilhadas = self.pool.contas_permitidas()
+        lote = self.fila.reservar_lote(self.identificador, solicitantes=self.pool.contas_saudaveis(),
+                                       sem_solicitante=bool(compartilhadas))
+        if lote is None:
+            if not self.sem_sessao:
+                logger.warning("Há pedidos na fila, mas nenhuma sessão válida das contas que os pediram: "
+                               "o solicitante precisa entrar de novo pela página")
+            self.sem_sessao = True
+            return False
+        self.sem_sessao = False
+
+        conta = lote['solicitante'] or compartilhadas[0]
+        login = self.pool.obter_login(conta)
+        if login is None:
+            # A conta saiu do pool entre a consulta e a reserva
+            self.fila.devolver_lote(lote['id'], self.identificador, "Devolvido à fila (sessão do solicitante indisponível)")
+            return False
+        logger.info(f"Processando lote {lote['id']} ({len(lote['pedidos'])} pedido(s)) com a conta {conta}")
+
+        with self.fila.manter_sinal_vida(self.identificador):
+            jobs = app.executar_lote(self.fila, lote, login.get_session(),
+                                     cache_formulario=self._cache_formulario(conta, login), pool=self.pool)
+
+        # Guardar cookies e tokens renovados durante o lote para a página e outros workers
+        login.salvar_sessao()
+
+        concluidos = sum(1 for job in jobs if job['status'] == 'CONCLUIDO')
+        logger.info(f"Lote {lote['id']} finalizado: {concluidos}/{len(jobs)} concluído(s)")
+        return True
+
+    def executar(self, uma_vez=False):
+        """Laço principal; com uma_vez, termina quando a fila esvaziar"""
+        logger.info(f"Worker {self.identificador} iniciado (fila: {self.fila.arquivo})")
+        self.pool.iniciar()
+
+        while not self._parar.is_set():
+            self.fila.sinal_vida(self.identificador)
+            self.fila.liberar_orfaos()
+
+            try:
+                processou = self.processar_proximo()
+            except Exception as e:
+                logger.error(f"Erro no worker: {str(e)}")
+                processou = False
+
+            if processou:
+                continue
+            if uma_vez and not self.fila.ha_pendentes():
+                break
+
+            espera = INTERVALO_SESSAO if self.sem_sessao and self.fila.ha_pendentes() else INTERVALO_FILA
+            self._parar.wait(espera)
+
+        self.pool.parar()
+        logger.info(f"Worker {self.identificador} encerrado")
+
+    def parar(self):
+        self._parar.set()
+
+
+def main():
+    """Inicia o worker pela linha de comando"""
+    parser = argparse.ArgumentParser(description="Worker de geração de relatórios UFF")
+    parser.add_argument('--uma-vez', action='store_true', help="Encerrar quando a fila esvaziar")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    # Fora do "streamlit run" as chamadas st.* só geram avisos de contexto
+    for nome in list(logging.root.manager.loggerDict):
+        if nome.startswith('streamlit'):
+            logging.getLogger(nome).setLevel(logging.ERROR)
+
+    trabalhador = TrabalhadorRelatorios()
+    try:
+        trabalhador.executar(uma_vez=args.uma_vez)
+    except KeyboardInterrupt:
+        logger.info("Interrompido pelo usuário")
+
+
+if __name__ == "__main__":
+    main()